@@ -2,11 +2,31 @@
 
 # Import the necessary libraries and dependencies
 import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from Utils.circuit_transaction import *
+from Utils.constants_ieee13nodes import *
+from Utils.convergence import *
+from Utils.fault_study import *
+from Utils.grounding_optimizer import *
+from Utils.hosting_capacity import *
+from Utils.load_sweep import *
+from Utils.loss_breakdown import *
+from Utils.neutral_sizing import *
 from Utils.opendss_engine import *
+from Utils.phase_balancing import *
+from Utils.reg_controls import *
+from Utils.scenario_stream import *
+from Utils.shared_results import *
+from Utils.state_estimator import *
+from Utils.thermal_loading import *
+from Utils.sweep_executor import *
 from Utils.utils_ieee13nodes import *
+from Utils.work_queue import *
 
 PERIOD = "."
 NONE = "NONE"
+SOLVE_TRACE_LENGTH = 1000
 
 
 class IEEE13Nodes:
@@ -25,6 +45,15 @@ class IEEE13Nodes:
         self.ground_node = ground_node
         self.DSSCircuit = DSSCircuit
         self.has_neutral = has_neutral
+        self.earth_model = earth_model
+        self.kron_reduced = False
+        self.z_g = None
+        self.pv_definitions = []
+        self.open_transaction = None
+        self.journal = []
+        self.solution_stamp = 0
+        self.getter_cache = {}
+        self.cache_stats = {'hits': 0, 'misses': 0}
 
         # Compile the circuit
         DSSText.Command = "Compile " + self.circuit_path
@@ -32,42 +61,328 @@ class IEEE13Nodes:
         if earth_model is not None:
             DSSText.Command = f"Set earthmodel = {earth_model}"
 
-        # Manage the switch
+        # Manage the switch, it is part of the compiled state of the network
         self.manage_switch()
+        self.journal = []
 
         # Initialize the elements of the circuit
         self.lines_names = list(DSSCircuit.Lines.AllNames)
         self.transformers_names = list(DSSCircuit.Transformers.AllNames)
         self.buses_names = None
         self.load_names = list(DSSCircuit.Loads.AllNames)
-        self.pv_systems = list(DSSCircuit.PVSystems.AllNames)
-        self.reactor_names = list(DSSCircuit.Reactors.AllNames)
+        self.pv_systems = get_enabled_names(DSSCircuit.PVSystems)
+        self.reactor_names = get_enabled_names(DSSCircuit.Reactors)
         self.reg_controls = list(DSSCircuit.RegControls.AllNames)
+        self.compiled_taps = get_reg_taps(self.reg_controls)
+        self.solve_trace = deque(maxlen=SOLVE_TRACE_LENGTH)
+        self.conductor_ratings = None
 
         DSSText.Command = "calcv"
 
-    def run_power_flow(self):
-        """ This function solves the power flow of the IEEE 13 nodes network.
+    @classmethod
+    def from_setup(cls, setup: dict):
+        """ This function builds the IEEE 13 nodes network from a setup dictionary and solves its power flow.
+        @:params
+        setup: dict, the setup of the network as returned by get_setup.
+        @:return
+        network: IEEE13Nodes, the network ready to be analyzed. """
+
+        network = cls(
+            circuit_path=setup['circuit_path'],
+            open_switch=setup.get('open_switch', False),
+            neutral_node=setup.get('neutral_node', 4),
+            ground_node=setup.get('ground_node', 0),
+            earth_model=setup.get('earth_model'),
+            has_neutral=setup.get('has_neutral', False)
+        )
+        if setup.get('kron_reduced', False):
+            network.do_kron_reduction()
+        if setup.get('z_g') is not None:
+            network.add_reactors(setup['z_g'])
+        for pv_definition in setup.get('pv_definitions', []):
+            network.add_pv_system(**pv_definition)
+        network.run_power_flow(show_message=False)
+
+        return network
+
+    def get_setup(self):
+        """ This function gets the setup needed to rebuild this network in another process.
+        @:params -> None
+        @:return
+        setup: dict, the arguments of the network and the modifications applied to it. """
+
+        setup = {
+            'circuit_path': self.circuit_path,
+            'open_switch': self.open_switch,
+            'neutral_node': self.neutral_node,
+            'ground_node': self.ground_node,
+            'earth_model': self.earth_model,
+            'has_neutral': self.has_neutral,
+            'kron_reduced': self.kron_reduced,
+            'z_g': self.z_g,
+            'pv_definitions': list(self.pv_definitions)
+        }
+
+        return setup
+
+    def get_state(self):
+        """ This function gets the attributes of the network that the modifications of the circuit change.
+        @:params -> None
+        @:return
+        state: dict, the attributes and their values. """
+
+        state = {
+            'open_switch': self.open_switch,
+            'has_neutral': self.has_neutral,
+            'kron_reduced': self.kron_reduced,
+            'z_g': self.z_g,
+            'pv_definitions': list(self.pv_definitions)
+        }
+
+        return state
+
+    @contextmanager
+    def transaction(self):
+        """ This function groups the modifications of the circuit made inside a with block in one transaction. The edits
+        are sent to the engine in one batch when the block ends, and journaled so they can be undone with rollback.
+        Nested blocks join the open transaction.
+        @:params -> None
+        @:return
+        transaction: CircuitTransaction, the open transaction. """
+
+        if self.open_transaction is not None:
+            yield self.open_transaction
+            return
+
+        self.open_transaction = CircuitTransaction(self.get_state())
+        try:
+            yield self.open_transaction
+            self.open_transaction.commit()
+            self.journal.append(self.open_transaction)
+        except Exception:
+            # The commands sent to the engine were undone by commit, so only the attributes are restored
+            self.__dict__.update(self.open_transaction.state)
+            raise
+        finally:
+            self.open_transaction = None
+        self.update_elements()
+        self.invalidate_cache()
+
+    def rollback(self, n_transactions: int = 1):
+        """ This function undoes the last transactions of the journal in place, without compiling the circuit.
+        @:params
+        n_transactions: int, the number of transactions to undo
+        @:return -> None """
+
+        for _ in range(min(n_transactions, len(self.journal))):
+            transaction = self.journal.pop()
+            transaction.rollback()
+            self.__dict__.update(transaction.state)
+        self.update_elements()
+        self.invalidate_cache()
+
+    def rollback_to_base(self):
+        """ This function undoes every transaction of the journal, going back to the compiled network.
         @:params -> None
         @:return -> None """
 
+        self.rollback(len(self.journal))
+
+    def apply_setup(self, setup: dict):
+        """ This function changes the modifications of the network to the ones of a setup without compiling it. The
+        circuit path, earth model and nodes of the setup have to be the same of this network.
+        @:params
+        setup: dict, the setup as returned by get_setup
+        @:return -> None """
+
+        self.rollback_to_base()
+        if setup.get('open_switch', False) != self.open_switch:
+            with self.transaction():
+                self.open_switch = setup.get('open_switch', False)
+                self.manage_switch()
+        DSSText.Command = "calcv"
+
+        if setup.get('kron_reduced', False):
+            self.do_kron_reduction()
+        if setup.get('z_g') is not None:
+            self.add_reactors(setup['z_g'])
+        for pv_definition in setup.get('pv_definitions', []):
+            self.add_pv_system(**pv_definition)
+
+    def update_elements(self):
+        """ This function updates the names of the elements that the transactions create or remove.
+        @:params -> None
+        @:return -> None """
+
+        self.reactor_names = get_enabled_names(DSSCircuit.Reactors)
+        self.pv_systems = get_enabled_names(DSSCircuit.PVSystems)
+        self.conductor_ratings = None
+
+    def invalidate_cache(self):
+        """ This function discards the results cached by the getters, giving a new solution stamp. Every method that
+        solves or modifies the circuit calls it, it only has to be called after changing the engine directly.
+        @:params -> None
+        @:return -> None """
+
+        self.solution_stamp += 1
+        self.getter_cache = {}
+
+    def get_cached(self, key: str, fill_cache):
+        """ This function gets a result of the present solution from the cache, filling the cache on the first access.
+        The cached results are shared between the calls, so they must not be modified.
+        @:params
+        key: str, the name of the result
+        fill_cache: callable, the method that computes the result and the related ones in bulk and caches them
+        @:return
+        value: the result """
+
+        if key in self.getter_cache:
+            self.cache_stats['hits'] += 1
+        else:
+            self.cache_stats['misses'] += 1
+            fill_cache()
+
+        return self.getter_cache[key]
+
+    def get_cache_stats(self):
+        """ This function gets the counters of the getter cache.
+        @:params -> None
+        @:return
+        stats: dict, the hits and misses of the cache, the solution stamp and the results cached. """
+
+        stats = {**self.cache_stats, 'solution_stamp': self.solution_stamp, 'cached': list(self.getter_cache)}
+
+        return stats
+
+    def cache_voltages(self):
+        """ This function reads the voltages of every node once and fills the cache with all the voltage results.
+        @:params -> None
+        @:return -> None """
+
+        voltages = get_complex_voltages_array(self.buses_names)
+        voltages_pu = get_mag_voltages_array(self.buses_names, mag_pu=True)
+        vuf = get_unbalance_metrics(voltages)['vuf']
+
+        self.getter_cache.update({
+            'voltages_array': voltages,
+            'voltages_pu_array': voltages_pu,
+            'voltages_pu': get_dict_from_array(self.buses_names, voltages_pu),
+            'voltages': get_dict_from_array(self.buses_names, np.abs(voltages)),
+            'vuf': get_vuf_dict(self.buses_names, voltages, vuf)
+        })
+
+    def cache_currents(self):
+        """ This function reads the currents of every line once and caches them as dict and as array.
+        @:params -> None
+        @:return -> None """
+
+        self.getter_cache['currents'] = get_mag_currents(self.lines_names)
+        self.getter_cache['currents_array'] = get_mag_currents_array(self.lines_names, self.neutral_node,
+                                                                     self.ground_node)
+
+    def run_power_flow(self, show_message: bool = True, fallbacks: list = None, warm_start: float = None):
+        """ This function solves the power flow of the IEEE 13 nodes network. The diagnostics of the solution are
+        kept in solve_trace.
+        @:params
+        show_message: bool, if we want to show the messages
+        fallbacks: list, the settings tried in order when the solution does not converge (see SOLVER_FALLBACKS),
+        None to not retry it
+        warm_start: float, the load multiplier the warm start fallbacks start from, e.g. BASE_LOAD_MULTIPLIER of the
+        scenarios, None to skip them
+        @:return -> None """
+
         DSSSolution.Solve()
-        if DSSSolution.Converged:
-            print("The circuit has converged successfully!")
+        diagnostics = get_solve_diagnostics()
+        if not diagnostics['converged'] and fallbacks is not None:
+            diagnostics = solve_with_fallbacks(fallbacks, warm_start)
+        self.invalidate_cache()
+        self.solve_trace.append(diagnostics)
+
+        if diagnostics['converged']:
+            if show_message:
+                print("The circuit has converged successfully!")
 
             # Get the buses of the circuit
             self.buses_names = get_buses_ordered()
-        else:
-            print("The circuit has not converged")
+        elif show_message:
+            print(f"The circuit has not converged after {diagnostics['iterations']} iterations, "
+                  f"max mismatch {diagnostics['max_mismatch']:.3g} A ({diagnostics['algorithm']} algorithm)")
+
+    def get_solve_diagnostics(self):
+        """ This function gets the diagnostics of the last power flow.
+        @:params -> None
+        @:return
+        diagnostics: dict, the convergence, iterations, control iterations, max mismatch in A, algorithm and the
+        settings of the attempt that gave the solution, None if the power flow has not been solved. """
+
+        diagnostics = self.solve_trace[-1] if len(self.solve_trace) > 0 else None
+
+        return diagnostics
 
     def restart_reg_controls(self):
         """ This function restarts the RegControls of the IEEE 13 nodes network.
         @:params -> None
         @:return -> None """
 
-        for reg_control in self.reg_controls:
-            DSSCircuit.SetActiveElement(f'regcontrol.{reg_control}')
-            DSSCircuit.ActiveElement.Properties('tapnum').Val = 0
+        set_reg_taps(self.reg_controls, np.zeros(len(self.reg_controls), dtype=int))
+        self.invalidate_cache()
+
+    def reset_solution_state(self):
+        """ This function puts the regulators back to the taps of the compiled circuit and the node voltages back to
+        the no-load solution, so the next power flow starts as in a network just built and does not depend on the
+        previous solutions.
+        @:params -> None
+        @:return -> None """
+
+        set_reg_taps(self.reg_controls, self.compiled_taps)
+        DSSText.Command = "calcv"
+        self.invalidate_cache()
+
+    def get_reg_taps(self):
+        """ This function gets the tap position of all the regulators of the IEEE 13 nodes network.
+        @:params -> None
+        @:return
+        taps: np.array, the tap number of each regulator control in the order of reg_controls. """
+
+        taps = get_reg_taps(self.reg_controls)
+
+        return taps
+
+    def set_reg_taps(self, taps, lock: bool = False):
+        """ This function restores the tap position of all the regulators of the IEEE 13 nodes network, e.g. the
+        settled taps of a base case so the next solution starts from them.
+        @:params
+        taps: array, the tap number of each regulator control in the order of reg_controls
+        lock: bool, if the taps are locked in the next solutions (see lock_reg_taps)
+        @:return -> None """
+
+        set_reg_taps(self.reg_controls, taps)
+        self.lock_reg_taps(lock)
+        self.invalidate_cache()
+
+    @staticmethod
+    def lock_reg_taps(lock: bool = True):
+        """ This function locks the taps of the regulators, turning off the control iterations of the solutions.
+        @:params
+        lock: bool, True to lock the taps, False to let the RegControls move them again
+        @:return -> None """
+
+        set_controls_locked(lock)
+
+    def run_power_flow_traced(self, max_control_iterations: int = None):
+        """ This function solves the power flow doing the control iterations one by one, to see how many control passes
+        the solution needs and how the taps move in each one.
+        @:params
+        max_control_iterations: int, the maximum number of control passes
+        @:return
+        trace: dict, the convergence, the iterations of each pass and the taps after each pass. """
+
+        trace = solve_with_control_trace(self.reg_controls, max_control_iterations)
+        self.invalidate_cache()
+        if trace['converged']:
+            self.buses_names = get_buses_ordered()
+
+        return trace
 
     def do_kron_reduction(self):
         """ This function performs the Kron reduction of the IEEE 13 nodes network when the neutral wire is modeled.
@@ -76,38 +391,29 @@ class IEEE13Nodes:
 
         neutral_node = self.neutral_node
         ground_node = self.ground_node
-        self.has_neutral = False
 
-        # Creating a reduction in the lines
-        for line in self.lines_names:
-            DSSCircuit.SetActiveElement(f'line.{line}')
-            bus1 = DSSCircuit.ActiveElement.Properties('bus1').Val
-            bus2 = DSSCircuit.ActiveElement.Properties('bus2').Val
-            if len(bus1.split(PERIOD)) > 1:
+        with self.transaction() as transaction:
+            self.has_neutral = False
+            self.kron_reduced = True
+
+            # Creating a reduction in the lines
+            for line in self.lines_names:
+                element = f'line.{line}'
+                bus1 = transaction.get_value(element, 'bus1')
+                bus2 = transaction.get_value(element, 'bus2')
+                if len(bus1.split(PERIOD)) > 1:
+                    if int(bus1.rsplit(PERIOD, maxsplit=1)[1]) == neutral_node:
+                        transaction.edit(element, {
+                            'bus1': bus1.rsplit(PERIOD, maxsplit=1)[0] + f'.{ground_node}',
+                            'bus2': bus2.rsplit(PERIOD, maxsplit=1)[0] + f'.{ground_node}'
+                        })
+
+            # Delete the neutral connection in loads
+            for load in self.load_names:
+                element = 'load.' + load
+                bus1 = transaction.get_value(element, 'bus1')
                 if int(bus1.rsplit(PERIOD, maxsplit=1)[1]) == neutral_node:
-                    DSSCircuit.ActiveElement.Properties('bus1').Val = \
-                        bus1.rsplit(PERIOD, maxsplit=1)[0] + f'.{ground_node}'
-                    DSSCircuit.ActiveElement.Properties('bus2').Val = \
-                        bus2.rsplit(PERIOD, maxsplit=1)[0] + f'.{ground_node}'
-
-        # Delete the neutral connection in loads
-        for load in self.load_names:
-            DSSCircuit.SetActiveElement('load.' + load)
-            bus1 = DSSCircuit.ActiveElement.Properties('bus1').Val
-            if int(bus1.rsplit(PERIOD, maxsplit=1)[1]) == neutral_node:
-                DSSCircuit.ActiveElement.Properties('bus1').Val = bus1.rsplit(PERIOD, maxsplit=1)[0]
-
-        # Delete the neutral connection in trafos
-        for trafo in self.transformers_names:
-            DSSCircuit.SetActiveElement('transformer.' + trafo)
-            bus1 = DSSCircuit.ActiveElement.BusNames[0]
-            bus2 = DSSCircuit.ActiveElement.BusNames[1]
-            if len(bus1.rsplit(PERIOD, maxsplit=1)) > 1:
-                if int(bus1.rsplit(PERIOD, maxsplit=1)[1]) == neutral_node:
-                    DSSCircuit.ActiveElement.BusNames[0] = bus1.rsplit(PERIOD, maxsplit=1)[0]
-            if len(bus2.rsplit(PERIOD, maxsplit=1)) > 1:
-                if int(bus2.rsplit(PERIOD, maxsplit=1)[1]) == neutral_node:
-                    DSSCircuit.ActiveElement.BusNames[1] = bus2.rsplit(PERIOD, maxsplit=1)[0]
+                    transaction.edit(element, {'bus1': bus1.rsplit(PERIOD, maxsplit=1)[0]})
 
     def manage_switch(self):
         """ This function manages the switch in the line 671692
@@ -115,19 +421,18 @@ class IEEE13Nodes:
         :@return -> None"""
 
         open_switch = self.open_switch
+        element = 'line.671692'
 
-        DSSCircuit.SetActiveElement('line.671692')
-        bus1 = DSSCircuit.ActiveElement.Properties('bus1').Val
-        bus2 = DSSCircuit.ActiveElement.Properties('bus2').Val
+        with self.transaction() as transaction:
+            bus1 = transaction.get_value(element, 'bus1')
+            bus2 = transaction.get_value(element, 'bus2')
 
-        if len(bus1.split(PERIOD)) > 1:
-            if not open_switch:
-                DSSCircuit.ActiveElement.Properties('bus1').Val = bus1.split(PERIOD)[0]
-                DSSCircuit.ActiveElement.Properties('bus2').Val = bus2.split(PERIOD)[0]
-        else:
-            if open_switch:
-                DSSCircuit.ActiveElement.Properties('bus1').Val = bus1 + f'.11.12.13'
-                DSSCircuit.ActiveElement.Properties('bus2').Val = bus2 + f'.1.2.3'
+            if len(bus1.split(PERIOD)) > 1:
+                if not open_switch:
+                    transaction.edit(element, {'bus1': bus1.split(PERIOD)[0], 'bus2': bus2.split(PERIOD)[0]})
+            else:
+                if open_switch:
+                    transaction.edit(element, {'bus1': bus1 + f'.11.12.13', 'bus2': bus2 + f'.1.2.3'})
 
     def add_reactors(self, z_g: complex):
         """ This function adds reactors to the IEEE 13 nodes network.
@@ -139,45 +444,115 @@ class IEEE13Nodes:
         neutral_node = self.neutral_node
         ground_node = self.ground_node
 
-        # Add neutral connections to the trafos
-        # This only works for 2 windings
-        for trafo in self.transformers_names:
-            DSSCircuit.SetActiveElement('transformer.' + trafo)
-            bus1 = DSSCircuit.ActiveElement.BusNames[0]
-            bus2 = DSSCircuit.ActiveElement.BusNames[1]
-            buses = [bus1, bus2]
-            for bus in buses:
-                if len(bus.rsplit(PERIOD, maxsplit=1)) > 1:
-                    if int(bus.rsplit(PERIOD, maxsplit=1)[1]) != neutral_node:
-                        DSSCircuit.ActiveElement.BusNames[buses.index(bus)] = bus + f'.{neutral_node}'
-                else:
-                    DSSCircuit.ActiveElement.BusNames[buses.index(bus)] = bus + f'1.2.3.{neutral_node}'
-
-        # Add reactor to trafos
-        DSSText.Command = (f"New Reactor.bus650 phases=1 bus1=650.{neutral_node} bus2=650.{ground_node} "
-                           f"R = {np.real(z_g)} X = {np.imag(z_g)}")
-        DSSText.Command = (f"New Reactor.JumperReg1 phases=1 bus1=650.{neutral_node} Bus2=RG60.{neutral_node} "
-                           f"R=0.00001 X=0")
-        DSSText.Command = (f"New Reactor.JumperXFM1 phases=1 bus1=633.{neutral_node} bus2=634.{neutral_node} "
-                           f"R = 0.00001 X = 0")
-
-        # Add reactor to lines
-        for line in self.lines_names:
-            DSSCircuit.SetActiveElement(f'line.{line}')
-            bus_name = DSSCircuit.ActiveElement.Properties('bus2').Val.split('.')[0]
-            active_bus = DSSCircuit.ActiveBus(bus_name)
-            nodes = active_bus.Nodes
-            if neutral_node in nodes and f'bus{bus_name}' not in self.reactor_names:
-                DSSText.Command = (f"New Reactor.bus{bus_name} Ground Phases = 1 Bus1 = {bus_name}.{neutral_node} "
-                                   f"Bus2 = {bus_name}.{ground_node} R = {np.real(z_g)} X = {np.imag(z_g)}")
-            elif neutral_node in nodes:
-                print(f"Reactor in bus {bus_name} already in the network.")
-
-        self.reactor_names = list(DSSCircuit.Reactors.AllNames)
-        if len(self.reactor_names) == 0:
+        with self.transaction() as transaction:
+            self.z_g = z_g
+
+            # Add reactor to trafos
+            transaction.new('Reactor.bus650', f"phases=1 bus1=650.{neutral_node} bus2=650.{ground_node} "
+                                              f"R={np.real(z_g)} X={np.imag(z_g)}")
+            transaction.new('Reactor.JumperReg1', f"phases=1 bus1=650.{neutral_node} Bus2=RG60.{neutral_node} "
+                                                  f"R=0.00001 X=0")
+            transaction.new('Reactor.JumperXFM1', f"phases=1 bus1=633.{neutral_node} bus2=634.{neutral_node} "
+                                                  f"R=0.00001 X=0")
+            new_reactors = ['bus650', 'jumperreg1', 'jumperxfm1']
+
+            # Add reactor to lines
+            for line in self.lines_names:
+                bus_name = transaction.get_value(f'line.{line}', 'bus2').split('.')[0]
+                active_bus = DSSCircuit.ActiveBus(bus_name)
+                nodes = active_bus.Nodes
+                reactor = f'bus{bus_name}'
+                if neutral_node in nodes and reactor not in self.reactor_names and reactor not in new_reactors:
+                    transaction.new(f'Reactor.{reactor}', f"Phases=1 Bus1={bus_name}.{neutral_node} "
+                                                          f"Bus2={bus_name}.{ground_node} "
+                                                          f"R={np.real(z_g)} X={np.imag(z_g)}")
+                    new_reactors.append(reactor)
+                elif neutral_node in nodes:
+                    print(f"Reactor in bus {bus_name} already in the network.")
+
+        if len(self.reactor_names) == 0 and len(new_reactors) == 0:
             print("There were added no reactors to the network. Please check the buses of the lines and verify if the "
                   "is neutral wire.")
 
+    def add_pv_system(self, name: str, bus: str, phases: list, kw: float, pf: float = 1.0):
+        """ This function adds a PV system to the IEEE 13 nodes network. Single-phase systems are connected between
+        the phase and the neutral when the bus has neutral, otherwise to the ground.
+        @:params
+        name: str, the name of the PV system
+        bus: str, the name of the bus
+        phases: list, the nodes of the phases, e.g. [1] or [1, 2, 3]
+        kw: float, the rated power in kW
+        pf: float, the power factor
+        @:return -> None """
+
+        with self.transaction() as transaction:
+            transaction.new(f"PVSystem.{name}", get_pv_definition(name, bus, phases, kw, pf, self.neutral_node))
+            self.pv_definitions.append({'name': name, 'bus': bus, 'phases': list(phases), 'kw': kw, 'pf': pf})
+
+    def get_hosting_capacity(self, limits: dict = None, max_kw: float = 5000.0, tolerance_kw: float = 5.0,
+                             n_workers: int = None, use_cache: bool = True):
+        """ This function gets the PV hosting capacity of each phase of every bus and of the three-phase connection.
+        The PV systems already in the network (pv_systems) are kept in the study.
+        @:params
+        limits: dict, the allowed change of each value over the network without PV, by default HOSTING_LIMITS
+        max_kw: float, the maximum power evaluated in kW
+        tolerance_kw: float, the tolerance of the bisection in kW
+        n_workers: int, the number of worker processes
+        use_cache: bool, if the results of the same circuit are reused
+        @:return
+        hosting_map: dict, the hosting capacity in kW and the limiting constraint of each bus and connection. """
+
+        hosting_map = get_hosting_capacity(self, limits=limits, max_kw=max_kw, tolerance_kw=tolerance_kw,
+                                           n_workers=n_workers, use_cache=use_cache)
+
+        return hosting_map
+
+    def get_grounding_reactors(self):
+        """ This function gets the reactors that connect a neutral bus to the ground, i.e. the ones added by
+        add_reactors without the jumpers.
+        @:params -> None
+        @:return
+        grounding_reactors: list, the names of the grounding reactors. """
+
+        grounding_reactors = [reactor for reactor in self.reactor_names
+                              if reactor.startswith(GROUNDING_REACTOR_PREFIX)]
+
+        return grounding_reactors
+
+    def set_reactors_impedance(self, z_g_reactors: dict):
+        """ This function changes the impedance of the grounding reactors in one transaction.
+        @:params
+        z_g_reactors: dict, the impedance of each reactor, e.g. {'bus632': 10 + 2j}.
+        @:return -> None """
+
+        with self.transaction() as transaction:
+            for reactor, z_g in z_g_reactors.items():
+                transaction.edit(f'reactor.{reactor}', {'R': np.real(z_g), 'X': np.imag(z_g)})
+
+    def optimize_grounding(self, nev_limit: float, r_bounds: tuple = (0.1, 100.0), x_bounds: tuple = (0.0, 50.0),
+                           n_iterations: int = 10, batch_size: int = 32, n_gradients: int = 4, max_step: float = 10.0,
+                           cost_function=get_grounding_cost, n_workers: int = None, seed: int = None):
+        """ This function optimizes the impedance of the grounding reactors added with add_reactors, trading off the
+        NEV against the grounding cost. The reactors of this network are not modified.
+        @:params
+        nev_limit: float, the maximum NEV allowed in Volts
+        r_bounds: tuple, the minimum and maximum resistance of the reactors in Ohms
+        x_bounds: tuple, the minimum and maximum reactance of the reactors in Ohms
+        n_iterations: int, the number of iterations
+        batch_size: int, the number of random candidates evaluated in each iteration
+        n_gradients: int, the number of candidates of the front moved with gradients in each iteration
+        max_step: float, the maximum change of each variable in Ohms in a gradient step
+        cost_function: callable, the cost of a batch of candidates, by default get_grounding_cost
+        n_workers: int, the number of worker processes
+        seed: int, the seed of the random generator
+        @:return
+        pareto: dict, the reactor names, and the candidates, NEV, cost and feasibility of the Pareto front. """
+
+        pareto = optimize_grounding(self, nev_limit, r_bounds=r_bounds, x_bounds=x_bounds, n_iterations=n_iterations,
+                                    batch_size=batch_size, n_gradients=n_gradients, max_step=max_step,
+                                    cost_function=cost_function, n_workers=n_workers, seed=seed)
+
+        return pareto
 
     def get_mag_voltages_pu(self):
         """ This function gets the magnitude of the voltages in per unit of the IEEE 13 nodes network.
@@ -185,8 +560,7 @@ class IEEE13Nodes:
         @:return
         voltages_pu: dict, the magnitude of the voltages in per unit of the IEEE 13 nodes network. """
 
-        bus_names = self.buses_names
-        voltages_pu = get_mag_voltages(bus_names=bus_names, mag_pu=True)
+        voltages_pu = self.get_cached('voltages_pu', self.cache_voltages)
 
         return voltages_pu
 
@@ -196,39 +570,137 @@ class IEEE13Nodes:
         @:return
         voltages: dict, the magnitude of the voltages in Volts of the IEEE 13 nodes network. """
 
-        bus_names = self.buses_names
-        voltages = get_mag_voltages(bus_names=bus_names, mag_pu=False)
+        voltages = self.get_cached('voltages', self.cache_voltages)
+
+        return voltages
+
+    def get_mag_voltages_array(self, mag_pu: bool = False):
+        """ This function gets the magnitude of the voltages of every node as an array.
+        @:params
+        mag_pu: bool, if we want the values in per unit
+        @:return
+        voltages: np.array, the voltages with shape (n_buses, n_nodes) following buses_names and NODES_NAME. """
+
+        if mag_pu:
+            return self.get_cached('voltages_pu_array', self.cache_voltages)
+
+        voltages = np.abs(self.get_cached('voltages_array', self.cache_voltages))
 
         return voltages
 
     def get_vuf_3ph(self):
-        """ This function gets the Voltage Unbalance Factor (VUF) of the IEEE 13 nodes network.
+        """ This function gets the Voltage Unbalance Factor (VUF) of the three-phase buses of the IEEE 13 nodes
+        network, the ones with their neutral when it is modeled (see get_vuf_dict).
         @:params -> None
         @:return
         vuf: dict, the Voltage Unbalance Factor (VUF) of the IEEE 13 nodes network. """
 
-        bus_names = self.buses_names
-        n_phases = 2
-        for bus in bus_names:
-            if self.neutral_node in list(DSSCircuit.ActiveBus(bus).Nodes):
-                n_phases = 3
-                break
-
-        vuf = get_vuf_3ph(bus_names, n_phases)
+        vuf = self.get_cached('vuf', self.cache_voltages)
 
         return vuf
 
+    def get_unbalance_metrics(self, reference_neutral: bool = False):
+        """ This function gets the VUF, PVUR (IEEE) and LVUR (NEMA) of every bus of the IEEE 13 nodes network.
+        @:params
+        reference_neutral: bool, if the phase voltages are referred to the neutral of the bus instead of the ground
+        @:return
+        metrics: dict, the arrays of each metric in percentage following the order of buses_names. """
+
+        voltages = self.get_cached('voltages_array', self.cache_voltages)
+        metrics = get_unbalance_metrics(voltages, reference_neutral)
+
+        return metrics
+
     def get_mag_currents(self):
         """ This function gets the magnitude of the currents in the IEEE 13 nodes network.
         @:params -> None
         @:return
         currents: dict, the magnitude of the currents in the IEEE 13 nodes network. """
 
-        lines_names = self.lines_names
-        currents = get_mag_currents(lines_names)
+        currents = self.get_cached('currents', self.cache_currents)
 
         return currents
 
+    def get_mag_currents_array(self):
+        """ This function gets the magnitude of the current of every conductor of the lines as an array.
+        @:params -> None
+        @:return
+        currents: np.array, the currents in A with shape (n_lines, n_nodes) following lines_names and NODES_NAME. """
+
+        currents = self.get_cached('currents_array', self.cache_currents)
+
+        return currents
+
+    def get_conductor_ratings(self):
+        """ This function gets the normal and emergency ampacity of every conductor of the lines, including the
+        neutral. They are read once and kept until a transaction changes the circuit.
+        @:params -> None
+        @:return
+        ratings: dict, the normal and emergency ampacity in A with shape (n_lines, n_nodes) and the mask of the
+        conductors without rating. """
+
+        if self.conductor_ratings is None:
+            self.conductor_ratings = get_conductor_ratings(self.lines_names, self.neutral_node, self.ground_node)
+
+        return self.conductor_ratings
+
+    def get_loading_scan(self, currents: np.ndarray = None, threshold: float = 100.0, time_step: float = 1.0):
+        """ This function gets the loading of every conductor of the lines against its ampacity, and the overload
+        events with their duration.
+        @:params
+        currents: np.array, the stacked currents of several scenarios or time steps with shape (n_steps, n_lines,
+        n_nodes), by default the currents of the present solution
+        threshold: float, the loading in percentage over which a conductor is overloaded
+        time_step: float, the duration of each step
+        @:return
+        scan: dict, the loading against the normal and emergency ampacity, the overload events and the conductors
+        without rating. """
+
+        currents = self.get_mag_currents_array()[np.newaxis] if currents is None else currents
+        scan = get_loading_scan(currents, self.get_conductor_ratings(), self.lines_names, threshold, time_step)
+
+        return scan
+
+    def get_state_estimator(self, voltage_meters: list, current_meters: list = (), std: dict = None):
+        """ This function gets the state estimator of a set of meters, built on the admittance matrix and the
+        injections of the present solution. It is cached, so the measurements are factorized once per solution.
+        @:params
+        voltage_meters: list, the metered nodes as (bus, node), e.g. [('671', 1), ('671', 4)]
+        current_meters: list, the metered conductors as (line, node), measured at the first terminal
+        std: dict, the standard deviations of the measurements, by default MEASUREMENT_STD
+        @:return
+        estimator: dict, the estimator (see build_state_estimator). """
+
+        key = ('state_estimator', tuple(voltage_meters), tuple(current_meters),
+               None if std is None else tuple(sorted(std.items())))
+
+        def fill_cache():
+            self.getter_cache[key] = build_state_estimator(self.buses_names, voltage_meters, current_meters, std,
+                                                           self.neutral_node, self.ground_node)
+
+        estimator = self.get_cached(key, fill_cache)
+
+        return estimator
+
+    def estimate_states(self, snapshots: np.ndarray, voltage_meters: list, current_meters: list = (),
+                        std: dict = None):
+        """ This function estimates the voltages of every node, including the neutrals, from a batch of snapshots of
+        a few meters.
+        @:params
+        snapshots: np.array, the measurements with shape (n_snapshots, n_meters), the voltage meters first, as phasors
+        or as magnitudes
+        voltage_meters: list, the metered nodes as (bus, node)
+        current_meters: list, the metered conductors as (line, node)
+        std: dict, the standard deviations of the measurements
+        @:return
+        voltages: np.array, the complex voltages in V with shape (n_snapshots, n_buses, n_nodes) following
+        buses_names and NODES_NAME, the NEV is the magnitude of the column NEUTRAL_INDEX. """
+
+        estimator = self.get_state_estimator(voltage_meters, current_meters, std)
+        voltages = estimate_states(estimator, snapshots)
+
+        return voltages
+
     @staticmethod
     def get_losses():
         """ This function gets the Losses of the system
@@ -238,3 +710,209 @@ class IEEE13Nodes:
 
         losses = DSSCircuit.Losses[0] / 1000
         return losses
+
+    def get_loss_breakdown(self):
+        """ This function gets the losses split by line conductor (phases and neutral), transformer and reactor.
+        @:params -> None
+        @:return
+        breakdown: dict, the arrays of losses in kW (see Utils.loss_breakdown.get_loss_breakdown). """
+
+        breakdown = get_loss_breakdown(
+            lines_names=self.lines_names,
+            transformers_names=self.transformers_names,
+            reactor_names=self.reactor_names,
+            neutral_node=self.neutral_node,
+            ground_node=self.ground_node
+        )
+
+        return breakdown
+
+    def get_load_arrays(self):
+        """ This function gets the kW, kvar, model and ZIP coefficients of all the loads as arrays.
+        @:params -> None
+        @:return
+        loads: dict, the arrays kw, kvar, model and zipv in the order of load_names. """
+
+        loads = get_load_arrays(self.load_names)
+
+        return loads
+
+    def set_load_arrays(self, kw, kvar, model=None, zipv=None):
+        """ This function sets the kW, kvar, model and ZIP coefficients of all the loads in one bulk operation.
+        @:params
+        kw: array, the active power of each load in kW, in the order of load_names
+        kvar: array, the reactive power of each load in kvar
+        model: array or int, the OpenDSS model of each load (1: P, 2: Z, 5: I, 8: ZIP), None to keep the models
+        zipv: array, the ZIP coefficients (7 values) of each load or of all of them
+        @:return -> None """
+
+        set_load_arrays(self.load_names, kw, kvar, model, zipv)
+        self.invalidate_cache()
+
+    def run_load_sweep(self, models: dict = None, levels: list = None, n_workers: int = None):
+        """ This function compares the load models at every load level of the IEEE 13 nodes network in parallel. The
+        loads of this network are not modified.
+        @:params
+        models: dict, the load models, by default LOAD_MODELS (constant power, impedance, current and ZIP)
+        levels: list, the load levels, by default LOAD_LEVELS (10% to 150%)
+        n_workers: int, the number of worker processes
+        @:return
+        sweep: dict, the convergence, voltages, losses and load served of each model and level as arrays. """
+
+        sweep = run_load_sweep(self, models=models, levels=levels, n_workers=n_workers)
+
+        return sweep
+
+    def run_neutral_sizing(self, wires: list = None, positions: list = None, per_geometry: bool = False,
+                           n_workers: int = None):
+        """ This function solves the neutral designs built from a catalog of wires and positions, and ranks them by
+        NEV. The geometries of this network are not modified.
+        @:params
+        wires: list, the wires of NEUTRAL_WIRE_CATALOG used as neutral, by default all of them
+        positions: list, the (x, h, units) of the neutral, None to keep the position of each geometry
+        per_geometry: bool, if every combination of options across the geometries is solved, otherwise the same
+        option is used in every geometry
+        n_workers: int, the number of worker processes
+        @:return
+        sizing: dict, the designs and the NEV, neutral current, losses and ranking as arrays. """
+
+        designs = get_neutral_designs(get_neutral_options(wires, positions), per_geometry=per_geometry)
+        sizing = run_neutral_sizing(self, designs, n_workers=n_workers)
+
+        return sizing
+
+    def run_fault_study(self, fault_types: list = None, r_fault: float = 0.0001, n_workers: int = None):
+        """ This function runs SLG, LL, LLG and 3PH faults in every bus of the IEEE 13 nodes network in parallel.
+        The grounding reactors added with add_reactors are included in the network of every worker.
+        @:params
+        fault_types: list, the types of fault, by default all of them
+        r_fault: float, the resistance of the fault in Ohms
+        n_workers: int, the number of worker processes
+        @:return
+        fault_study: dict, the fault currents, the neutral currents of the lines, the currents of the grounding
+        reactors and the NEV during the faults as arrays. """
+
+        fault_study = run_fault_study(self, fault_types=fault_types, r_fault=r_fault, n_workers=n_workers)
+
+        return fault_study
+
+    def iter_results(self, scenarios, n_workers: int = None, ordered: bool = True, max_pending: int = None,
+                     start_from_base_taps: bool = False, fallbacks: list = None, failure_statistics: dict = None,
+                     region_keys: list = None, bin_sizes: dict = None):
+        """ This function solves scenarios built from this network and yields each result as soon as it is solved.
+        @:params
+        scenarios: iterable, the scenarios to solve, e.g. [{'z_g': 5}, {'z_g': 25, 'open_switch': True}]
+        n_workers: int, the number of worker processes
+        ordered: bool, if the results keep the order of the scenarios, otherwise in order of completion
+        max_pending: int, the maximum number of scenarios solved ahead of the consumer
+        start_from_base_taps: bool, if every scenario starts from the present taps of this network
+        fallbacks: list, the solver settings tried when a scenario does not converge, e.g. SOLVER_FALLBACKS
+        failure_statistics: dict, an empty dict that is filled with the convergence statistics of the sweep
+        region_keys: list, the keys of the scenarios whose regions are skipped when they never converge
+        bin_sizes: dict, the size of the bins of numeric region keys, e.g. {'load_multiplier': 0.1}
+        @:return
+        results: generator, the result dict of each scenario. """
+
+        if start_from_base_taps:
+            base_taps = self.get_reg_taps().tolist()
+            scenarios = ({'reg_taps': base_taps, **scenario} for scenario in scenarios)
+
+        return iter_results(scenarios, self.get_setup(), n_workers=n_workers, ordered=ordered,
+                            max_pending=max_pending, fallbacks=fallbacks, failure_statistics=failure_statistics,
+                            region_keys=region_keys, bin_sizes=bin_sizes)
+
+    def run_shared_sweep(self, scenarios: list, n_workers: int = None, fallbacks: list = None, chunk_size: int = 1):
+        """ This function solves scenarios built from this network with the results returned through shared memory
+        arrays instead of pickled dicts. The arrays must be released with release_shared_results after using them.
+        @:params
+        scenarios: list, the scenarios to solve, e.g. [{'z_g': 5}, {'z_g': 25, 'open_switch': True}]
+        n_workers: int, the number of worker processes
+        fallbacks: list, the solver settings tried when a scenario does not converge
+        chunk_size: int, the number of scenarios sent together to a worker
+        @:return
+        shared_results: dict, the voltages, voltages_pu, currents, vuf and losses of every scenario as arrays
+        following buses_names, lines_names and NODES_NAME, NaN where the scenario does not converge. """
+
+        shared_results = run_shared_sweep(scenarios, self.get_setup(), self.buses_names, self.lines_names,
+                                          n_workers=n_workers, fallbacks=fallbacks, chunk_size=chunk_size)
+
+        return shared_results
+
+    def benchmark_result_transport(self, scenarios: list, worker_counts: tuple = (1, 8, 32), chunk_size: int = 1):
+        """ This function compares the time to solve scenarios built from this network returning the results as
+        pickled dicts and through shared memory.
+        @:params
+        scenarios: list, the scenarios to solve
+        worker_counts: tuple, the numbers of workers to compare
+        chunk_size: int, the number of scenarios sent together to a worker
+        @:return
+        benchmark: dict, the time, scenarios per second and bytes pickled by scenario of each transport for each
+        number of workers. """
+
+        benchmark = benchmark_result_transport(scenarios, self.get_setup(), self.buses_names, self.lines_names,
+                                               worker_counts=worker_counts, chunk_size=chunk_size)
+
+        return benchmark
+
+    def run_sweep(self, scenarios, output_dir: str, chunk_size: int = 100, n_workers: int = None,
+                  max_memory_mb: float = None, max_chunks_per_worker: int = None):
+        """ This function solves a large sweep of scenarios built from this network in chunks saved in output_dir.
+        Running it again with the same scenarios resumes it from the chunks already saved.
+        @:params
+        scenarios: iterable, the scenarios to solve, always generated in the same order
+        output_dir: str, the folder where the chunks are saved
+        chunk_size: int, the number of scenarios of each chunk
+        n_workers: int, the number of worker processes
+        max_memory_mb: float, the memory ceiling of each worker in MB that triggers new workers
+        max_chunks_per_worker: int, the number of chunks after which each worker is replaced
+        @:return
+        summary: dict, the chunks solved and skipped, and the workers recycling. The results are read with
+        iter_sweep_results(output_dir). """
+
+        summary = run_sweep(scenarios, self.get_setup(), output_dir, chunk_size=chunk_size, n_workers=n_workers,
+                            max_memory_mb=max_memory_mb, max_chunks_per_worker=max_chunks_per_worker)
+
+        return summary
+
+    def run_distributed_sweep(self, scenarios, output_dir: str, host: str = None, port: int = 8013,
+                              n_workers: int = None, chunk_size: int = 100, lease_timeout: float = 60.0):
+        """ This function serves a sweep of scenarios built from this network through the work queue. The worker
+        hosts join with run_worker(f'http://{host}:{port}'). Without a host, the sweep runs in local worker processes.
+        @:params
+        scenarios: iterable, the scenarios to solve, always generated in the same order
+        output_dir: str, the folder where the chunks are saved
+        host: str, the interface where the coordinator listens, None to run the workers in this machine
+        port: int, the port of the coordinator
+        n_workers: int, the number of local worker processes when host is None
+        chunk_size: int, the number of scenarios of each chunk
+        lease_timeout: float, the seconds without heartbeats after which a chunk is queued again
+        @:return
+        summary: dict, the chunks solved, skipped and queued again, and the workers that took part. The results are
+        read with iter_sweep_results(output_dir). """
+
+        if host is None:
+            summary = run_local_cluster(scenarios, self.get_setup(), output_dir, n_workers=n_workers,
+                                        chunk_size=chunk_size, lease_timeout=lease_timeout)
+        else:
+            summary = run_coordinator(scenarios, self.get_setup(), output_dir, host=host, port=port,
+                                      chunk_size=chunk_size, lease_timeout=lease_timeout)
+
+        return summary
+
+    def optimize_phase_balancing(self, methods: tuple = ('greedy', 'local', 'annealing'), weights: tuple = (1.0, 0.0),
+                                 n_best: int = 5, n_workers: int = None, seed: int = None):
+        """ This function reassigns the single-phase loads across the phases to minimize the peak neutral current and
+        the NEV of the IEEE 13 nodes network. The loads of this network are not modified.
+        @:params
+        methods: tuple, the heuristics to apply in order: 'greedy', 'local' and/or 'annealing'
+        weights: tuple, the weights of the peak neutral current and the maximum NEV in the objective
+        n_best: int, the number of best assignments returned
+        n_workers: int, the number of worker processes
+        seed: int, the seed of the random generator
+        @:return
+        balancing: dict, the best assignments with their bus definitions, neutral current and NEV. """
+
+        balancing = optimize_phase_balancing(self, methods=methods, weights=weights, n_best=n_best,
+                                             n_workers=n_workers, seed=seed)
+
+        return balancing
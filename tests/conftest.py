@@ -0,0 +1,34 @@
+""" This script contains the fixtures of the tests of the IEEE 13 nodes network. The tests solve the circuits of
+OpenDSS_Files, so they need dss-python. """
+
+import importlib.util
+import os
+import sys
+import types
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The modules import the utils folder as Utils, which only resolves on case insensitive file systems
+if importlib.util.find_spec('Utils') is None:
+    sys.modules['Utils'] = types.ModuleType('Utils')
+    sys.modules['Utils'].__path__ = [os.path.join(ROOT, 'utils')]
+
+# Without the engine there is nothing to solve
+if importlib.util.find_spec('dss') is None:
+    collect_ignore_glob = ['test_*.py']
+
+CIRCUIT_4WIRE = os.path.join(ROOT, 'OpenDSS_Files', '4wire_IEEE13Node', 'IEEE13Nodeckt_4wire.dss')
+CIRCUIT_TRADITIONAL = os.path.join(ROOT, 'OpenDSS_Files', 'Traditional_IEEE13Node', 'IEEE13Nodeckt.dss')
+
+
+@pytest.fixture
+def network_4wire():
+    """ The 4-wire network with the power flow solved. """
+    from IEEE13Nodes import IEEE13Nodes
+
+    network = IEEE13Nodes(CIRCUIT_4WIRE)
+    network.run_power_flow(show_message=False)
+
+    return network
@@ -0,0 +1,87 @@
+""" Tests of the transactions that modify the circuit and undo the modifications. """
+
+import numpy as np
+import pytest
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+
+
+def get_property(element: str, prop: str):
+    """ The value of a property of an element in the engine. """
+    DSSCircuit.SetActiveElement(element)
+
+    return DSSCircuit.ActiveElement.Properties(prop).Val
+
+
+def is_enabled(element: str):
+    """ If an element exists and is enabled in the engine. """
+    return DSSCircuit.SetActiveElement(element) >= 0 and DSSCircuit.ActiveCktElement.Enabled
+
+
+def test_rollback_of_edit(network_4wire):
+    length = get_property('line.650632', 'length')
+    with network_4wire.transaction() as transaction:
+        transaction.edit('line.650632', {'length': 2500})
+        transaction.edit('line.650632', {'length': 3000})
+    assert float(get_property('line.650632', 'length')) == 3000
+
+    network_4wire.rollback()
+    assert get_property('line.650632', 'length') == length
+    assert len(network_4wire.journal) == 0
+
+
+def test_rollback_of_new(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    assert is_enabled('reactor.bus650') and 'bus650' in network_4wire.reactor_names
+
+    network_4wire.rollback()
+    assert not is_enabled('reactor.bus650') and len(network_4wire.reactor_names) == 0
+    assert network_4wire.z_g is None
+
+    # The disabled elements are enabled again when they are created again
+    network_4wire.add_reactors(z_g=20)
+    assert is_enabled('reactor.bus650') and float(get_property('reactor.bus650', 'R')) == 20
+
+
+def test_rollback_of_new_on_existing_element(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    reactor_names = list(network_4wire.reactor_names)
+    network_4wire.add_reactors(z_g=25)
+    assert float(get_property('reactor.bus650', 'R')) == 25
+
+    network_4wire.rollback()
+    assert network_4wire.reactor_names == reactor_names
+    assert all(is_enabled(f'reactor.{reactor}') for reactor in reactor_names)
+    assert float(get_property('reactor.bus650', 'R')) == 10
+    assert network_4wire.z_g == 10
+
+
+def test_rollback_of_command(network_4wire):
+    max_iterations = DSSSolution.MaxIterations
+    with network_4wire.transaction() as transaction:
+        transaction.command("Set MaxIterations=7", undo_command=f"Set MaxIterations={max_iterations}")
+    assert DSSSolution.MaxIterations == 7
+
+    network_4wire.rollback()
+    assert DSSSolution.MaxIterations == max_iterations
+
+
+def test_failed_commit_undoes_sent_commands(network_4wire):
+    length = get_property('line.650632', 'length')
+    with pytest.raises(Exception):
+        with network_4wire.transaction() as transaction:
+            transaction.edit('line.650632', {'length': 2500})
+            transaction.command("Edit Line.650632 unknown_property=1")
+
+    assert get_property('line.650632', 'length') == length
+    assert len(network_4wire.journal) == 0 and network_4wire.open_transaction is None
+
+
+def test_rollback_reproduces_base_solution(network_4wire):
+    voltages = network_4wire.get_mag_voltages_array()
+    network_4wire.add_reactors(z_g=10)
+    network_4wire.run_power_flow(show_message=False)
+
+    network_4wire.rollback()
+    network_4wire.reset_solution_state()
+    network_4wire.run_power_flow(show_message=False)
+    assert np.allclose(network_4wire.get_mag_voltages_array(), voltages, rtol=1e-9, equal_nan=True)
@@ -0,0 +1,34 @@
+""" Tests of the diagnostics of the power flow and of the solver fallbacks. """
+
+import numpy as np
+from Utils.convergence import get_empty_failure_statistics, update_failure_statistics
+from Utils.opendss_engine import DSSSolution
+
+
+def test_mismatch_is_computed_for_converged_solutions(network_4wire):
+    diagnostics = network_4wire.get_solve_diagnostics()
+    assert diagnostics['converged']
+    assert np.isfinite(diagnostics['max_mismatch'])
+    assert diagnostics['max_mismatch'] < 1e-2
+
+
+def test_fallbacks_recover_a_failed_solution(network_4wire):
+    max_iterations = DSSSolution.MaxIterations
+    DSSSolution.MaxIterations = 1
+    try:
+        network_4wire.reset_solution_state()
+        network_4wire.run_power_flow(show_message=False, fallbacks=[{'max_iterations': 100}])
+    finally:
+        DSSSolution.MaxIterations = max_iterations
+    diagnostics = network_4wire.get_solve_diagnostics()
+
+    assert diagnostics['converged']
+    assert diagnostics['attempt'] == 'max_iterations=100'
+    assert diagnostics['n_attempts'] == 1
+    assert np.isfinite(diagnostics['max_mismatch'])
+
+    statistics = get_empty_failure_statistics()
+    update_failure_statistics(statistics, {'converged': True, 'diagnostics': diagnostics}, region=(1.0,))
+    assert statistics['n_recovered'] == 1
+    assert statistics['attempts'] == {'max_iterations=100': 1}
+    assert statistics['regions'][(1.0,)] == {'n_solved': 1, 'n_failed': 0}
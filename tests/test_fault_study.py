@@ -0,0 +1,35 @@
+""" Tests of the fault study of every bus. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.constants_ieee13nodes import FAULT_TYPES, NEUTRAL_INDEX
+from Utils.fault_study import evaluate_bus_faults
+from Utils.opendss_engine import DSSSolution
+from Utils.reg_controls import CONTROL_MODE_STATIC
+
+
+def test_bus_faults_do_not_depend_on_previous_buses(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    parallel_utils.init_worker(network_4wire.get_setup())
+    worker_network = parallel_utils.get_worker_network()
+    nev = worker_network.get_mag_voltages_array()[:, NEUTRAL_INDEX]
+
+    first = evaluate_bus_faults(('632', FAULT_TYPES, 0.0001))
+    evaluate_bus_faults(('671', FAULT_TYPES, 0.0001))
+    second = evaluate_bus_faults(('632', FAULT_TYPES, 0.0001))
+
+    # The regulators are locked during the faults only
+    assert DSSSolution.ControlMode == CONTROL_MODE_STATIC
+
+    for key in ('fault_currents', 'neutral_currents', 'reactor_currents', 'nev'):
+        assert np.allclose(first[key], second[key], rtol=1e-9, equal_nan=True)
+    assert np.all(np.isfinite(first['fault_currents'])) and np.all(np.isfinite(first['reactor_currents']))
+
+    # The neutral currents are the neutral conductor of each line, NaN for the lines without neutral
+    has_neutral = np.isfinite(worker_network.get_mag_currents_array()[:, NEUTRAL_INDEX])
+    assert np.array_equal(np.isfinite(first['neutral_currents']), np.tile(has_neutral, (len(FAULT_TYPES), 1)))
+
+    # The faults are rolled back
+    worker_network.reset_solution_state()
+    worker_network.run_power_flow(show_message=False)
+    assert np.allclose(worker_network.get_mag_voltages_array()[:, NEUTRAL_INDEX], nev, rtol=1e-6, equal_nan=True)
@@ -0,0 +1,41 @@
+""" Tests of the cache of the getters of IEEE13Nodes. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NEUTRAL_INDEX
+from Utils.utils_ieee13nodes import get_mag_currents_array, get_mag_voltages_array
+
+
+def test_voltage_getters_share_one_read(network_4wire):
+    network_4wire.invalidate_cache()
+    stats = network_4wire.get_cache_stats()
+
+    voltages = network_4wire.get_mag_voltages_array()
+    network_4wire.get_mag_voltages_pu()
+    network_4wire.get_vuf_3ph()
+    assert np.array_equal(network_4wire.get_mag_voltages_array(), voltages, equal_nan=True)
+
+    new_stats = network_4wire.get_cache_stats()
+    assert new_stats['misses'] - stats['misses'] == 1
+    assert new_stats['hits'] - stats['hits'] == 3
+    assert np.array_equal(voltages, get_mag_voltages_array(network_4wire.buses_names), equal_nan=True)
+
+
+def test_cache_follows_the_changes_of_the_circuit(network_4wire):
+    nev = network_4wire.get_mag_voltages_array()[:, NEUTRAL_INDEX]
+    stamp = network_4wire.get_cache_stats()['solution_stamp']
+
+    network_4wire.add_reactors(z_g=10)
+    network_4wire.run_power_flow(show_message=False)
+    assert network_4wire.get_cache_stats()['solution_stamp'] > stamp
+    grounded_nev = network_4wire.get_mag_voltages_array()[:, NEUTRAL_INDEX]
+    assert not np.allclose(grounded_nev, nev, equal_nan=True)
+    assert np.array_equal(network_4wire.get_mag_currents_array(),
+                          get_mag_currents_array(network_4wire.lines_names, network_4wire.neutral_node,
+                                                 network_4wire.ground_node), equal_nan=True)
+
+    # The rollback discards the results of the grounded network
+    network_4wire.rollback()
+    assert network_4wire.get_cache_stats()['cached'] == []
+    network_4wire.reset_solution_state()
+    network_4wire.run_power_flow(show_message=False)
+    assert np.allclose(network_4wire.get_mag_voltages_array()[:, NEUTRAL_INDEX], nev, rtol=1e-6, equal_nan=True)
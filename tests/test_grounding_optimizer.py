@@ -0,0 +1,39 @@
+""" Tests of the optimization of the grounding impedances. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.grounding_optimizer import evaluate_grounding_candidate, get_grounding_cost
+
+
+def test_gradient_matches_finite_differences(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    reactor_names = network_4wire.get_grounding_reactors()
+    parallel_utils.init_worker(network_4wire.get_setup())
+
+    key = tuple(value for _ in reactor_names for value in (10.0, 2.0))
+    nev, gradient = evaluate_grounding_candidate((reactor_names, key))
+
+    # The linear model keeps the injections fixed, so only the direction of the gradient is compared
+    step = 1e-3
+    differences = np.zeros(len(key))
+    for i in range(len(key)):
+        perturbed = list(key)
+        perturbed[i] += step
+        differences[i] = (evaluate_grounding_candidate((reactor_names, tuple(perturbed)))[0] - nev) / step
+    cosine = differences @ gradient.ravel() / (np.linalg.norm(differences) * np.linalg.norm(gradient))
+    assert cosine > 0.99
+
+    # Every candidate is rolled back, so its evaluation does not depend on the candidates evaluated before
+    assert np.isclose(evaluate_grounding_candidate((reactor_names, key))[0], nev, rtol=1e-9)
+
+
+def test_optimize_grounding_returns_pareto_front(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    pareto = network_4wire.optimize_grounding(nev_limit=5.0, n_iterations=1, batch_size=4, n_gradients=1,
+                                              n_workers=1, seed=0)
+
+    assert pareto['reactor_names'] == network_4wire.get_grounding_reactors()
+    assert np.all(np.diff(pareto['cost']) >= 0)
+    assert np.all(np.diff(pareto['nev']) < 0)
+    assert np.allclose(pareto['cost'], get_grounding_cost(pareto['candidates']))
+    assert np.array_equal(pareto['feasible'], pareto['nev'] <= 5.0)
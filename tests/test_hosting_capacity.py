@@ -0,0 +1,29 @@
+""" Tests of the PV hosting capacity of the buses. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.constants_ieee13nodes import HOSTING_CONNECTIONS, HOSTING_LIMITS, NEUTRAL_INDEX
+from Utils.hosting_capacity import evaluate_bus_hosting
+from Utils.opendss_engine import DSSCircuit
+from Utils.utils_ieee13nodes import get_enabled_names
+
+
+def test_bus_hosting_does_not_depend_on_previous_buses(network_4wire):
+    parallel_utils.init_worker(network_4wire.get_setup())
+    worker_network = parallel_utils.get_worker_network()
+    nev = worker_network.get_mag_voltages_array()[:, NEUTRAL_INDEX]
+    pv_systems = get_enabled_names(DSSCircuit.PVSystems)
+
+    first = evaluate_bus_hosting(('675', HOSTING_LIMITS, 2000.0, 50.0))
+    evaluate_bus_hosting(('611', HOSTING_LIMITS, 2000.0, 50.0))
+    second = evaluate_bus_hosting(('675', HOSTING_LIMITS, 2000.0, 50.0))
+
+    assert np.array_equal(first['capacity'], second['capacity'])
+    assert first['limit'] == second['limit']
+    assert np.all(np.isfinite(first['capacity'])) and len(first['capacity']) == len(HOSTING_CONNECTIONS)
+
+    # The PV candidates are rolled back
+    assert get_enabled_names(DSSCircuit.PVSystems) == pv_systems
+    worker_network.reset_solution_state()
+    worker_network.run_power_flow(show_message=False)
+    assert np.allclose(worker_network.get_mag_voltages_array()[:, NEUTRAL_INDEX], nev, rtol=1e-6, equal_nan=True)
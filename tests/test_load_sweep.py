@@ -0,0 +1,27 @@
+""" Tests of the sweep of load models and load levels. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.load_sweep import evaluate_load_scenario
+from Utils.opendss_engine import DSSCircuit
+
+
+def test_base_level_matches_serial_power_flow(network_4wire):
+    expected_voltages = network_4wire.get_mag_voltages_array(mag_pu=True)
+
+    parallel_utils.init_worker(network_4wire.get_setup())
+    tasks = [((0, 0), {'model': 1}, 1.4), ((0, 1), {'model': None}, 0.5), ((0, 2), {'model': None}, 1.0)]
+    results = [evaluate_load_scenario(task) for task in tasks]
+
+    assert results[-1]['converged']
+    assert np.allclose(results[-1]['voltages_pu'], expected_voltages, rtol=1e-9, equal_nan=True)
+
+
+def test_load_and_losses_balance_source_power(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    parallel_utils.init_worker(network_4wire.get_setup())
+    result = evaluate_load_scenario(((0, 0), {'model': None}, 0.8))
+
+    assert result['converged']
+    assert np.isclose(result['load_kw'] + result['losses'], -DSSCircuit.TotalPower[0], rtol=1e-4)
+    assert result['losses'] > DSSCircuit.Losses[0] / 1000
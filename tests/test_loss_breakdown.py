@@ -0,0 +1,31 @@
+""" Tests of the breakdown of the losses by element and conductor. """
+
+import numpy as np
+from Utils.loss_breakdown import stack_loss_breakdowns
+from Utils.opendss_engine import DSSCircuit
+
+
+def test_conductor_losses_add_up_to_line_losses(network_4wire):
+    breakdown = network_4wire.get_loss_breakdown()
+
+    for line, conductor_losses in zip(network_4wire.lines_names, breakdown['lines']):
+        DSSCircuit.SetActiveElement(f'line.{line}')
+        assert np.isclose(np.sum(conductor_losses), DSSCircuit.ActiveCktElement.Losses[0] / 1000, rtol=1e-6,
+                          atol=1e-9)
+    assert breakdown['neutral'] > 0
+
+
+def test_total_includes_the_grounding_reactors(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    network_4wire.reset_solution_state()
+    network_4wire.run_power_flow(show_message=False)
+    breakdown = network_4wire.get_loss_breakdown()
+
+    assert breakdown['grounding'] > 0
+    assert np.isclose(breakdown['total'], breakdown['phase'] + breakdown['neutral'] + breakdown['grounding'] +
+                      breakdown['transformer'])
+    assert np.isclose(breakdown['total'] - breakdown['grounding'], breakdown['circuit_total'], rtol=1e-6)
+
+    stacked = stack_loss_breakdowns([breakdown, breakdown])
+    assert stacked['lines'].shape == (2,) + breakdown['lines'].shape
+    assert np.allclose(stacked['total'], breakdown['total'])
@@ -0,0 +1,42 @@
+""" Tests of the sizing of the neutral conductor. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.constants_ieee13nodes import NEUTRAL_CONDUCTORS, NEUTRAL_INDEX
+from Utils.loss_breakdown import get_total_losses
+from Utils.neutral_sizing import evaluate_neutral_design, get_line_length, get_lines_by_geometry
+from Utils.opendss_engine import DSSCircuit
+
+
+def test_identity_design_reproduces_base_network(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    network_4wire.reset_solution_state()
+    network_4wire.run_power_flow(show_message=False)
+    nev = np.nanmax(network_4wire.get_mag_voltages_array()[:, NEUTRAL_INDEX])
+    neutral_current = np.nanmax(network_4wire.get_mag_currents_array()[:, NEUTRAL_INDEX])
+    losses = network_4wire.get_loss_breakdown()['total']
+
+    # Every geometry keeps the wire and position of its neutral
+    design = {}
+    for geometry, cond in NEUTRAL_CONDUCTORS.items():
+        DSSCircuit.LineGeometries.Name = geometry
+        design[geometry] = (DSSCircuit.LineGeometries.Conductors[cond - 1], None, None, None)
+
+    parallel_utils.init_worker(network_4wire.get_setup())
+    lines_by_geometry = get_lines_by_geometry(network_4wire.lines_names)
+    lengths = {line: get_line_length(line) for lines in lines_by_geometry.values() for line in lines}
+    metrics = evaluate_neutral_design((design, lines_by_geometry))
+
+    assert np.allclose(metrics, (nev, neutral_current, losses), rtol=1e-6)
+    assert lengths == {line: get_line_length(line) for line in lengths}
+    assert get_lines_by_geometry(network_4wire.lines_names) == lines_by_geometry
+
+
+def test_total_losses_include_grounding_reactors(network_4wire):
+    network_4wire.add_reactors(z_g=10)
+    network_4wire.run_power_flow(show_message=False)
+    breakdown = network_4wire.get_loss_breakdown()
+
+    assert breakdown['grounding'] > 0
+    assert np.isclose(get_total_losses(), breakdown['total'], rtol=1e-6)
+    assert get_total_losses() > breakdown['circuit_total'] + 0.9 * breakdown['grounding']
@@ -0,0 +1,19 @@
+""" Tests of the reassignment of the single-phase loads across the phases. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.constants_ieee13nodes import NEUTRAL_INDEX
+from Utils.phase_balancing import evaluate_assignment, get_single_phase_loads
+
+
+def test_assignment_does_not_depend_on_previous_assignments(network_4wire):
+    neutral_current = np.nanmax(network_4wire.get_mag_currents_array()[:, NEUTRAL_INDEX])
+    nev = np.nanmax(network_4wire.get_mag_voltages_array()[:, NEUTRAL_INDEX])
+
+    loads = get_single_phase_loads(network_4wire.load_names)
+    parallel_utils.init_worker(network_4wire.get_setup())
+    evaluate_assignment((loads, tuple(1 for _ in loads)))
+    evaluate_assignment((loads, tuple(2 for _ in loads)))
+    metrics = evaluate_assignment((loads, tuple(0 for _ in loads)))
+
+    assert np.allclose(metrics, (neutral_current, nev), rtol=1e-9)
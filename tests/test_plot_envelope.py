@@ -0,0 +1,49 @@
+""" Tests of the envelope of stacked scenarios. """
+
+import numpy as np
+import pytest
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+
+from Utils.plot_utils import downsample_scenarios, get_envelope_statistics, plot_envelope_array  # noqa: E402
+
+
+def get_scenarios(n_scenarios: int = 500, seed: int = 0):
+    """ Random voltages of 3 buses, the last one without phase a. """
+    data = np.random.default_rng(seed).normal(1.0, 0.02, size=(n_scenarios, 3, 4))
+    data[:, 2, 0] = np.nan
+
+    return data
+
+
+def test_envelope_statistics_ignore_missing_nodes():
+    data = get_scenarios()
+    statistics = get_envelope_statistics(data, percentiles=(5, 50, 95))
+
+    assert statistics['n_scenarios'] == len(data)
+    assert statistics['percentiles'].shape == (3, 3, 4)
+    assert np.allclose(statistics['max'][:2], data[:, :2].max(axis=0))
+    assert np.allclose(statistics['percentiles'][1, :2], np.median(data[:, :2], axis=0))
+    assert np.isnan(statistics['min'][2, 0]) and np.isnan(statistics['percentiles'][:, 2, 0]).all()
+
+
+def test_downsample_keeps_the_envelope():
+    data = get_scenarios()
+    subset = downsample_scenarios(data, max_scenarios=50, seed=0)
+
+    assert len(subset) <= 50
+    statistics, subset_statistics = get_envelope_statistics(data), get_envelope_statistics(subset)
+    for key in ('min', 'max'):
+        assert np.array_equal(subset_statistics[key], statistics[key], equal_nan=True)
+
+
+def test_plot_envelope_of_full_statistics():
+    data = get_scenarios()
+    fig = plot_envelope_array(downsample_scenarios(data, 50, seed=0), x_names=['632', '671', '684'],
+                              statistics=get_envelope_statistics(data), n_traces=5, font_family='DejaVu Sans')
+
+    ax = fig.axes[0]
+    assert [label.get_text() for label in ax.get_xticklabels()] == ['632', '671', '684']
+    assert ax.get_ylim()[1] >= np.nanmax(data)
+    matplotlib.pyplot.close(fig)
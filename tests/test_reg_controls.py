@@ -0,0 +1,35 @@
+""" Tests of the locking of the regulator taps and of the traced control iterations. """
+
+from Utils.opendss_engine import DSSSolution
+from Utils.reg_controls import CONTROL_MODE_OFF, CONTROL_MODE_STATIC
+
+CONTROL_MODE_EVENT = 1
+
+
+def test_unlock_restores_the_control_mode(network_4wire):
+    DSSSolution.ControlMode = CONTROL_MODE_EVENT
+    try:
+        network_4wire.lock_reg_taps(False)
+        assert DSSSolution.ControlMode == CONTROL_MODE_EVENT
+
+        network_4wire.set_reg_taps(network_4wire.get_reg_taps(), lock=True)
+        assert DSSSolution.ControlMode == CONTROL_MODE_OFF
+        network_4wire.lock_reg_taps(True)
+        network_4wire.lock_reg_taps(False)
+        assert DSSSolution.ControlMode == CONTROL_MODE_EVENT
+    finally:
+        network_4wire.lock_reg_taps(False)
+        DSSSolution.ControlMode = CONTROL_MODE_STATIC
+
+
+def test_trace_does_not_converge_with_pending_controls(network_4wire):
+    network_4wire.restart_reg_controls()
+    trace = network_4wire.run_power_flow_traced(max_control_iterations=1)
+    assert trace['control_passes'] == 1
+    assert not trace['converged']
+
+    network_4wire.restart_reg_controls()
+    trace = network_4wire.run_power_flow_traced()
+    assert trace['converged']
+    assert trace['control_passes'] > 1
+    assert (trace['taps'][-1] == network_4wire.get_reg_taps()).all()
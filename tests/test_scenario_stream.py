@@ -0,0 +1,47 @@
+""" Tests of the scenarios solved in the worker processes. """
+
+import numpy as np
+from Utils import parallel_utils
+from Utils.scenario_stream import run_scenario
+
+
+def test_scenario_does_not_depend_on_previous_scenarios(network_4wire):
+    parallel_utils.init_worker(network_4wire.get_setup())
+    scenarios = [{'load_multiplier': 1.0}, {'load_multiplier': 0.5, 'z_g': 10}, {'load_multiplier': 1.0},
+                 {'load_multiplier': 0.9}]
+    results = [run_scenario((index, scenario)) for index, scenario in enumerate(scenarios)]
+
+    assert all(result['converged'] for result in results)
+    assert np.isclose(results[0]['losses'], results[2]['losses'], rtol=1e-9)
+    for bus, voltages in results[0]['voltages'].items():
+        for phase, value in voltages.items():
+            assert np.isclose(value, results[2]['voltages'][bus][phase], rtol=1e-9)
+
+    # Same scenario in a worker that did not solve any other scenario
+    parallel_utils.init_worker(network_4wire.get_setup())
+    fresh = run_scenario((3, scenarios[3]))
+    assert np.isclose(fresh['losses'], results[3]['losses'], rtol=1e-9)
+
+
+def test_locked_taps_are_released_for_the_next_scenario(network_4wire):
+    parallel_utils.init_worker(network_4wire.get_setup())
+    base = run_scenario((0, {'load_multiplier': 0.8}))
+
+    locked = run_scenario((1, {'load_multiplier': 0.8, 'reg_taps': [0, 0, 0], 'lock_taps': True}))
+    assert locked['converged'] and locked['control_iterations'] <= 1
+    assert not np.isclose(locked['losses'], base['losses'], rtol=1e-6)
+
+    released = run_scenario((2, {'load_multiplier': 0.8}))
+    assert np.allclose(released['losses'], base['losses'], rtol=1e-9)
+
+
+def test_iter_results_yields_the_scenarios_in_order(network_4wire):
+    scenarios = [{'load_multiplier': multiplier} for multiplier in (1.0, 0.6, 0.8)]
+    statistics = {}
+    results = list(network_4wire.iter_results(scenarios, n_workers=2, failure_statistics=statistics))
+
+    parallel_utils.init_worker(network_4wire.get_setup())
+    assert [result['index'] for result in results] == [0, 1, 2]
+    for index, result in enumerate(results):
+        assert np.allclose(result['losses'], run_scenario((index, scenarios[index]))['losses'], rtol=1e-9)
+    assert statistics['n_converged'] == 3 and statistics['n_failed'] == 0
@@ -0,0 +1,60 @@
+""" Tests of the results of the scenarios returned through shared memory. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NODES_INDEX, NODES_NAME, NODES_NUMBER_NAME
+from Utils.opendss_engine import DSSCircuit
+from Utils.parallel_utils import get_pool, map_in_pool
+from Utils.scenario_stream import run_scenario
+from Utils.shared_results import release_shared_results, run_shared_sweep
+
+
+def get_dict_array(values: dict, names: list):
+    """ The values of a getter of IEEE13Nodes ({name: {phase: value}}) with the layout of the shared arrays. """
+    array = np.full((len(names), len(NODES_NAME)), np.nan)
+    for row, name in enumerate(names):
+        for phase, value in values.get(name, {}).items():
+            array[row, NODES_NAME.index(phase)] = value
+
+    return array
+
+
+def get_currents_array(currents: dict, line_names: list):
+    """ The currents of get_mag_currents with the layout of get_mag_currents_array. The dicts name the conductors with
+    the nodes of the first bus, so each one is moved to the node of the conductor in the line. """
+    array = np.full((len(line_names), len(NODES_NAME)), np.nan)
+    for row, line in enumerate(line_names):
+        DSSCircuit.SetActiveElement(f'line.{line}')
+        element = DSSCircuit.ActiveCktElement
+        bus_nodes = DSSCircuit.ActiveBus(element.BusNames[0].split('.')[0]).Nodes
+        for bus_node, node in zip(bus_nodes, list(element.NodeOrder)[:element.NumConductors]):
+            if node in NODES_INDEX and NODES_NUMBER_NAME.get(bus_node) in currents[line]:
+                array[row, NODES_INDEX[node]] = currents[line][NODES_NUMBER_NAME[bus_node]]
+
+    return array
+
+
+def test_shared_results_match_pickled_results(network_4wire):
+    scenarios = [{'load_multiplier': 1.0}, {'load_multiplier': 0.6, 'z_g': 10}, {'z_g': 25},
+                 {'load_multiplier': 1.2}, {'load_multiplier': 0.6}]
+    buses_names, lines_names = network_4wire.buses_names, network_4wire.lines_names
+
+    with get_pool(network_4wire.get_setup(), n_workers=2) as pool:
+        results = map_in_pool(run_scenario, list(enumerate(scenarios)), pool)
+        shared_results = run_shared_sweep(scenarios, network_4wire.get_setup(), buses_names, lines_names, pool=pool)
+
+    try:
+        for index, result in enumerate(results):
+            assert result['converged'] and shared_results['records'][index]['converged']
+            assert np.allclose(shared_results['voltages'][index], get_dict_array(result['voltages'], buses_names),
+                               rtol=1e-9, equal_nan=True)
+            assert np.allclose(shared_results['voltages_pu'][index],
+                               get_dict_array(result['voltages_pu'], buses_names), rtol=1e-9, equal_nan=True)
+            # The current of the switch is the rounding of its voltages over a resistance of 1e-4 ohm
+            currents = get_currents_array(result['currents'], lines_names)
+            assert np.count_nonzero(np.isfinite(currents)) > 2 * len(lines_names)
+            assert np.allclose(shared_results['currents'][index], currents, rtol=1e-6, atol=1e-9, equal_nan=True)
+            assert np.isclose(shared_results['losses'][index], result['losses'], rtol=1e-9)
+            for bus, vuf in result['vuf'].items():
+                assert np.isclose(shared_results['vuf'][index, buses_names.index(bus)], vuf, rtol=1e-9)
+    finally:
+        release_shared_results(shared_results)
@@ -0,0 +1,20 @@
+""" Tests of the state estimator of the node voltages. """
+
+import numpy as np
+import pytest
+
+VOLTAGE_METERS = [('671', 1), ('671', 2), ('671', 3), ('671', 4), ('632', 4), ('675', 1)]
+
+
+@pytest.mark.parametrize('current_meters', [[], [('650632', 1), ('650632', 2), ('650632', 3), ('650632', 4)]])
+def test_reference_measurements_reproduce_solution(network_4wire, current_meters):
+    estimator = network_4wire.get_state_estimator(VOLTAGE_METERS, current_meters)
+    voltages = network_4wire.estimate_states(estimator['reference'], VOLTAGE_METERS, current_meters)
+
+    assert voltages.shape == (1,) + network_4wire.get_mag_voltages_array().shape
+    assert np.allclose(np.abs(voltages[0]), network_4wire.get_mag_voltages_array(), rtol=1e-5, atol=1e-2,
+                       equal_nan=True)
+
+    # The magnitudes of the meters take the angles of the reference solution
+    magnitudes = network_4wire.estimate_states(np.abs(estimator['reference']), VOLTAGE_METERS, current_meters)
+    assert np.allclose(magnitudes, voltages, equal_nan=True)
@@ -0,0 +1,37 @@
+""" Tests of the chunked and resumable sweeps. """
+
+import os
+import pytest
+from Utils.sweep_executor import get_chunk_path, iter_sweep_results, run_sweep
+
+
+def test_sweep_resumes_from_saved_chunks(network_4wire, tmp_path):
+    scenarios = [{'load_multiplier': multiplier} for multiplier in (1.0, 0.9, 0.8, 0.7, 0.6)]
+    output_dir = str(tmp_path)
+
+    summary = network_4wire.run_sweep(scenarios, output_dir, chunk_size=2, n_workers=2)
+    assert (summary['n_chunks'], summary['n_solved'], summary['n_skipped']) == (3, 3, 0)
+    results = list(iter_sweep_results(output_dir))
+    assert [result['index'] for result in results] == list(range(len(scenarios)))
+    assert all(result['converged'] for result in results)
+
+    # Only the missing chunk is solved again, with the same results
+    os.remove(get_chunk_path(output_dir, 1))
+    summary = network_4wire.run_sweep(scenarios, output_dir, chunk_size=2, n_workers=2)
+    assert (summary['n_solved'], summary['n_skipped']) == (1, 2)
+    assert [result['losses'] for result in iter_sweep_results(output_dir)] == [result['losses'] for result in results]
+
+    with pytest.raises(ValueError):
+        network_4wire.run_sweep(scenarios, output_dir, chunk_size=3)
+
+
+def test_sweep_recycles_the_workers_over_the_memory_ceiling(network_4wire, tmp_path):
+    scenarios = [{'load_multiplier': multiplier} for multiplier in (1.0, 0.9, 0.8)]
+    summary = run_sweep(scenarios, network_4wire.get_setup(), str(tmp_path), chunk_size=1, n_workers=1,
+                        max_memory_mb=1.0, max_pending=1)
+
+    # Every chunk goes over the ceiling, so the pool is replaced after each one
+    assert summary['n_solved'] == 3
+    assert summary['n_recycles'] == 3
+    assert summary['peak_memory_mb'] > 1.0
+    assert len(list(iter_sweep_results(str(tmp_path)))) == 3
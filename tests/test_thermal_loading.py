@@ -0,0 +1,40 @@
+""" Tests of the thermal loading of the conductors. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NEUTRAL_INDEX, NODES_INDEX
+from Utils.thermal_loading import EMERGENCY_AMPS_FACTOR
+
+
+def test_wires_without_ampacity_take_the_catalog_rating(network_4wire):
+    # The wires of the circuit file have no ampacity, the ACSR ones are in NEUTRAL_WIRE_CATALOG
+    ratings = network_4wire.get_conductor_ratings()
+    row = network_4wire.lines_names.index('650632')
+    assert ratings['normal'][row, NODES_INDEX[1]] == 730
+    assert ratings['normal'][row, NEUTRAL_INDEX] == 340
+    assert ratings['emergency'][row, NEUTRAL_INDEX] == EMERGENCY_AMPS_FACTOR * 340
+    assert ratings['normal'][network_4wire.lines_names.index('632645'), NEUTRAL_INDEX] == 230
+
+    # The cable keeps its own rating, the wires out of the catalog are reported without rating
+    row = network_4wire.lines_names.index('692675')
+    assert ratings['normal'][row, NODES_INDEX[1]] == 260 and ratings['emergency'][row, NODES_INDEX[1]] == 390
+    scan = network_4wire.get_loading_scan()
+    assert scan['unrated'] == [('684652', 'a'), ('684652', 'n')]
+    existing = np.isfinite(network_4wire.get_mag_currents_array())
+    assert np.array_equal(np.isfinite(scan['normal'][0]), existing & ~ratings['unrated'])
+
+
+def test_loading_scan_of_4wire_network(network_4wire):
+    ratings = network_4wire.get_conductor_ratings()
+
+    currents = network_4wire.get_mag_currents_array()
+    scan = network_4wire.get_loading_scan(np.stack([currents, 3 * currents]), threshold=100.0)
+    expected = currents / np.where(ratings['normal'] > 0, ratings['normal'], np.nan) * 100
+
+    assert scan['normal'].shape == (2,) + currents.shape
+    assert np.allclose(scan['normal'][0], expected, equal_nan=True)
+    assert np.allclose(scan['max_normal'], 3 * expected, equal_nan=True)
+    events = scan['events_normal']
+    overloaded = np.nan_to_num(3 * expected) > 100
+    assert np.any(overloaded)
+    assert len(events['line']) == np.count_nonzero(overloaded)
+    assert np.all(events['start'] == 1) and np.all(events['duration'] == 1)
@@ -0,0 +1,53 @@
+""" Tests of the voltage unbalance metrics. """
+
+import numpy as np
+from Utils.opendss_engine import DSSCircuit
+from Utils.utils_ieee13nodes import get_unbalance_metrics
+
+A = np.exp(2j * np.pi / 3)
+
+
+def get_baseline_vuf(network):
+    """ The VUF of the buses with more nodes than phases, from the sequence voltages of the engine. """
+    n_phases = 3 if any(network.neutral_node in DSSCircuit.ActiveBus(bus).Nodes for bus in network.buses_names) else 2
+    vuf = {}
+    for bus in network.buses_names:
+        active_bus = DSSCircuit.ActiveBus(bus)
+        if len(active_bus.Nodes) > n_phases and active_bus.SeqVoltages[1] > 0:
+            vuf[bus] = active_bus.SeqVoltages[2] / active_bus.SeqVoltages[1] * 100
+
+    return vuf
+
+
+def test_vuf_keeps_the_three_phase_buses(network_4wire):
+    vuf = network_4wire.get_vuf_3ph()
+    baseline = get_baseline_vuf(network_4wire)
+
+    assert sorted(vuf) == sorted(baseline)
+    assert not {'sourcebus', '650', '692'} & set(vuf)
+    assert np.allclose([vuf[bus] for bus in baseline], list(baseline.values()), rtol=1e-6)
+
+
+def test_unbalance_metrics_follow_the_buses(network_4wire):
+    metrics = network_4wire.get_unbalance_metrics()
+    vuf = network_4wire.get_vuf_3ph()
+
+    for key in ('vuf', 'pvur', 'lvur'):
+        assert metrics[key].shape == (len(network_4wire.buses_names),)
+    for bus, value in vuf.items():
+        assert np.isclose(metrics['vuf'][network_4wire.buses_names.index(bus)], value)
+
+
+def test_unbalance_metrics_of_known_voltages():
+    # Positive sequence of 100 V with 2 V of negative sequence, and a two-phase bus with a neutral
+    positive, negative = 100 * np.array([1, A ** 2, A]), 2 * np.array([1, A, A ** 2])
+    voltages = np.array([[*(positive + negative), np.nan], [np.nan, 100, 90 * A, 1]])
+    metrics = get_unbalance_metrics(voltages[np.newaxis].repeat(2, axis=0))
+
+    assert metrics['vuf'].shape == (2, 2)
+    assert np.allclose(metrics['vuf'][:, 0], 2.0)
+    assert np.all(np.isnan(metrics['vuf'][:, 1])) and np.all(np.isnan(metrics['lvur'][:, 1]))
+
+    magnitudes = np.abs(positive + negative)
+    assert np.allclose(metrics['pvur'][:, 0], np.max(np.abs(magnitudes - magnitudes.mean())) / magnitudes.mean() * 100)
+    assert np.allclose(metrics['pvur'][:, 1], 5 / 95 * 100)
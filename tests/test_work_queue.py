@@ -0,0 +1,49 @@
+""" Tests of the work queue of the distributed sweeps. """
+
+import time
+import numpy as np
+from Utils.sweep_executor import iter_sweep_results
+from Utils.work_queue import WorkQueue, decode_message, encode_message
+
+
+def test_messages_keep_complex_and_numpy_values():
+    data = {'voltage': 1 + 2j, 'currents': np.array([1.5, 2.5]), 'count': np.int64(3), 'nested': [np.complex128(-1j)]}
+
+    assert decode_message(encode_message(data)) == {'voltage': 1 + 2j, 'currents': [1.5, 2.5], 'count': 3,
+                                                    'nested': [-1j]}
+
+
+def test_expired_lease_is_served_again(tmp_path):
+    scenarios = [{'load_multiplier': multiplier} for multiplier in (1.0, 0.9, 0.8)]
+    work_queue = WorkQueue(scenarios, {}, str(tmp_path), chunk_size=2, lease_timeout=0.05)
+
+    first = work_queue.lease('worker-1')
+    assert first['chunk_index'] == 0 and first['scenarios'] == scenarios[:2]
+    time.sleep(0.1)
+
+    # The chunk of the worker that stopped sending heartbeats goes to the next worker
+    second = work_queue.lease('worker-2')
+    assert second['chunk_index'] == 0 and work_queue.summary['n_requeued'] == 1
+    assert not work_queue.heartbeat('worker-1', 0)['ok']
+    assert work_queue.heartbeat('worker-2', 0)['ok']
+
+    # The first results of a chunk are kept, the ones of the late worker are discarded
+    assert work_queue.complete('worker-2', 0, ['solved by worker-2'])['ok']
+    assert not work_queue.complete('worker-1', 0, ['solved by worker-1'])['ok']
+
+    third = work_queue.lease('worker-1')
+    assert third['chunk_index'] == 1 and third['first_index'] == 2
+    assert work_queue.lease('worker-2') == {'wait': True}
+    work_queue.complete('worker-1', 1, ['last chunk'])
+    assert work_queue.lease('worker-2') == {'done': True} and work_queue.finished.is_set()
+    assert list(iter_sweep_results(str(tmp_path))) == ['solved by worker-2', 'last chunk']
+
+
+def test_local_cluster_solves_every_scenario(network_4wire, tmp_path):
+    scenarios = [{'load_multiplier': multiplier} for multiplier in (1.0, 0.9, 0.8)]
+    summary = network_4wire.run_distributed_sweep(scenarios, str(tmp_path), n_workers=2, chunk_size=2)
+
+    assert summary['n_solved'] == 2 and summary['n_requeued'] == 0
+    results = list(iter_sweep_results(str(tmp_path)))
+    assert [result['index'] for result in results] == [0, 1, 2]
+    assert all(result['converged'] for result in results)
@@ -0,0 +1,159 @@
+""" This script contains the transactions used to modify the circuit of the IEEE 13 nodes network. The edits are
+queued, sent to the engine in one batch of commands, and journaled with the commands that undo them, so the network
+can go back to its compiled state without compiling it again. The engine can not remove elements outside of a meter
+zone, so the new elements are disabled when they are undone, and enabled again when they are created again. """
+
+import re
+from Utils.opendss_engine import DSSCircuit, DSSText
+
+
+def submit_commands(commands: list):
+    """
+    This function sends a batch of commands to the engine in one call.
+    @:params
+    commands: list, the OpenDSS commands
+    @:return -> None
+    """
+    if len(commands) > 0:
+        DSSText.Commands(commands)
+
+
+def format_property_value(value):
+    """
+    This function formats the value of a property for a command.
+    @:params
+    value: the value of the property
+    @:return
+    value: str, the value ready to be used in a command
+    """
+    value = str(value)
+    if ' ' in value and value[0] not in '[("\'':
+        value = f'[{value}]'
+
+    return value
+
+
+def get_edit_command(element: str, properties: dict):
+    """
+    This function gets the command that edits some properties of an element.
+    @:params
+    element: str, the full name of the element, e.g. 'line.650632'
+    properties: dict, the new value of each property
+    @:return
+    command: str, the OpenDSS command
+    """
+    values = " ".join(f"{prop}={format_property_value(value)}" for prop, value in properties.items())
+
+    return f"Edit {element} {values}"
+
+
+def get_definition_properties(definition: str):
+    """
+    This function gets the names of the properties of a definition, in order and without repetitions.
+    @:params
+    definition: str, the properties of an element, e.g. 'phases=1 bus1=632.4 R=10'
+    @:return
+    properties: list, the names of the properties, e.g. ['phases', 'bus1', 'R']
+    """
+    return list(dict.fromkeys(re.findall(r'([^\s=\[\]]+)\s*=', definition)))
+
+
+class CircuitTransaction:
+    """ This class queues the modifications of the circuit and the commands that undo them. Only get_value sees the
+    queued edits, any other read gets the circuit in the engine as it was before the commit. """
+
+    def __init__(self, state: dict = None):
+        self.commands = []
+        self.undo_commands = []
+        self.original_values = {}
+        self.pending_values = {}
+        self.state = {} if state is None else state
+        self.committed = False
+
+    def get_value(self, element: str, prop: str):
+        """ This function gets the value of a property, including the edits queued in this transaction.
+        @:params
+        element: str, the full name of the element
+        prop: str, the name of the property
+        @:return
+        value: str, the value of the property """
+
+        key = (element.lower(), prop.lower())
+        if key in self.pending_values:
+            return self.pending_values[key]
+
+        DSSCircuit.SetActiveElement(element)
+        return DSSCircuit.ActiveElement.Properties(prop).Val
+
+    def edit(self, element: str, properties: dict):
+        """ This function queues the edition of some properties of an element.
+        @:params
+        element: str, the full name of the element, e.g. 'line.650632'
+        properties: dict, the new value of each property
+        @:return -> None """
+
+        DSSCircuit.SetActiveElement(element)
+        old_values = {}
+        for prop in properties:
+            key = (element.lower(), prop.lower())
+            if key not in self.original_values:
+                self.original_values[key] = DSSCircuit.ActiveElement.Properties(prop).Val
+                old_values[prop] = self.original_values[key]
+            self.pending_values[key] = str(properties[prop])
+
+        self.commands.append(get_edit_command(element, properties))
+        if len(old_values) > 0:
+            self.undo_commands.append(get_edit_command(element, old_values))
+
+    def new(self, element: str, definition: str):
+        """ This function queues the creation of an element. An element that already exists, e.g. disabled by a
+        previous rollback, is enabled and edited with the definition instead of created again, and its undo restores
+        the properties of the definition and whether it was enabled.
+        @:params
+        element: str, the full name of the element, e.g. 'reactor.bus632'
+        definition: str, the properties of the element, e.g. 'phases=1 bus1=632.4 bus2=632.0 R=10 X=0'
+        @:return -> None """
+
+        if DSSCircuit.SetActiveElement(element) >= 0:
+            active_element = DSSCircuit.ActiveCktElement
+            old_values = {prop: active_element.Properties(prop).Val for prop in get_definition_properties(definition)}
+            old_values['enabled'] = 'yes' if active_element.Enabled else 'no'
+            self.commands.append(f"Edit {element} enabled=yes {definition}")
+            self.undo_commands.append(get_edit_command(element, old_values))
+        else:
+            self.commands.append(f"New {element} {definition}")
+            self.undo_commands.append(f"Edit {element} enabled=no")
+
+    def command(self, command: str, undo_command: str = None):
+        """ This function queues any other command, e.g. an option of the solution.
+        @:params
+        command: str, the OpenDSS command
+        undo_command: str, the OpenDSS command that undoes it, None if it is not undone
+        @:return -> None """
+
+        self.commands.append(command)
+        if undo_command is not None:
+            self.undo_commands.append(undo_command)
+
+    def commit(self):
+        """ This function sends the queued commands to the engine in one batch. The engine stops the batch at the first
+        command that fails, so the commands sent before it are undone before the error is raised.
+        @:params -> None
+        @:return -> None """
+
+        try:
+            submit_commands(self.commands)
+        except Exception:
+            # The undo commands of the commands that were not sent only restore the original values
+            submit_commands(list(reversed(self.undo_commands)))
+            raise
+        self.committed = True
+
+    def rollback(self):
+        """ This function undoes the commands of the transaction in reverse order, in one batch.
+        @:params -> None
+        @:return -> None """
+
+        if self.committed:
+            submit_commands(list(reversed(self.undo_commands)))
+        self.committed = False
@@ -27,4 +27,67 @@ NODES_NUMBER_NAME = {
 }
 
 NODES_NUMBER = list(NODES_NUMBER_NAME.keys())
-NODES_NAME = list(NODES_NUMBER_NAME.values())
\ No newline at end of file
+NODES_NAME = list(NODES_NUMBER_NAME.values())
+
+NODES_INDEX = {node: i for i, node in enumerate(NODES_NUMBER)}
+
+NEUTRAL_INDEX = NODES_INDEX[4]
+
+GROUNDING_REACTOR_PREFIX = "bus"
+
+FAULT_TYPES = ["SLG", "LL", "LLG", "3PH"]
+
+# Allowed change of each value over the network without PV: voltage rise and drop in pu, NEV and VUF increase in V
+# and %
+HOSTING_LIMITS = {
+    'v_max': 0.03,
+    'v_min': 0.03,
+    'nev': 10.0,
+    'vuf': 1.0
+}
+
+HOSTING_CONNECTIONS = ["a", "b", "c", "3ph"]
+
+# Load models of OpenDSS, None keeps the model of each load in the circuit file
+LOAD_MODELS = {
+    'base': {'model': None},
+    'constant_power': {'model': 1},
+    'constant_impedance': {'model': 2},
+    'constant_current': {'model': 5},
+    'zip': {'model': 8, 'zipv': [0.3, 0.3, 0.4, 0.3, 0.3, 0.4, 0.5]}
+}
+
+LOAD_LEVELS = [round(0.1 * i, 1) for i in range(1, 16)]
+
+# Conductor of the neutral in each LineGeometry of the 4-wire circuit. ID515 is not included because its neutral is
+# the concentric neutral of the cables
+NEUTRAL_CONDUCTORS = {
+    'id500_acsr_556_500': 4,
+    'id500_acsr_4/0': 4,
+    'id505': 3,
+    'id510': 2,
+    'id520': 2
+}
+
+# Overhead conductors that can be used as neutral, with the data of Kersting, Distribution System Modeling and Analysis
+NEUTRAL_WIRE_CATALOG = {
+    'ACSR_4': "Runits=mi Rac=2.55 GMRunits=ft GMRac=0.00452 Radunits=in Diam=0.257 NormAmps=140",
+    'ACSR_2': "Runits=mi Rac=1.69 GMRunits=ft GMRac=0.00418 Radunits=in Diam=0.316 NormAmps=180",
+    'ACSR_1/0': "Runits=mi Rac=1.12 GMRunits=ft GMRac=0.00446 Radunits=in Diam=0.398 NormAmps=230",
+    'ACSR_2/0': "Runits=mi Rac=0.895 GMRunits=ft GMRac=0.0051 Radunits=in Diam=0.447 NormAmps=270",
+    'ACSR_4/0': "Runits=mi Rac=0.592 GMRunits=ft GMRac=0.00814 Radunits=in Diam=0.563 NormAmps=340",
+    'ACSR_336_400': "Runits=mi Rac=0.306 GMRunits=ft GMRac=0.0244 Radunits=in Diam=0.721 NormAmps=530",
+    'ACSR_556_500': "Runits=mi Rac=0.1859 GMRunits=ft GMRac=0.0313 Radunits=in Diam=0.927 NormAmps=730"
+}
+
+# Standard deviations of the measurements of the state estimator. The meters are in V and A, the pseudo-measurements
+# of the load injections and the injections of the source are relative to the injection of the reference solution,
+# and the nodes without injection are virtual measurements with a small deviation in A
+MEASUREMENT_STD = {
+    'voltage': 1.0,
+    'current': 0.5,
+    'pseudo': 0.3,
+    'source': 0.001,
+    'zero_injection': 0.001,
+    'min_injection': 0.1
+}
@@ -0,0 +1,220 @@
+""" This script contains functions to diagnose the convergence of the power flow of the IEEE 13 nodes network, to retry
+the solutions that do not converge with other settings of the solver, and to aggregate the failures of a sweep so the
+regions of scenarios that never converge are skipped. """
+
+import numpy as np
+from Utils.opendss_engine import DSSCircuit, DSSSolution, DSSText
+from Utils.utils_ieee13nodes import get_system_y
+
+ALGORITHM_NAMES = {0: 'Normal', 1: 'Newton'}
+
+# Settings tried in order when a solution does not converge. 'warm_start' solves first the warm start load multiplier
+# (the base load multiplier of the scenarios) and moves to the one of the scenario in steps, starting each solution
+# from the previous one
+SOLVER_FALLBACKS = [
+    {'algorithm': 'Newton'},
+    {'max_iterations': 100},
+    {'warm_start': True},
+    {'algorithm': 'Newton', 'max_iterations': 100, 'warm_start': True}
+]
+
+
+def get_max_mismatch():
+    """
+    This function gets the largest current mismatch of the nodes in the present solution, |Y V - I| with the system
+    admittance matrix, the node voltages and the injection currents.
+    @:params -> None
+    @:return
+    max_mismatch: float, the largest mismatch in A
+    """
+    y_matrix = get_system_y()
+    if len(y_matrix) == 0:
+        return 0.0
+
+    voltages = np.asarray(DSSCircuit.YNodeVarray)
+    currents = np.asarray(DSSCircuit.YCurrents)
+    mismatch = y_matrix @ (voltages[0::2] + 1j * voltages[1::2]) - (currents[0::2] + 1j * currents[1::2])
+
+    return float(np.max(np.abs(mismatch)))
+
+
+def get_solve_diagnostics(attempt: str = 'default'):
+    """
+    This function gets the diagnostics of the last solution.
+    @:params
+    attempt: str, the name of the settings used in the solution
+    @:return
+    diagnostics: dict, the convergence, the iterations, the control iterations, the largest mismatch in A, the
+    algorithm and the attempt
+    """
+    diagnostics = {
+        'converged': DSSSolution.Converged,
+        'iterations': DSSSolution.Iterations,
+        'control_iterations': DSSSolution.ControlIterations,
+        'max_mismatch': get_max_mismatch(),
+        'algorithm': ALGORITHM_NAMES.get(DSSSolution.Algorithm, str(DSSSolution.Algorithm)),
+        'attempt': attempt
+    }
+
+    return diagnostics
+
+
+def get_attempt_name(settings: dict):
+    """
+    This function gets the name of a fallback from its settings, e.g. 'algorithm=Newton max_iterations=100'.
+    @:params
+    settings: dict, the settings of the fallback
+    @:return
+    name: str, the name of the fallback
+    """
+    return " ".join(f"{key}={value}" for key, value in settings.items())
+
+
+def set_solver_settings(settings: dict):
+    """
+    This function changes the algorithm and the maximum iterations of the solver.
+    @:params
+    settings: dict, the 'algorithm' ('Normal' or 'Newton') and/or 'max_iterations'
+    @:return
+    previous: dict, the settings before the change, to restore them
+    """
+    previous = {
+        'algorithm': ALGORITHM_NAMES.get(DSSSolution.Algorithm, 'Normal'),
+        'max_iterations': DSSSolution.MaxIterations
+    }
+    if 'algorithm' in settings:
+        DSSText.Command = f"Set Algorithm={settings['algorithm']}"
+    if 'max_iterations' in settings:
+        DSSSolution.MaxIterations = settings['max_iterations']
+
+    return previous
+
+
+def solve_warm_start(warm_start: float, n_steps: int = 5):
+    """
+    This function solves the circuit starting from the solution of another load multiplier, moving the load
+    multiplier in steps so each solution starts near the previous one.
+    @:params
+    warm_start: float, the load multiplier of the first solution, e.g. the base load multiplier of the scenarios
+    n_steps: int, the number of steps to the load multiplier of the scenario
+    @:return -> None
+    """
+    target = DSSSolution.LoadMult
+    for load_multiplier in np.linspace(warm_start, target, n_steps + 1):
+        DSSSolution.LoadMult = float(load_multiplier)
+        DSSSolution.Solve()
+        if not DSSSolution.Converged:
+            break
+    DSSSolution.LoadMult = target
+
+
+def solve_with_fallbacks(fallbacks: list = None, warm_start: float = None):
+    """
+    This function solves the circuit again with each fallback until one converges. The settings of the solver are
+    restored after every attempt.
+    @:params
+    fallbacks: list, the settings of each attempt, by default SOLVER_FALLBACKS
+    warm_start: float, the load multiplier the warm start attempts start from, e.g. the base load multiplier of the
+    scenarios, None to skip the warm start attempts
+    @:return
+    diagnostics: dict, the diagnostics of the last attempt (see get_solve_diagnostics) and the number of attempts
+    """
+    fallbacks = SOLVER_FALLBACKS if fallbacks is None else fallbacks
+    diagnostics = get_solve_diagnostics()
+    n_attempts = 0
+
+    for settings in fallbacks:
+        if settings.get('warm_start', False) and warm_start is None:
+            continue
+        n_attempts += 1
+        previous = set_solver_settings(settings)
+        if settings.get('warm_start', False):
+            solve_warm_start(warm_start)
+        else:
+            DSSSolution.Solve()
+        diagnostics = get_solve_diagnostics(get_attempt_name(settings))
+        set_solver_settings(previous)
+        if diagnostics['converged']:
+            break
+
+    diagnostics['n_attempts'] = n_attempts
+
+    return diagnostics
+
+
+def get_region_key(scenario: dict, region_keys: list, bin_sizes: dict = None):
+    """
+    This function gets the region of a scenario, i.e. the values of some of its keys, rounded to bins.
+    @:params
+    scenario: dict, the scenario
+    region_keys: list, the keys of the scenario that define the regions, e.g. ['z_g', 'load_multiplier']
+    bin_sizes: dict, the size of the bins of numeric keys, e.g. {'load_multiplier': 0.1}
+    @:return
+    region: tuple, the region of the scenario
+    """
+    bin_sizes = {} if bin_sizes is None else bin_sizes
+    region = []
+    for key in region_keys:
+        value = scenario.get(key)
+        if key in bin_sizes and value is not None:
+            value = round(float(np.round(value / bin_sizes[key]) * bin_sizes[key]), 10)
+        region.append(value if np.isscalar(value) or value is None else str(value))
+
+    return tuple(region)
+
+
+def get_empty_failure_statistics():
+    """
+    This function gets the statistics of a sweep without scenarios.
+    @:params -> None
+    @:return
+    statistics: dict, the counters of the sweep
+    """
+    return {'n_converged': 0, 'n_failed': 0, 'n_skipped': 0, 'n_recovered': 0, 'attempts': {}, 'regions': {}}
+
+
+def update_failure_statistics(statistics: dict, result: dict, region: tuple = None):
+    """
+    This function adds the result of a scenario to the failure statistics of a sweep.
+    @:params
+    statistics: dict, the statistics as returned by get_empty_failure_statistics, updated in place
+    result: dict, the result of the scenario (see run_scenario)
+    region: tuple, the region of the scenario, None if the regions are not tracked
+    @:return -> None
+    """
+    if result.get('skipped', False):
+        statistics['n_skipped'] += 1
+        return
+
+    diagnostics = result.get('diagnostics', {})
+    if result['converged']:
+        statistics['n_converged'] += 1
+        if diagnostics.get('attempt', 'default') != 'default':
+            statistics['n_recovered'] += 1
+            statistics['attempts'][diagnostics['attempt']] = statistics['attempts'].get(diagnostics['attempt'], 0) + 1
+    else:
+        statistics['n_failed'] += 1
+
+    if region is not None:
+        counters = statistics['regions'].setdefault(region, {'n_solved': 0, 'n_failed': 0})
+        counters['n_solved'] += 1
+        counters['n_failed'] += int(not result['converged'])
+
+
+def is_hopeless_region(statistics: dict, region: tuple, min_scenarios: int = 5, max_failure_rate: float = 1.0):
+    """
+    This function checks if a region of scenarios fails too often to keep solving it.
+    @:params
+    statistics: dict, the failure statistics of the sweep
+    region: tuple, the region of the scenario
+    min_scenarios: int, the scenarios of the region solved before deciding
+    max_failure_rate: float, the failure rate from which the region is skipped, 1.0 to skip only the regions where
+    every scenario failed
+    @:return
+    hopeless: bool, if the scenarios of the region should be skipped
+    """
+    counters = statistics['regions'].get(region)
+    if counters is None or counters['n_solved'] < min_scenarios:
+        return False
+
+    return counters['n_failed'] / counters['n_solved'] >= max_failure_rate
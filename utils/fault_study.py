@@ -0,0 +1,148 @@
+""" This script contains functions to run fault studies in the IEEE 13 nodes network. Every fault is solved as a
+snapshot with a Fault element between the phases of the faulted bus and the earth (node 0), so the grounding reactors
+of the neutral define the neutral voltage rise during the fault. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import FAULT_TYPES, GROUNDING_REACTOR_PREFIX, NEUTRAL_INDEX, NODES_NUMBER
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+from Utils.parallel_utils import get_pool, get_worker_network, map_in_pool
+from Utils.reg_controls import CONTROL_MODE_OFF
+from Utils.utils_ieee13nodes import get_mag_currents_array, get_mag_voltages_array
+
+
+def get_fault_connection(bus_name: str, fault_type: str, neutral_node: int = 4, ground_node: int = 0):
+    """
+    This function gets the connection of a fault in a bus.
+    @:params
+    bus_name: str, the name of the bus
+    fault_type: str, the type of fault: SLG, LL, LLG or 3PH
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground
+    @:return
+    connection: str, the definition of the terminals of the fault, None if the bus does not have the phases needed
+    """
+    phases = sorted(node for node in DSSCircuit.ActiveBus(bus_name).Nodes
+                    if node in NODES_NUMBER and node != neutral_node)
+
+    if fault_type == "SLG" and len(phases) >= 1:
+        return f"phases=1 bus1={bus_name}.{phases[0]} bus2={bus_name}.{ground_node}"
+    if fault_type == "LL" and len(phases) >= 2:
+        return f"phases=1 bus1={bus_name}.{phases[0]} bus2={bus_name}.{phases[1]}"
+    if fault_type == "LLG" and len(phases) >= 2:
+        return (f"phases=2 bus1={bus_name}.{phases[0]}.{phases[1]} "
+                f"bus2={bus_name}.{ground_node}.{ground_node}")
+    if fault_type == "3PH" and len(phases) >= 3:
+        return (f"phases=3 bus1={bus_name}.{phases[0]}.{phases[1]}.{phases[2]} "
+                f"bus2={bus_name}.{ground_node}.{ground_node}.{ground_node}")
+
+    return None
+
+
+def evaluate_bus_faults(task: tuple):
+    """
+    This function solves every type of fault in one bus in the network of the worker.
+    @:params
+    task: tuple, the name of the bus, the fault types and the fault resistance in Ohms
+    @:return
+    results: dict, the fault current, the neutral current of every line, the current of the grounding reactor of the
+    bus and the NEV of every bus for each fault type
+    """
+    bus_name, fault_types, r_fault = task
+    network = get_worker_network()
+    n_buses = len(network.buses_names)
+
+    fault_currents = np.full(len(fault_types), np.nan)
+    neutral_currents = np.full((len(fault_types), len(network.lines_names)), np.nan)
+    reactor_currents = np.full(len(fault_types), np.nan)
+    nev = np.full((len(fault_types), n_buses), np.nan)
+
+    reactor = f"{GROUNDING_REACTOR_PREFIX}{bus_name}"
+    has_reactor = reactor in network.reactor_names
+
+    # Pre-fault condition, solved from the compiled taps so the bus does not depend on the buses solved before
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+
+    # The regulators keep the taps of the pre-fault condition
+    control_mode = DSSSolution.ControlMode
+    DSSSolution.ControlMode = CONTROL_MODE_OFF
+    try:
+        for i, fault_type in enumerate(fault_types):
+            connection = get_fault_connection(bus_name, fault_type, network.neutral_node, network.ground_node)
+            if connection is None:
+                continue
+
+            fault_name = f"{fault_type}_{bus_name}"
+            with network.transaction() as transaction:
+                transaction.new(f"Fault.{fault_name}", f"{connection} r={r_fault}")
+            try:
+                DSSSolution.Solve()
+                if DSSSolution.Converged:
+                    DSSCircuit.SetActiveElement(f"fault.{fault_name}")
+                    currents = np.asarray(DSSCircuit.ActiveElement.CurrentsMagAng)
+                    n_conductors = DSSCircuit.ActiveElement.NumConductors
+                    fault_currents[i] = np.max(currents[0:2 * n_conductors:2])
+
+                    neutral_currents[i] = get_mag_currents_array(network.lines_names, network.neutral_node,
+                                                                 network.ground_node)[:, NEUTRAL_INDEX]
+                    if has_reactor:
+                        DSSCircuit.SetActiveElement(f"reactor.{reactor}")
+                        reactor_currents[i] = DSSCircuit.ActiveElement.CurrentsMagAng[0]
+
+                    nev[i] = get_mag_voltages_array(network.buses_names)[:, NEUTRAL_INDEX]
+            finally:
+                network.rollback()
+    finally:
+        DSSSolution.ControlMode = control_mode
+
+    results = {
+        'fault_currents': fault_currents,
+        'neutral_currents': neutral_currents,
+        'reactor_currents': reactor_currents,
+        'nev': nev
+    }
+
+    return results
+
+
+def run_fault_study(
+        network,
+        fault_types: list = None,
+        r_fault: float = 0.0001,
+        n_workers: int = None):
+    """
+    This function runs the faults of each type in every bus of the network, distributing the buses in a pool of workers.
+    @:params
+    network: IEEE13Nodes, the network with the power flow solved, and the reactors added if needed
+    fault_types: list, the types of fault, by default SLG, LL, LLG and 3PH
+    r_fault: float, the resistance of the fault in Ohms
+    n_workers: int, the number of worker processes
+    @:return
+    fault_study: dict, the fault types, the buses, the lines and the arrays of the study:
+        fault_currents (n_types, n_buses): maximum current in the fault in A
+        neutral_currents (n_types, n_buses, n_lines): current in the neutral conductor of every line during each
+        fault in A, NaN for the lines without neutral
+        reactor_currents (n_types, n_buses): current in the grounding reactor of the faulted bus in A, NaN for the
+        buses without reactor
+        nev (n_types, n_faulted_buses, n_buses): NEV of every bus during each fault in V
+    """
+    if network.buses_names is None:
+        raise ValueError("The power flow has to be solved before running the fault study.")
+
+    fault_types = FAULT_TYPES if fault_types is None else fault_types
+    buses_names = network.buses_names
+
+    with get_pool(network.get_setup(), n_workers) as pool:
+        results = map_in_pool(evaluate_bus_faults, [(bus, fault_types, r_fault) for bus in buses_names], pool)
+
+    fault_study = {
+        'fault_types': fault_types,
+        'buses_names': buses_names,
+        'lines_names': network.lines_names,
+        'fault_currents': np.stack([result['fault_currents'] for result in results], axis=1),
+        'neutral_currents': np.stack([result['neutral_currents'] for result in results], axis=1),
+        'reactor_currents': np.stack([result['reactor_currents'] for result in results], axis=1),
+        'nev': np.stack([result['nev'] for result in results], axis=1)
+    }
+
+    return fault_study
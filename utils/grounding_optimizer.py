@@ -0,0 +1,293 @@
+""" This script contains functions to optimize the grounding impedance of each neutral bus of the IEEE 13 nodes
+network. The decision variables are the R and X values of the grounding reactors added by add_reactors, and the
+result is the Pareto front of the Neutral-to-Earth Voltage (NEV) against the grounding cost. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NEUTRAL_INDEX
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+from Utils.parallel_utils import get_pool, get_worker_network, map_in_pool
+from Utils.utils_ieee13nodes import get_node_index, get_system_y
+
+
+def get_grounding_cost(candidates: np.ndarray, cost_per_siemens: float = 1.0):
+    """
+    This function estimates the cost of the grounding of each candidate. A low impedance to ground needs more
+    electrodes, so the cost is taken proportional to the conductance to ground of every reactor.
+    @:params
+    candidates: np.array, the R and X values of the reactors with shape (n_candidates, n_reactors, 2)
+    cost_per_siemens: float, the cost of one Siemens of conductance to ground
+    @:return
+    cost: np.array, the cost of each candidate with shape (n_candidates,)
+    """
+    z_g = np.hypot(candidates[..., 0], candidates[..., 1])
+    cost = cost_per_siemens * np.sum(1 / z_g, axis=-1)
+
+    return cost
+
+
+def get_candidate_key(candidate: np.ndarray, decimals: int = 4):
+    """
+    This function gets the key of a candidate in the cache of evaluated candidates.
+    @:params
+    candidate: np.array, the R and X values of the reactors with shape (n_reactors, 2)
+    decimals: int, the decimals used to consider two candidates the same
+    @:return
+    key: tuple, the key of the candidate
+    """
+    return tuple(np.round(candidate, decimals).ravel().tolist())
+
+
+def get_nev_gradient(bus_names: list, reactor_names: list, z_g_reactors: dict):
+    """
+    This function gets the maximum NEV of the present solution and its sensitivity to the R and X of each reactor
+    from the system admittance matrix. With the injections fixed, a change dy of the admittance of a reactor between
+    the nodes a and b changes the voltages by dV = -Y^-1 (e_a - e_b) (V_a - V_b) dy, so the sensitivity of every
+    reactor comes from one solution of the linear system, without solving the power flow again.
+    @:params
+    bus_names: list, the names of the buses
+    reactor_names: list, the names of the grounding reactors
+    z_g_reactors: dict, the impedance of each reactor in Ohms
+    @:return
+    nev: float, the maximum NEV in Volts
+    gradient: np.array, the derivative of the maximum NEV in V/Ohm with shape (n_reactors, 2), for R and X
+    """
+    node_names = [node_name.lower() for node_name in DSSCircuit.YNodeOrder]
+    node_index = {node_name: position for position, node_name in enumerate(node_names)}
+    voltages = np.asarray(DSSCircuit.YNodeVarray)
+    voltages = voltages[0::2] + 1j * voltages[1::2]
+
+    # Node of the maximum NEV
+    positions, _, columns = get_node_index(bus_names, node_names)
+    neutral_positions = positions[columns == NEUTRAL_INDEX]
+    nev_position = neutral_positions[np.argmax(np.abs(voltages[neutral_positions]))]
+
+    # Incidence of each reactor, the nodes connected to the ground are not in the admittance matrix
+    incidence = np.zeros((len(node_names), len(reactor_names)), dtype=complex)
+    for i, reactor in enumerate(reactor_names):
+        DSSCircuit.SetActiveElement(f'reactor.{reactor}')
+        for sign, bus_name in zip((1, -1), DSSCircuit.ActiveElement.BusNames):
+            if bus_name.lower() in node_index:
+                incidence[node_index[bus_name.lower()], i] = sign
+
+    # dV/dy of every node for each reactor
+    voltage_sensitivity = -np.linalg.solve(get_system_y(), incidence * (incidence.T @ voltages))
+    z_g = np.array([z_g_reactors[reactor] for reactor in reactor_names])
+    dy_dz = np.stack([-1 / z_g ** 2, -1j / z_g ** 2], axis=-1)
+
+    nev_voltage = voltages[nev_position]
+    dv_dz = voltage_sensitivity[nev_position][:, np.newaxis] * dy_dz
+    gradient = np.real(np.conj(nev_voltage) * dv_dz) / np.abs(nev_voltage)
+
+    return float(np.abs(nev_voltage)), gradient
+
+
+def evaluate_grounding_candidate(task: tuple):
+    """
+    This function evaluates the maximum NEV of one candidate and its sensitivity in the network of the worker.
+    @:params
+    task: tuple, the names of the reactors and the key of the candidate (R1, X1, R2, X2, ...)
+    @:return
+    nev: float, the maximum NEV in Volts, inf if the power flow does not converge
+    gradient: np.array, the derivative of the maximum NEV in V/Ohm with shape (n_reactors, 2), zero if the power
+    flow does not converge
+    """
+    reactor_names, key = task
+    network = get_worker_network()
+
+    z_g_reactors = {reactor: complex(key[2 * i], key[2 * i + 1]) for i, reactor in enumerate(reactor_names)}
+    network.set_reactors_impedance(z_g_reactors)
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+    nev, gradient = np.inf, np.zeros((len(reactor_names), 2))
+    if DSSSolution.Converged:
+        nev, gradient = get_nev_gradient(network.buses_names, reactor_names, z_g_reactors)
+
+    # Back to the impedances of the setup
+    network.rollback()
+
+    return nev, gradient
+
+
+def evaluate_grounding_batch(candidates: np.ndarray, reactor_names: list, pool, cache: dict, decimals: int = 4):
+    """
+    This function evaluates the maximum NEV of a batch of candidates, only solving the ones that are not cached.
+    @:params
+    candidates: np.array, the R and X values of the reactors with shape (n_candidates, n_reactors, 2)
+    reactor_names: list, the names of the grounding reactors
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the NEV and gradient of the candidates already evaluated, updated in place
+    decimals: int, the decimals used to consider two candidates the same
+    @:return
+    nev: np.array, the maximum NEV of each candidate with shape (n_candidates,)
+    """
+    keys = [get_candidate_key(candidate, decimals) for candidate in candidates]
+    missing = list(dict.fromkeys(key for key in keys if key not in cache))
+
+    results = map_in_pool(evaluate_grounding_candidate, [(reactor_names, key) for key in missing], pool)
+    cache.update(zip(missing, results))
+
+    nev = np.array([cache[key][0] for key in keys])
+
+    return nev
+
+
+def get_nev_sensitivity(candidate: np.ndarray, reactor_names: list, pool, cache: dict, decimals: int = 4):
+    """
+    This function gets the linear sensitivity of the maximum NEV to the R and X of each reactor of a candidate. The
+    sensitivity is computed with the admittance matrix of the solution of the candidate (see get_nev_gradient), so
+    it needs one power flow, none if the candidate was already evaluated.
+    @:params
+    candidate: np.array, the R and X values of the reactors with shape (n_reactors, 2)
+    reactor_names: list, the names of the grounding reactors
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the NEV and gradient of the candidates already evaluated, updated in place
+    decimals: int, the decimals used to consider two candidates the same
+    @:return
+    nev: float, the maximum NEV of the candidate
+    gradient: np.array, the derivative of the NEV in V/Ohm with shape (n_reactors, 2)
+    """
+    evaluate_grounding_batch(candidate[np.newaxis], reactor_names, pool, cache, decimals)
+
+    return cache[get_candidate_key(candidate, decimals)]
+
+
+def get_pareto_front(nev: np.ndarray, cost: np.ndarray):
+    """
+    This function gets the candidates that are not dominated in NEV and cost (both minimized).
+    @:params
+    nev: np.array, the maximum NEV of each candidate
+    cost: np.array, the cost of each candidate
+    @:return
+    front: np.array, the indexes of the Pareto front sorted by cost
+    """
+    order = np.lexsort((nev, cost))
+    front = []
+    best_nev = np.inf
+    for index in order:
+        if nev[index] < best_nev:
+            front.append(index)
+            best_nev = nev[index]
+
+    return np.array(front, dtype=int)
+
+
+def get_gradient_step(
+        candidate: np.ndarray,
+        nev: float,
+        gradient: np.ndarray,
+        nev_limit: float,
+        max_step: float):
+    """
+    This function moves a candidate using the linear sensitivity model of the NEV. Unfeasible candidates take the
+    Newton step along the gradient that reaches the NEV limit in the linear model. Feasible candidates increase the R
+    and X of every reactor by the same amount (a cheaper grounding), up to the limit predicted by the linear model,
+    or by max_step when the model predicts that the NEV does not increase. Every change is clipped to max_step.
+    @:params
+    candidate: np.array, the R and X values of the reactors with shape (n_reactors, 2)
+    nev: float, the maximum NEV of the candidate
+    gradient: np.array, the derivative of the NEV with shape (n_reactors, 2)
+    nev_limit: float, the maximum NEV allowed in Volts
+    max_step: float, the maximum change of each variable in Ohms
+    @:return
+    new_candidate: np.array, the moved candidate
+    """
+    gradient_norm = np.sum(gradient ** 2)
+    if not np.isfinite(nev) or gradient_norm == 0:
+        return candidate
+
+    if nev > nev_limit:
+        # Newton step on the linear model to reach the limit
+        step = -(nev - nev_limit) * gradient / gradient_norm
+    else:
+        # Increase the impedance of every reactor by the same amount up to the limit
+        direction = np.ones_like(candidate)
+        slope = np.sum(gradient * direction)
+        step = direction * (max_step if slope <= 0 else (nev_limit - nev) / slope)
+
+    new_candidate = candidate + np.clip(step, -max_step, max_step)
+
+    return new_candidate
+
+
+def optimize_grounding(
+        network,
+        nev_limit: float,
+        r_bounds: tuple = (0.1, 100.0),
+        x_bounds: tuple = (0.0, 50.0),
+        n_iterations: int = 10,
+        batch_size: int = 32,
+        n_gradients: int = 4,
+        max_step: float = 10.0,
+        cost_function=get_grounding_cost,
+        n_workers: int = None,
+        seed: int = None):
+    """
+    This function finds the per-bus grounding impedances that give the best trade-off between NEV and grounding cost.
+    Each iteration evaluates a batch of random perturbations of the Pareto front in the worker pool, and moves the
+    cheapest members of the front with the linear sensitivity model of the NEV.
+    @:params
+    network: IEEE13Nodes, the network with the grounding reactors already added by add_reactors
+    nev_limit: float, the maximum NEV allowed in Volts
+    r_bounds: tuple, the minimum and maximum resistance of the reactors in Ohms
+    x_bounds: tuple, the minimum and maximum reactance of the reactors in Ohms
+    n_iterations: int, the number of iterations
+    batch_size: int, the number of random candidates evaluated in each iteration
+    n_gradients: int, the number of candidates of the front moved with gradients in each iteration, 0 to disable it
+    max_step: float, the maximum change of each variable in Ohms in a gradient step
+    cost_function: callable, the cost of a batch of candidates, by default get_grounding_cost
+    n_workers: int, the number of worker processes
+    seed: int, the seed of the random generator
+    @:return
+    pareto: dict, the reactor names, and the candidates, NEV, cost and feasibility of the Pareto front
+    """
+    reactor_names = network.get_grounding_reactors()
+    if len(reactor_names) == 0:
+        raise ValueError("The network has no grounding reactors. Use add_reactors before optimizing them.")
+
+    rng = np.random.default_rng(seed)
+    lower = np.array([r_bounds[0], x_bounds[0]])
+    upper = np.array([r_bounds[1], x_bounds[1]])
+    shape = (len(reactor_names), 2)
+    cache = {}
+
+    candidates = rng.uniform(lower, upper, size=(batch_size, *shape))
+    all_candidates = np.empty((0, *shape))
+    all_nev = np.empty(0)
+
+    with get_pool(network.get_setup(), n_workers) as pool:
+        for _ in range(n_iterations):
+            nev = evaluate_grounding_batch(candidates, reactor_names, pool, cache)
+            all_candidates = np.concatenate([all_candidates, candidates])
+            all_nev = np.concatenate([all_nev, nev])
+            front = get_pareto_front(all_nev, cost_function(all_candidates))
+
+            # Random perturbations of the front
+            parents = all_candidates[rng.choice(front, size=batch_size)]
+            scale = 0.1 * (upper - lower)
+            new_candidates = [parents + rng.normal(0, 1, parents.shape) * scale]
+
+            # Gradient steps with the linear sensitivity model
+            for index in front[:n_gradients]:
+                base_nev, gradient = get_nev_sensitivity(all_candidates[index], reactor_names, pool, cache)
+                new_candidates.append(
+                    get_gradient_step(all_candidates[index], base_nev, gradient, nev_limit, max_step)[np.newaxis]
+                )
+
+            candidates = np.clip(np.concatenate(new_candidates), lower, upper)
+
+        nev = evaluate_grounding_batch(candidates, reactor_names, pool, cache)
+
+    all_candidates = np.concatenate([all_candidates, candidates])
+    all_nev = np.concatenate([all_nev, nev])
+    all_cost = cost_function(all_candidates)
+    front = get_pareto_front(all_nev, all_cost)
+
+    pareto = {
+        'reactor_names': reactor_names,
+        'candidates': all_candidates[front],
+        'nev': all_nev[front],
+        'cost': all_cost[front],
+        'feasible': all_nev[front] <= nev_limit
+    }
+
+    return pareto
@@ -0,0 +1,312 @@
+""" This script contains functions to get the PV hosting capacity of the IEEE 13 nodes network. A PV candidate is
+placed in each phase of every bus (and as a three-phase system where possible), and the largest power that keeps the
+change of the voltages, the NEV and the VUF over the network without PV inside their limits is found with a linearized
+first guess refined by bisection. """
+
+import hashlib
+import json
+import numpy as np
+from Utils.constants_ieee13nodes import HOSTING_CONNECTIONS, HOSTING_LIMITS, NEUTRAL_INDEX, NODES_NAME, NODES_NUMBER
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+from Utils.parallel_utils import get_pool, get_worker_network, map_in_pool
+from Utils.utils_ieee13nodes import get_complex_voltages_array, get_mag_voltages_array, get_unbalance_metrics
+
+# Hosting capacity of the buses already studied, by circuit hash and bus
+_hosting_cache = {}
+
+
+def get_pv_definition(name: str, bus: str, phases: list, kw: float, pf: float = 1.0, neutral_node: int = 4):
+    """
+    This function gets the definition of a PV system in a bus.
+    @:params
+    name: str, the name of the PV system
+    bus: str, the name of the bus
+    phases: list, the nodes of the phases
+    kw: float, the rated power in kW
+    pf: float, the power factor
+    neutral_node: int, the node of the neutral
+    @:return
+    definition: str, the properties of the PV system
+    """
+    active_bus = DSSCircuit.ActiveBus(bus)
+    nodes = ".".join(str(phase) for phase in phases)
+    if len(phases) == 1:
+        kv = active_bus.kVBase
+        if neutral_node in active_bus.Nodes:
+            nodes += f".{neutral_node}"
+    else:
+        kv = active_bus.kVBase * np.sqrt(3)
+
+    definition = (f"phases={len(phases)} bus1={bus}.{nodes} kV={kv} kVA={kw} Pmpp={kw} irradiance=1 pf={pf} "
+                  f"%cutin=0.1 %cutout=0.1")
+
+    return definition
+
+
+def get_circuit_hash(setup: dict, limits: dict):
+    """
+    This function gets a hash of the circuit file, the setup of the network and the limits of the study.
+    @:params
+    setup: dict, the setup of the network as returned by IEEE13Nodes.get_setup
+    limits: dict, the limits of the study
+    @:return
+    circuit_hash: str, the hash
+    """
+    hash_function = hashlib.sha256()
+    with open(setup['circuit_path'], 'rb') as circuit_file:
+        hash_function.update(circuit_file.read())
+    hash_function.update(json.dumps([setup, limits], sort_keys=True, default=str).encode())
+
+    return hash_function.hexdigest()
+
+
+def get_limit_values(buses_names: list):
+    """
+    This function gets the values of the network that are compared against the hosting limits.
+    @:params
+    buses_names: list, the names of the buses
+    @:return
+    values: dict, the maximum and minimum phase voltage in pu, the maximum NEV in V and the maximum VUF in %
+    """
+    voltages = get_complex_voltages_array(buses_names)
+    voltages_pu = get_mag_voltages_array(buses_names, mag_pu=True)[:, :NEUTRAL_INDEX]
+
+    values = {
+        'v_max': np.nanmax(voltages_pu),
+        'v_min': np.nanmin(voltages_pu),
+        'nev': np.nanmax(np.abs(voltages[:, NEUTRAL_INDEX])) if np.any(np.isfinite(voltages[:, NEUTRAL_INDEX]))
+        else 0.0,
+        'vuf': np.nanmax(get_unbalance_metrics(voltages)['vuf'])
+    }
+
+    return values
+
+
+def get_limit_changes(values: dict, base: dict):
+    """
+    This function gets the change of the values of the network over the network without PV, positive when the values
+    move towards their limits.
+    @:params
+    values: dict, the values as returned by get_limit_values
+    base: dict, the values of the network without the PV candidate
+    @:return
+    changes: dict, the voltage rise and drop in pu, and the increase of the NEV in V and of the VUF in %
+    """
+    changes = {
+        'v_max': values['v_max'] - base['v_max'],
+        'v_min': base['v_min'] - values['v_min'],
+        'nev': values['nev'] - base['nev'],
+        'vuf': values['vuf'] - base['vuf']
+    }
+
+    return changes
+
+
+def get_violated_limit(values: dict, base: dict, limits: dict):
+    """
+    This function gets the first limit violated by the change of the values of the network over the network without
+    PV.
+    @:params
+    values: dict, the values as returned by get_limit_values
+    base: dict, the values of the network without the PV candidate
+    limits: dict, the limits of the study
+    @:return
+    limit: str, the name of the violated limit, None if every limit is satisfied
+    """
+    changes = get_limit_changes(values, base)
+    for key in ('v_max', 'v_min', 'nev', 'vuf'):
+        if changes[key] > limits[key]:
+            return key
+
+    return None
+
+
+def solve_pv_power(network, pv_name: str, kw: float, base: dict, limits: dict):
+    """
+    This function solves the network with a PV candidate at a given power. The power is set in a transaction that is
+    undone after the solution, and the solution starts from the taps of the compiled circuit, so it does not depend on
+    the powers evaluated before.
+    @:params
+    network: IEEE13Nodes, the network of the worker with the PV candidate
+    pv_name: str, the name of the PV candidate
+    kw: float, the power of the PV candidate in kW
+    base: dict, the values of the network without the PV candidate
+    limits: dict, the limits of the study
+    @:return
+    values: dict, the values of the network, None if it does not converge
+    limit: str, the violated limit, 'convergence' if the power flow does not converge
+    """
+    with network.transaction() as transaction:
+        transaction.edit(f"PVSystem.{pv_name}", {'kVA': kw, 'Pmpp': kw})
+    try:
+        network.reset_solution_state()
+        network.run_power_flow(show_message=False)
+        if not DSSSolution.Converged:
+            return None, 'convergence'
+        values = get_limit_values(network.buses_names)
+    finally:
+        network.rollback()
+
+    return values, get_violated_limit(values, base, limits)
+
+
+def get_linear_guess(base: dict, probe: dict, probe_kw: float, limits: dict, max_kw: float):
+    """
+    This function extrapolates linearly the power that reaches each limit from the changes of the values with a small
+    PV power.
+    @:params
+    base: dict, the values of the network without the PV candidate
+    probe: dict, the values of the network with probe_kw
+    probe_kw: float, the power of the probe in kW
+    limits: dict, the limits of the study
+    max_kw: float, the maximum power of the study in kW
+    @:return
+    guess: float, the first guess of the hosting capacity in kW
+    """
+    guess = max_kw
+    changes = get_limit_changes(probe, base)
+    for key, limit in limits.items():
+        slope = changes[key] / probe_kw
+        if slope > 0 and np.isfinite(slope):
+            guess = min(guess, limit / slope)
+
+    return guess
+
+
+def find_pv_capacity(network, pv_name: str, base: dict, limits: dict, max_kw: float, tolerance_kw: float):
+    """
+    This function finds the largest power of a PV candidate that keeps the network inside the limits.
+    @:params
+    network: IEEE13Nodes, the network of the worker with the PV candidate
+    pv_name: str, the name of the PV candidate
+    base: dict, the values of the network without the PV candidate
+    limits: dict, the limits of the study
+    max_kw: float, the maximum power evaluated in kW
+    tolerance_kw: float, the tolerance of the bisection in kW
+    @:return
+    capacity: float, the hosting capacity in kW
+    limit: str, the limit that defines the capacity, None if no limit is reached
+    """
+    probe_kw = tolerance_kw
+    probe, limit = solve_pv_power(network, pv_name, probe_kw, base, limits)
+    lower, upper = 0.0, max_kw
+    if limit is not None:
+        upper = probe_kw
+    else:
+        lower = probe_kw
+        # Bracket the hosting capacity around the linear guess
+        guess = get_linear_guess(base, probe, probe_kw, limits, max_kw)
+        for power in (guess, min(1.5 * guess, max_kw), max_kw):
+            if power <= lower:
+                continue
+            _, power_limit = solve_pv_power(network, pv_name, power, base, limits)
+            if power_limit is None:
+                lower = power
+            else:
+                upper, limit = power, power_limit
+                break
+
+    # Bisection, only needed when a limit was found, otherwise the capacity is max_kw
+    while limit is not None and upper - lower > tolerance_kw:
+        middle = (lower + upper) / 2
+        _, middle_limit = solve_pv_power(network, pv_name, middle, base, limits)
+        if middle_limit is None:
+            lower = middle
+        else:
+            upper, limit = middle, middle_limit
+
+    return lower, limit
+
+
+def evaluate_bus_hosting(task: tuple):
+    """
+    This function gets the hosting capacity of every connection of one bus in the network of the worker. Each PV
+    candidate is created in a transaction that is undone when its capacity is found.
+    @:params
+    task: tuple, the name of the bus, the limits, the maximum power and the tolerance in kW
+    @:return
+    hosting: dict, the hosting capacity in kW and the limiting constraint of each connection of HOSTING_CONNECTIONS
+    """
+    bus_name, limits, max_kw, tolerance_kw = task
+    network = get_worker_network()
+    phases = [node for node in DSSCircuit.ActiveBus(bus_name).Nodes if node in NODES_NUMBER[:NEUTRAL_INDEX]]
+
+    candidates = {NODES_NAME[phase - 1]: [phase] for phase in phases}
+    if len(phases) == 3:
+        candidates['3ph'] = sorted(phases)
+
+    hosting = {'capacity': np.full(len(HOSTING_CONNECTIONS), np.nan),
+               'limit': [None] * len(HOSTING_CONNECTIONS)}
+
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+    if not DSSSolution.Converged:
+        raise RuntimeError("The power flow of the network without PV does not converge.")
+    base = get_limit_values(network.buses_names)
+
+    for connection, connection_phases in candidates.items():
+        pv_name = f"hc_{bus_name}_{connection}"
+        with network.transaction() as transaction:
+            transaction.new(f"PVSystem.{pv_name}", get_pv_definition(pv_name, bus_name, connection_phases, tolerance_kw,
+                                                                     neutral_node=network.neutral_node))
+        try:
+            capacity, limit = find_pv_capacity(network, pv_name, base, limits, max_kw, tolerance_kw)
+        finally:
+            network.rollback()
+
+        index = HOSTING_CONNECTIONS.index(connection)
+        hosting['capacity'][index] = capacity
+        hosting['limit'][index] = limit
+
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+
+    return hosting
+
+
+def get_hosting_capacity(
+        network,
+        limits: dict = None,
+        max_kw: float = 5000.0,
+        tolerance_kw: float = 5.0,
+        n_workers: int = None,
+        use_cache: bool = True):
+    """
+    This function gets the PV hosting capacity map of the network, one bus per worker task. The buses already studied
+    for the same circuit, setup and limits are taken from the cache.
+    @:params
+    network: IEEE13Nodes, the network with the power flow solved
+    limits: dict, the allowed change of each value over the network without PV, by default HOSTING_LIMITS
+    max_kw: float, the maximum power evaluated in kW
+    tolerance_kw: float, the tolerance of the bisection in kW
+    n_workers: int, the number of worker processes
+    use_cache: bool, if the results of the same circuit are reused
+    @:return
+    hosting_map: dict, the buses, the connections (HOSTING_CONNECTIONS) and the arrays:
+        capacity (n_buses, n_connections): hosting capacity in kW, max_kw when no limit is reached, NaN if the
+        connection does not exist
+        limit (n_buses, n_connections): the limit that defines the capacity, None if no limit is reached
+    """
+    if network.buses_names is None:
+        raise ValueError("The power flow has to be solved before getting the hosting capacity.")
+
+    limits = HOSTING_LIMITS if limits is None else {**HOSTING_LIMITS, **limits}
+    setup = network.get_setup()
+    circuit_hash = get_circuit_hash(setup, [limits, max_kw, tolerance_kw])
+    buses_names = network.buses_names
+
+    missing = [bus for bus in buses_names if not use_cache or (circuit_hash, bus) not in _hosting_cache]
+    if len(missing) > 0:
+        with get_pool(setup, n_workers) as pool:
+            results = map_in_pool(evaluate_bus_hosting, [(bus, limits, max_kw, tolerance_kw) for bus in missing],
+                                  pool)
+        _hosting_cache.update({(circuit_hash, bus): result for bus, result in zip(missing, results)})
+
+    hosting_map = {
+        'buses_names': buses_names,
+        'connections': HOSTING_CONNECTIONS,
+        'capacity': np.stack([_hosting_cache[(circuit_hash, bus)]['capacity'] for bus in buses_names]),
+        'limit': np.array([_hosting_cache[(circuit_hash, bus)]['limit'] for bus in buses_names], dtype=object)
+    }
+
+    return hosting_map
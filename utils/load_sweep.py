@@ -0,0 +1,172 @@
+""" This script contains functions to sweep the load model and the load level of the IEEE 13 nodes network. The kW,
+kvar, model and ZIP coefficients of every load are written from arrays in one pass over the Loads collection, and the
+results of the model x level grid are collected in preallocated arrays. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import LOAD_LEVELS, LOAD_MODELS, NODES_NUMBER
+from Utils.loss_breakdown import get_total_losses
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+from Utils.parallel_utils import get_pool, get_worker_network
+from Utils.utils_ieee13nodes import get_complex_voltages_array, get_mag_voltages_array
+
+N_ZIPV = 7
+
+
+def get_load_arrays(load_names: list):
+    """
+    This function gets the kW, kvar, model and ZIP coefficients of every load in one pass over the Loads collection.
+    @:params
+    load_names: list, the names of the loads
+    @:return
+    loads: dict, the arrays kw and kvar with shape (n_loads,), model with shape (n_loads,) and zipv with shape
+    (n_loads, 7), in the order of load_names
+    """
+    values_by_name = {}
+    index = DSSCircuit.Loads.First
+    while index > 0:
+        zipv = np.zeros(N_ZIPV)
+        zipv[:len(DSSCircuit.Loads.ZIPV)] = DSSCircuit.Loads.ZIPV
+        values_by_name[DSSCircuit.Loads.Name] = (DSSCircuit.Loads.kW, DSSCircuit.Loads.kvar, DSSCircuit.Loads.Model,
+                                                 zipv)
+        index = DSSCircuit.Loads.Next
+
+    values = [values_by_name[load] for load in load_names]
+    loads = {
+        'kw': np.array([value[0] for value in values], dtype=float),
+        'kvar': np.array([value[1] for value in values], dtype=float),
+        'model': np.array([value[2] for value in values], dtype=int),
+        'zipv': np.array([value[3] for value in values], dtype=float).reshape(-1, N_ZIPV)
+    }
+
+    return loads
+
+
+def set_load_arrays(load_names: list, kw, kvar, model=None, zipv=None):
+    """
+    This function sets the kW, kvar, model and ZIP coefficients of every load in one pass over the Loads collection.
+    @:params
+    load_names: list, the names of the loads
+    kw: array, the active power of each load in kW
+    kvar: array, the reactive power of each load in kvar
+    model: array or int, the OpenDSS model of each load (or of all of them), None to keep the models
+    zipv: array, the ZIP coefficients with shape (n_loads, 7) or (7,), only used by the loads with model 8
+    @:return -> None
+    """
+    n_loads = len(load_names)
+    kw = np.broadcast_to(np.asarray(kw, dtype=float), (n_loads,))
+    kvar = np.broadcast_to(np.asarray(kvar, dtype=float), (n_loads,))
+    model = None if model is None else np.broadcast_to(np.asarray(model, dtype=int), (n_loads,))
+    zipv = None if zipv is None else np.broadcast_to(np.asarray(zipv, dtype=float), (n_loads, N_ZIPV))
+    position = {load: i for i, load in enumerate(load_names)}
+
+    index = DSSCircuit.Loads.First
+    while index > 0:
+        i = position.get(DSSCircuit.Loads.Name)
+        if i is not None:
+            if model is not None:
+                if model[i] == 8 and zipv is not None:
+                    DSSCircuit.Loads.ZIPV = zipv[i].tolist()
+                DSSCircuit.Loads.Model = int(model[i])
+            DSSCircuit.Loads.kW = float(kw[i])
+            DSSCircuit.Loads.kvar = float(kvar[i])
+        index = DSSCircuit.Loads.Next
+
+
+def get_load_power():
+    """
+    This function gets the active power served to the loads in one pass over the Loads collection.
+    @:params -> None
+    @:return
+    load_kw: float, the power of the loads in kW
+    """
+    load_kw = 0.0
+    index = DSSCircuit.Loads.First
+    while index > 0:
+        load_kw += np.sum(np.asarray(DSSCircuit.ActiveCktElement.Powers)[0::2])
+        index = DSSCircuit.Loads.Next
+
+    return float(load_kw)
+
+
+def evaluate_load_scenario(task: tuple):
+    """
+    This function solves one load model and load level in the network of the worker, and restores the loads. The
+    solution starts from the taps of the compiled circuit and the no-load voltages, so it does not depend on the
+    scenarios solved before by the worker.
+    @:params
+    task: tuple, the position of the scenario in the grid (model, level), the load model (see LOAD_MODELS) and the
+    load level
+    @:return
+    result: dict, the position, the convergence, the voltages in pu and in V with shape (n_buses, n_nodes), the
+    losses in kW and the load served in kW
+    """
+    position, load_model, level = task
+    network = get_worker_network()
+    base = get_load_arrays(network.load_names)
+
+    set_load_arrays(network.load_names, base['kw'] * level, base['kvar'] * level, load_model.get('model'),
+                    load_model.get('zipv'))
+    try:
+        network.reset_solution_state()
+        network.run_power_flow(show_message=False)
+
+        result = {'position': position, 'converged': DSSSolution.Converged}
+        if result['converged']:
+            result['voltages_pu'] = get_mag_voltages_array(network.buses_names, mag_pu=True)
+            result['voltages'] = np.abs(get_complex_voltages_array(network.buses_names))
+            result['losses'] = get_total_losses()
+            result['load_kw'] = get_load_power()
+    finally:
+        # Back to the loads of the setup
+        set_load_arrays(network.load_names, base['kw'], base['kvar'], base['model'], base['zipv'])
+        network.invalidate_cache()
+
+    return result
+
+
+def run_load_sweep(network, models: dict = None, levels: list = None, n_workers: int = None, chunk_size: int = 1):
+    """
+    This function solves the grid of load models x load levels in parallel. The results are written in arrays
+    allocated before the sweep, as the results arrive.
+    @:params
+    network: IEEE13Nodes, the network with the power flow solved
+    models: dict, the load models to compare, by default LOAD_MODELS
+    levels: list, the load levels as multipliers of the kW and kvar of the loads, by default LOAD_LEVELS
+    n_workers: int, the number of worker processes
+    chunk_size: int, the number of scenarios sent together to a worker
+    @:return
+    sweep: dict, the models, the levels, the buses and the arrays:
+        converged (n_models, n_levels): if the power flow converged
+        voltages_pu, voltages (n_models, n_levels, n_buses, n_nodes): the voltages in pu and V (NEV in the neutral)
+        losses, load_kw (n_models, n_levels): the losses, including the grounding reactors, and the load served in kW
+    """
+    if network.buses_names is None:
+        raise ValueError("The power flow has to be solved before sweeping the loads.")
+
+    models = LOAD_MODELS if models is None else models
+    levels = LOAD_LEVELS if levels is None else list(levels)
+    shape = (len(models), len(levels))
+    grid_shape = shape + (len(network.buses_names), len(NODES_NUMBER))
+
+    sweep = {
+        'models': list(models.keys()),
+        'levels': np.asarray(levels, dtype=float),
+        'buses_names': network.buses_names,
+        'converged': np.zeros(shape, dtype=bool),
+        'voltages_pu': np.full(grid_shape, np.nan),
+        'voltages': np.full(grid_shape, np.nan),
+        'losses': np.full(shape, np.nan),
+        'load_kw': np.full(shape, np.nan)
+    }
+
+    tasks = [((i, j), load_model, level) for i, load_model in enumerate(models.values())
+             for j, level in enumerate(levels)]
+    with get_pool(network.get_setup(), n_workers) as pool:
+        for result in pool.map(evaluate_load_scenario, tasks, chunksize=chunk_size):
+            position = result['position']
+            sweep['converged'][position] = result['converged']
+            if result['converged']:
+                for key in ('voltages_pu', 'voltages', 'losses', 'load_kw'):
+                    sweep[key][position] = result[key]
+
+    return sweep
@@ -0,0 +1,141 @@
+""" This script contains functions to split the losses of the IEEE 13 nodes network by element and by conductor.
+The loss of each conductor of a line is obtained from its resistance matrix, so the losses in the neutral conductor
+can be separated from the losses in the phases. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import GROUNDING_REACTOR_PREFIX, NEUTRAL_INDEX, NODES_INDEX, NODES_NUMBER
+from Utils.opendss_engine import DSSCircuit
+
+
+def get_element_losses(element_class: str, element_names: list):
+    """
+    This function gets the losses of a class of elements from one bulk call to the engine.
+    @:params
+    element_class: str, the class of the elements, e.g. 'transformer'
+    element_names: list, the names of the elements
+    @:return
+    losses: np.array, the active losses of each element in kW with shape (n_elements,)
+    """
+    all_names = [name.lower() for name in DSSCircuit.AllElementNames]
+    all_losses = np.asarray(DSSCircuit.AllElementLosses)[0::2]
+    element_index = {name: i for i, name in enumerate(all_names)}
+
+    losses = np.array([all_losses[element_index[f'{element_class}.{name}'.lower()]] for name in element_names],
+                      dtype=float)
+
+    return losses
+
+
+def get_total_losses():
+    """
+    This function gets the losses of the network as the sum of the active power of every power delivery element. Unlike
+    Circuit.Losses, it includes the losses of the reactors connected to the ground.
+    @:params -> None
+    @:return
+    losses: float, the losses in kW
+    """
+    losses = 0.0
+    pd_elements = DSSCircuit.PDElements
+    index = pd_elements.First
+    while index > 0:
+        losses += np.sum(np.asarray(DSSCircuit.ActiveCktElement.Powers)[0::2])
+        index = pd_elements.Next
+
+    return float(losses)
+
+
+def get_line_conductor_losses(lines_names: list, neutral_node: int = 4, ground_node: int = 0):
+    """
+    This function gets the losses of each conductor of every line as Re(conj(I_k) * (R I)_k), where R is the
+    resistance matrix of the line. The mutual terms are assigned to the conductor k.
+    @:params
+    lines_names: list, the names of the lines
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground, used by the neutral after a Kron reduction
+    @:return
+    losses: np.array, the losses in kW with shape (n_lines, n_nodes), columns in the order of NODES_NUMBER
+    """
+    line_index = {line: i for i, line in enumerate(lines_names)}
+    losses = np.zeros((len(lines_names), len(NODES_NUMBER)))
+
+    lines = DSSCircuit.Lines
+    element = DSSCircuit.ActiveCktElement
+    index = lines.First
+    while index > 0:
+        if lines.Name in line_index:
+            n_conductors = element.NumConductors
+            currents = np.asarray(element.Currents)
+            currents = currents[0::2] + 1j * currents[1::2]
+            # Series current of each conductor (mean of both terminals)
+            series_currents = (currents[:n_conductors] - currents[n_conductors:2 * n_conductors]) / 2
+
+            r_matrix = np.asarray(lines.Rmatrix).reshape(n_conductors, n_conductors) * lines.Length
+            conductor_losses = np.real(np.conj(series_currents) * (r_matrix @ series_currents)) / 1000
+
+            nodes = np.asarray(element.NodeOrder)[:n_conductors]
+            nodes = np.where(nodes == ground_node, neutral_node, nodes)
+            # The conductors connected to nodes out of NODES_NUMBER (e.g. the open switch) are skipped
+            known = np.array([node in NODES_INDEX for node in nodes], dtype=bool)
+            columns = np.array([NODES_INDEX[node] for node in nodes[known]], dtype=int)
+            np.add.at(losses[line_index[lines.Name]], columns, conductor_losses[known])
+
+        index = lines.Next
+
+    return losses
+
+
+def get_loss_breakdown(
+        lines_names: list,
+        transformers_names: list,
+        reactor_names: list,
+        neutral_node: int = 4,
+        ground_node: int = 0):
+    """
+    This function gets the losses of the network split by element and by conductor.
+    @:params
+    lines_names: list, the names of the lines
+    transformers_names: list, the names of the transformers
+    reactor_names: list, the names of the reactors
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground
+    @:return
+    breakdown: dict, arrays of losses in kW:
+        lines (n_lines, n_nodes): losses of each conductor of each line
+        transformers (n_transformers,): losses of each transformer
+        reactors (n_reactors,): losses of each reactor
+        phase, neutral, grounding and transformer: the aggregated losses
+        total: the sum of the aggregated losses
+        circuit_total: the losses reported by the engine (Circuit.Losses), which do not include the losses of the
+        reactors connected to the ground, so it is lower than total when the network has grounding reactors
+    """
+    lines = get_line_conductor_losses(lines_names, neutral_node, ground_node)
+    transformers = get_element_losses('transformer', transformers_names)
+    reactors = get_element_losses('reactor', reactor_names)
+    is_grounding = np.array([reactor.startswith(GROUNDING_REACTOR_PREFIX) for reactor in reactor_names], dtype=bool)
+
+    breakdown = {
+        'lines': lines,
+        'transformers': transformers,
+        'reactors': reactors,
+        'phase': np.sum(np.delete(lines, NEUTRAL_INDEX, axis=1)),
+        'neutral': np.sum(lines[:, NEUTRAL_INDEX]) + np.sum(reactors[~is_grounding]),
+        'grounding': np.sum(reactors[is_grounding]),
+        'transformer': np.sum(transformers)
+    }
+    breakdown['total'] = breakdown['phase'] + breakdown['neutral'] + breakdown['grounding'] + breakdown['transformer']
+    breakdown['circuit_total'] = DSSCircuit.Losses[0] / 1000
+
+    return breakdown
+
+
+def stack_loss_breakdowns(breakdowns: list):
+    """
+    This function stacks the loss breakdowns of several scenarios or time steps, so they can be aggregated with numpy.
+    @:params
+    breakdowns: list, the loss breakdowns of each scenario as returned by get_loss_breakdown
+    @:return
+    stacked: dict, the same keys with a first dimension for the scenarios
+    """
+    stacked = {key: np.stack([breakdown[key] for breakdown in breakdowns]) for key in breakdowns[0]}
+
+    return stacked
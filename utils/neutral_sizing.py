@@ -0,0 +1,283 @@
+""" This script contains functions to size the neutral conductor of the 4-wire IEEE 13 nodes network. A design gives,
+for each LineGeometry, the wire of the neutral and optionally its position (x, h). The impedance matrices of each
+geometry with each neutral option are computed once and cached, and the lines are edited with the cached matrices in
+one transaction, so thousands of designs are solved without compiling the circuit. """
+
+import itertools
+import numpy as np
+from Utils.circuit_transaction import format_property_value
+from Utils.constants_ieee13nodes import NEUTRAL_CONDUCTORS, NEUTRAL_INDEX, NEUTRAL_WIRE_CATALOG
+from Utils.opendss_engine import DSSCircuit, DSSSolution, DSSText
+from Utils.loss_breakdown import get_total_losses
+from Utils.parallel_utils import COMPILE_KEYS, get_pool, get_worker_network, map_in_pool
+from Utils.utils_ieee13nodes import get_mag_voltages_array
+
+LINE_UNITS_FT = 5
+
+# Names of the length units of OpenDSS, by their code
+LINE_UNITS_NAMES = {0: 'none', 1: 'mi', 2: 'kft', 3: 'km', 4: 'm', 5: 'ft', 6: 'in', 7: 'cm', 8: 'mm'}
+
+# Feet in one unit of length, the lines without units are taken in feet as the geometries of the circuit
+LENGTH_TO_FT = {'none': 1.0, 'mi': 5280.0, 'kft': 1000.0, 'km': 3280.839895, 'm': 3.280839895, 'ft': 1.0,
+                'in': 1 / 12, 'cm': 0.03280839895, 'mm': 0.003280839895}
+
+# Property of a LineGeometry that sets each type of conductor, by the class of its data
+CONDUCTOR_PROPERTIES = {'WireData': 'wire', 'CNData': 'cncable', 'TSData': 'tscable'}
+
+# Impedance matrices of the geometries with each neutral option, by circuit (the compile keys of the setup), geometry
+# and option
+_impedance_cache = {}
+
+
+def get_neutral_options(wires: list = None, positions: list = None):
+    """
+    This function gets the options of the neutral of one geometry from a list of wires and positions.
+    @:params
+    wires: list, the names of the wires, by default every wire of NEUTRAL_WIRE_CATALOG
+    positions: list, the (x, h, units) of the neutral, None (or [None]) to keep the position of each geometry
+    @:return
+    options: list, the options as tuples (wire, x, h, units), x, h and units are None to keep the position
+    """
+    wires = list(NEUTRAL_WIRE_CATALOG.keys()) if wires is None else wires
+    positions = [None] if positions is None else positions
+    options = [(wire,) + ((None, None, None) if position is None else tuple(position))
+               for wire in wires for position in positions]
+
+    return options
+
+
+def get_neutral_designs(options: list, geometries: list = None, per_geometry: bool = False):
+    """
+    This function gets the designs of the neutral of the network.
+    @:params
+    options: list, the neutral options as returned by get_neutral_options
+    geometries: list, the geometries whose neutral changes, by default the ones of NEUTRAL_CONDUCTORS
+    per_geometry: bool, if every combination of options across the geometries is a design, otherwise the same option
+    is used in every geometry
+    @:return
+    designs: list, the designs as dicts {geometry: option}
+    """
+    geometries = list(NEUTRAL_CONDUCTORS.keys()) if geometries is None else [geometry.lower()
+                                                                            for geometry in geometries]
+    if per_geometry:
+        return [dict(zip(geometries, combination))
+                for combination in itertools.product(options, repeat=len(geometries))]
+
+    return [{geometry: option for geometry in geometries} for option in options]
+
+
+def get_lines_by_geometry(lines_names: list):
+    """
+    This function gets the lines defined by each geometry.
+    @:params
+    lines_names: list, the names of the lines
+    @:return
+    lines_by_geometry: dict, the names of the lines of each geometry
+    """
+    lines_by_geometry = {}
+    for line in lines_names:
+        DSSCircuit.SetActiveElement(f'line.{line}')
+        geometry = DSSCircuit.ActiveElement.Properties('geometry').Val.lower()
+        if geometry != '':
+            lines_by_geometry.setdefault(geometry, []).append(line)
+
+    return lines_by_geometry
+
+
+def get_line_length(line: str):
+    """
+    This function gets the length of a line and its units.
+    @:params
+    line: str, the name of the line
+    @:return
+    length: float, the length of the line in its units
+    units: str, the units of the length, e.g. 'ft'
+    """
+    DSSCircuit.SetActiveElement(f'line.{line}')
+    length = float(DSSCircuit.ActiveElement.Properties('length').Val)
+    units = DSSCircuit.ActiveElement.Properties('units').Val.lower()
+
+    return length, units
+
+
+def define_catalog_wires():
+    """
+    This function defines in the circuit the wires of NEUTRAL_WIRE_CATALOG that are not defined yet.
+    @:params -> None
+    @:return -> None
+    """
+    DSSCircuit.SetActiveClass('WireData')
+    defined = {name.lower() for name in DSSCircuit.ActiveClass.AllNames}
+    commands = [f"New WireData.{wire} {definition}" for wire, definition in NEUTRAL_WIRE_CATALOG.items()
+                if wire.lower() not in defined]
+    if len(commands) > 0:
+        DSSText.Commands(commands)
+
+
+def get_conductor_properties():
+    """
+    This function gets the property of a LineGeometry that sets each conductor defined in the circuit.
+    @:params -> None
+    @:return
+    properties: dict, the property ('wire', 'cncable' or 'tscable') by the name of the conductor
+    """
+    properties = {}
+    for class_name, prop in CONDUCTOR_PROPERTIES.items():
+        DSSCircuit.SetActiveClass(class_name)
+        properties.update({name.lower(): prop for name in DSSCircuit.ActiveClass.AllNames})
+
+    return properties
+
+
+def get_geometry_copy_commands(geometry: str, copy_name: str):
+    """
+    This function gets the commands that define a copy of a geometry from its number of conductors and phases and the
+    data and position of each conductor.
+    @:params
+    geometry: str, the name of the geometry
+    copy_name: str, the name of the copy
+    @:return
+    commands: list, the OpenDSS commands
+    """
+    conductor_properties = get_conductor_properties()
+    line_geometries = DSSCircuit.LineGeometries
+    line_geometries.Name = geometry
+
+    commands = [f"New LineGeometry.{copy_name} nconds={line_geometries.Nconds} nphases={line_geometries.Phases} "
+                f"reduce={'y' if line_geometries.Reduce else 'n'}"]
+    for cond, (conductor, x, h, units) in enumerate(zip(line_geometries.Conductors, line_geometries.Xcoords,
+                                                        line_geometries.Ycoords, line_geometries.Units), start=1):
+        commands.append(f"Edit LineGeometry.{copy_name} cond={cond} "
+                        f"{conductor_properties[conductor.lower()]}={conductor} "
+                        f"units={LINE_UNITS_NAMES[int(units)]} x={x} h={h}")
+
+    return commands
+
+
+def format_matrix(values: np.ndarray):
+    """
+    This function formats a symmetric matrix as the lower triangle used by the OpenDSS commands.
+    @:params
+    values: np.array, the matrix with shape (n, n)
+    @:return
+    matrix: str, the matrix, e.g. '[1 | 2 3]'
+    """
+    rows = [" ".join(f"{value:.10g}" for value in values[i, :i + 1]) for i in range(len(values))]
+
+    return format_property_value(f"[{' | '.join(rows)}]")
+
+
+def get_geometry_matrices(network, geometry: str, option: tuple):
+    """
+    This function gets the impedance matrices per foot of a geometry with a neutral option. The matrices are computed
+    in a copy of the geometry, so the geometries of the circuit are not changed, and cached by the compile keys of the
+    setup of the network. The copy is defined from the properties of the geometry, because like= fails for the
+    geometries with cables.
+    @:params
+    network: IEEE13Nodes, the network of the worker
+    geometry: str, the name of the geometry
+    option: tuple, the neutral option (wire, x, h, units)
+    @:return
+    matrices: dict, the rmatrix, xmatrix and cmatrix of the lines as strings for the Edit commands
+    """
+    setup = network.get_setup()
+    key = (tuple(setup[compile_key] for compile_key in COMPILE_KEYS), geometry, option)
+    if key in _impedance_cache:
+        return _impedance_cache[key]
+
+    wire, x, h, units = option
+    copy_name = f"ns_{len(_impedance_cache)}"
+    position = "" if x is None else f" units={units} x={x} h={h}"
+    DSSText.Commands(get_geometry_copy_commands(geometry, copy_name) +
+                     [f"Edit LineGeometry.{copy_name} cond={NEUTRAL_CONDUCTORS[geometry]} wire={wire}{position}"])
+
+    line_geometries = DSSCircuit.LineGeometries
+    line_geometries.Name = copy_name
+    n_conductors = line_geometries.Nconds
+    frequency = DSSSolution.Frequency
+    matrices = {
+        prop: format_matrix(np.asarray(values(frequency, 1.0, LINE_UNITS_FT)).reshape(n_conductors, n_conductors))
+        for prop, values in (('rmatrix', line_geometries.Rmatrix), ('xmatrix', line_geometries.Xmatrix),
+                             ('cmatrix', line_geometries.Cmatrix))
+    }
+    _impedance_cache[key] = matrices
+
+    return matrices
+
+
+def evaluate_neutral_design(task: tuple):
+    """
+    This function solves one neutral design in the network of the worker, starting from the taps of the compiled
+    circuit.
+    @:params
+    task: tuple, the design ({geometry: option}) and the lines of each geometry
+    @:return
+    metrics: tuple, the maximum NEV in V, the peak neutral current in A and the losses in kW, inf if it does not
+    converge
+    """
+    design, lines_by_geometry = task
+    network = get_worker_network()
+    define_catalog_wires()
+
+    with network.transaction() as transaction:
+        for geometry, option in design.items():
+            matrices = get_geometry_matrices(network, geometry, option)
+            for line in lines_by_geometry.get(geometry, []):
+                # The matrices are per foot, so the length is given in feet and restored with its units
+                length, units = get_line_length(line)
+                transaction.command(f"Edit Line.{line} units=ft length={length * LENGTH_TO_FT[units]} "
+                                    f"rmatrix={matrices['rmatrix']} xmatrix={matrices['xmatrix']} "
+                                    f"cmatrix={matrices['cmatrix']}",
+                                    undo_command=f"Edit Line.{line} geometry={geometry} units={units} length={length}")
+
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+    nev, neutral_current, losses = np.inf, np.inf, np.inf
+    if DSSSolution.Converged:
+        nev = np.nanmax(get_mag_voltages_array(network.buses_names)[:, NEUTRAL_INDEX])
+        neutral_current = np.nanmax(network.get_mag_currents_array()[:, NEUTRAL_INDEX], initial=0.0)
+        losses = get_total_losses()
+
+    # Back to the geometries of the circuit
+    network.rollback()
+
+    return float(nev), float(neutral_current), float(losses)
+
+
+def run_neutral_sizing(network, designs: list, n_workers: int = None, chunk_size: int = 16):
+    """
+    This function solves every neutral design in parallel.
+    @:params
+    network: IEEE13Nodes, the 4-wire network (without Kron reduction) with the power flow solved
+    designs: list, the designs as returned by get_neutral_designs
+    n_workers: int, the number of worker processes
+    chunk_size: int, the number of designs sent together to a worker
+    @:return
+    sizing: dict, the designs and the arrays with shape (n_designs,):
+        nev: the maximum NEV in V, inf if the design does not converge
+        neutral_current: the peak neutral current in A
+        losses: the losses in kW, including the grounding reactors
+        ranking: the indexes of the designs sorted by NEV, then neutral current, then losses
+    """
+    if network.kron_reduced or network.buses_names is None:
+        raise ValueError("The neutral sizing needs the network with neutral and the power flow solved.")
+
+    unknown = {geometry for design in designs for geometry in design} - set(NEUTRAL_CONDUCTORS)
+    if len(unknown) > 0:
+        raise ValueError(f"The geometries {sorted(unknown)} do not have a neutral conductor in NEUTRAL_CONDUCTORS.")
+
+    lines_by_geometry = get_lines_by_geometry(network.lines_names)
+    with get_pool(network.get_setup(), n_workers) as pool:
+        results = map_in_pool(evaluate_neutral_design, [(design, lines_by_geometry) for design in designs], pool,
+                              chunk_size=chunk_size)
+
+    metrics = np.array(results, dtype=float).reshape(-1, 3)
+    sizing = {
+        'designs': designs,
+        'nev': metrics[:, 0],
+        'neutral_current': metrics[:, 1],
+        'losses': metrics[:, 2],
+        'ranking': np.lexsort((metrics[:, 2], metrics[:, 1], metrics[:, 0]))
+    }
+
+    return sizing
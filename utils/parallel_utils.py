@@ -0,0 +1,123 @@
+""" This script contains functions to run analyses of the IEEE 13 nodes network across worker processes.
+Every worker compiles its own copy of the network once, so the tasks only carry the values that change. """
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+
+# Keys of the setup that need to compile the circuit again
+COMPILE_KEYS = ('circuit_path', 'neutral_node', 'ground_node', 'earth_model')
+
+# Network of the current worker process, the setup applied to it and the base setup of the pool
+_worker_network = None
+_worker_setup = None
+_base_setup = None
+
+
+def build_worker_network(setup: dict):
+    """
+    This function compiles the network of the worker process with a setup.
+    @:params
+    setup: dict, the setup of the network as returned by IEEE13Nodes.get_setup
+    @:return -> None
+    """
+    global _worker_network, _worker_setup
+
+    # Imported here because IEEE13Nodes depends on the Utils package
+    from IEEE13Nodes import IEEE13Nodes
+
+    _worker_network = IEEE13Nodes.from_setup(setup)
+    _worker_setup = dict(setup)
+
+
+def init_worker(setup: dict):
+    """
+    This function builds the network of a worker process. The setup is the base of the scenarios solved in the worker.
+    @:params
+    setup: dict, the setup of the network as returned by IEEE13Nodes.get_setup
+    @:return -> None
+    """
+    global _base_setup
+
+    _base_setup = dict(setup)
+    build_worker_network(setup)
+
+
+def get_worker_network():
+    """
+    This function gets the network of the current worker process.
+    @:params -> None
+    @:return
+    network: IEEE13Nodes, the network built by init_worker
+    """
+    if _worker_network is None:
+        raise RuntimeError("The worker network has not been initialized. Use get_pool to create the workers.")
+
+    return _worker_network
+
+
+def get_scenario_network(scenario: dict):
+    """
+    This function gets the network of the current worker process with the setup of a scenario, i.e. the base setup
+    of the pool with the keys that change in the scenario, so the scenarios solved before in the worker do not change
+    it. The network is only compiled again when the scenario changes the circuit, the earth model or the nodes; the
+    other modifications are rolled back and applied again in place (see IEEE13Nodes.apply_setup). The taps and the
+    solution start from the compiled circuit (see IEEE13Nodes.reset_solution_state).
+    @:params
+    scenario: dict, the keys of the setup that change in the scenario
+    @:return
+    network: IEEE13Nodes, the network of the scenario
+    """
+    global _worker_setup
+
+    setup = {**_base_setup, **{key: value for key, value in scenario.items() if key in _base_setup}}
+
+    if any(setup[key] != _worker_setup[key] for key in COMPILE_KEYS):
+        build_worker_network(setup)
+    elif setup != _worker_setup:
+        get_worker_network().apply_setup(setup)
+        _worker_setup = setup
+
+    network = get_worker_network()
+    network.reset_solution_state()
+
+    return network
+
+
+def get_pool(setup: dict, n_workers: int = None, max_tasks_per_worker: int = None):
+    """
+    This function creates a pool of worker processes, each one with its own network. The resource tracker is started
+    before the workers, so they share it with this process and the shared memory blocks attached by the workers are
+    only released by the process that created them.
+    @:params
+    setup: dict, the setup of the network as returned by IEEE13Nodes.get_setup
+    n_workers: int, the number of worker processes, by default the number of CPUs
+    max_tasks_per_worker: int, the number of tasks after which a worker is replaced by a new one, None to keep them
+    @:return
+    pool: ProcessPoolExecutor, the pool of workers
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    resource_tracker.ensure_running()
+    pool = ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(setup,),
+                               max_tasks_per_child=max_tasks_per_worker)
+
+    return pool
+
+
+def map_in_pool(function, tasks: list, pool: ProcessPoolExecutor, chunk_size: int = 1):
+    """
+    This function evaluates a function for a batch of tasks in a pool of workers.
+    @:params
+    function: callable, a module level function that uses get_worker_network
+    tasks: list, the arguments of each evaluation
+    pool: ProcessPoolExecutor, the pool of workers
+    chunk_size: int, the number of tasks sent together to a worker
+    @:return
+    results: list, the results in the same order as the tasks
+    """
+    if len(tasks) == 0:
+        return []
+
+    results = list(pool.map(function, tasks, chunksize=chunk_size))
+
+    return results
@@ -0,0 +1,314 @@
+""" This script contains functions to reassign the single-phase loads of the IEEE 13 nodes network across the phases
+to reduce the neutral current and the Neutral-to-Earth Voltage (NEV). An assignment is a tuple with one rotation per
+single-phase load (0: original phases, 1: a->b->c->a, 2: a->c->b->a), so delta loads between two phases are moved
+as a whole. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NEUTRAL_INDEX
+from Utils.opendss_engine import DSSCircuit, DSSSolution
+from Utils.parallel_utils import get_pool, get_worker_network, map_in_pool
+from Utils.utils_ieee13nodes import get_mag_voltages_array
+
+PHASES = [1, 2, 3]
+
+
+def get_single_phase_loads(load_names: list):
+    """
+    This function gets the single-phase loads and the rotations that are possible in their bus.
+    @:params
+    load_names: list, the names of the loads
+    @:return
+    loads: dict, the bus definition (bus1) and the feasible rotations of each single-phase load
+    """
+    loads = {}
+    for load in load_names:
+        DSSCircuit.SetActiveElement(f'load.{load}')
+        if DSSCircuit.ActiveElement.NumPhases != 1:
+            continue
+
+        bus1 = DSSCircuit.ActiveElement.Properties('bus1').Val
+        bus_name = bus1.split('.')[0]
+        bus_phases = [node for node in DSSCircuit.ActiveBus(bus_name).Nodes if node in PHASES]
+        rotations = [rotation for rotation in range(len(PHASES))
+                     if all(rotate_node(node, rotation) in bus_phases
+                            for node in get_load_phases(bus1))]
+        loads[load] = {'bus1': bus1, 'rotations': rotations}
+
+    return loads
+
+
+def get_load_phases(bus1: str):
+    """
+    This function gets the phases of a load from its bus definition.
+    @:params
+    bus1: str, the bus definition, e.g. '675.1.4'
+    @:return
+    phases: list, the phases of the load
+    """
+    return [int(node) for node in bus1.split('.')[1:] if int(node) in PHASES]
+
+
+def rotate_node(node: int, rotation: int):
+    """
+    This function rotates a phase node, the neutral and the ground are not changed.
+    @:params
+    node: int, the node
+    rotation: int, the rotation (0, 1 or 2)
+    @:return
+    node: int, the rotated node
+    """
+    if node not in PHASES:
+        return node
+    return PHASES[(PHASES.index(node) + rotation) % len(PHASES)]
+
+
+def get_rotated_bus(bus1: str, rotation: int):
+    """
+    This function gets the bus definition of a load after rotating its phases.
+    @:params
+    bus1: str, the original bus definition, e.g. '675.1.4'
+    rotation: int, the rotation (0, 1 or 2)
+    @:return
+    bus1: str, the rotated bus definition, e.g. '675.2.4' for rotation 1
+    """
+    bus_name, *nodes = bus1.split('.')
+    return '.'.join([bus_name] + [str(rotate_node(int(node), rotation)) for node in nodes])
+
+
+def evaluate_assignment(task: tuple):
+    """
+    This function evaluates one phase assignment in the network of the worker, starting from the taps of the
+    compiled circuit.
+    @:params
+    task: tuple, the single-phase loads (dict of get_single_phase_loads) and the assignment
+    @:return
+    metrics: tuple, the peak neutral current in A and the maximum NEV in V, inf if it does not converge
+    """
+    loads, assignment = task
+    network = get_worker_network()
+
+    with network.transaction() as transaction:
+        for (load, load_data), rotation in zip(loads.items(), assignment):
+            transaction.edit(f'load.{load}', {'bus1': get_rotated_bus(load_data['bus1'], rotation)})
+
+    network.reset_solution_state()
+    network.run_power_flow(show_message=False)
+    neutral_current, nev = np.inf, np.inf
+    if DSSSolution.Converged:
+        neutral_current = np.nanmax(network.get_mag_currents_array()[:, NEUTRAL_INDEX], initial=0.0)
+        nev = np.nanmax(get_mag_voltages_array(network.buses_names)[:, NEUTRAL_INDEX])
+
+    # Back to the original phases
+    network.rollback()
+
+    return float(neutral_current), float(nev)
+
+
+def evaluate_assignments(assignments: list, loads: dict, pool, cache: dict):
+    """
+    This function evaluates a batch of assignments, only solving the ones that are not cached.
+    @:params
+    assignments: list, the assignments (tuples of rotations)
+    loads: dict, the single-phase loads as returned by get_single_phase_loads
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the metrics of the assignments already evaluated, updated in place
+    @:return
+    metrics: np.array, the peak neutral current and maximum NEV of each assignment with shape (n_assignments, 2)
+    """
+    missing = list(dict.fromkeys(assignment for assignment in assignments if assignment not in cache))
+    results = map_in_pool(evaluate_assignment, [(loads, assignment) for assignment in missing], pool)
+    cache.update(zip(missing, results))
+
+    metrics = np.array([cache[assignment] for assignment in assignments], dtype=float).reshape(-1, 2)
+
+    return metrics
+
+
+def get_objective(metrics: np.ndarray, weights: tuple):
+    """
+    This function gets the objective to minimize from the metrics of the assignments.
+    @:params
+    metrics: np.array, the peak neutral current and maximum NEV with shape (n_assignments, 2)
+    weights: tuple, the weights of the neutral current and the NEV
+    @:return
+    objective: np.array, the objective of each assignment, inf if the assignment does not converge
+    """
+    converged = np.all(np.isfinite(metrics), axis=-1)
+    objective = np.full(len(metrics), np.inf)
+    objective[converged] = metrics[converged] @ np.asarray(weights, dtype=float)
+
+    return objective
+
+
+def get_neighbors(assignment: tuple, loads: dict):
+    """
+    This function gets the assignments that differ from an assignment in the rotation of one load.
+    @:params
+    assignment: tuple, the assignment
+    loads: dict, the single-phase loads as returned by get_single_phase_loads
+    @:return
+    neighbors: list, the neighbor assignments
+    """
+    neighbors = []
+    for i, load_data in enumerate(loads.values()):
+        for rotation in load_data['rotations']:
+            if rotation != assignment[i]:
+                neighbors.append(assignment[:i] + (rotation,) + assignment[i + 1:])
+
+    return neighbors
+
+
+def search_greedy(assignment: tuple, loads: dict, pool, cache: dict, weights: tuple):
+    """
+    This function assigns the loads one by one, choosing for each load the rotation with the best objective.
+    @:params
+    assignment: tuple, the initial assignment
+    loads: dict, the single-phase loads
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the cache of evaluated assignments
+    weights: tuple, the weights of the neutral current and the NEV
+    @:return
+    assignment: tuple, the best assignment found
+    """
+    for i, load_data in enumerate(loads.values()):
+        candidates = [assignment[:i] + (rotation,) + assignment[i + 1:] for rotation in load_data['rotations']]
+        objective = get_objective(evaluate_assignments(candidates, loads, pool, cache), weights)
+        assignment = candidates[int(np.argmin(objective))]
+
+    return assignment
+
+
+def search_local(assignment: tuple, loads: dict, pool, cache: dict, weights: tuple, max_iterations: int = 50):
+    """
+    This function improves an assignment evaluating all its neighbors as one batch until none is better.
+    @:params
+    assignment: tuple, the initial assignment
+    loads: dict, the single-phase loads
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the cache of evaluated assignments
+    weights: tuple, the weights of the neutral current and the NEV
+    max_iterations: int, the maximum number of moves
+    @:return
+    assignment: tuple, the best assignment found
+    """
+    objective = get_objective(evaluate_assignments([assignment], loads, pool, cache), weights)[0]
+    for _ in range(max_iterations):
+        neighbors = get_neighbors(assignment, loads)
+        if len(neighbors) == 0:
+            break
+        neighbors_objective = get_objective(evaluate_assignments(neighbors, loads, pool, cache), weights)
+        best = int(np.argmin(neighbors_objective))
+        if neighbors_objective[best] >= objective:
+            break
+        assignment, objective = neighbors[best], neighbors_objective[best]
+
+    return assignment
+
+
+def search_annealing(
+        assignment: tuple,
+        loads: dict,
+        pool,
+        cache: dict,
+        weights: tuple,
+        rng: np.random.Generator,
+        n_steps: int = 50,
+        batch_size: int = 8,
+        initial_temperature: float = 1.0,
+        cooling: float = 0.9):
+    """
+    This function explores the assignments with simulated annealing. In each step a batch of random neighbors is
+    evaluated in parallel and the best of them is accepted with the Metropolis criterion.
+    @:params
+    assignment: tuple, the initial assignment
+    loads: dict, the single-phase loads
+    pool: ProcessPoolExecutor, the pool of workers
+    cache: dict, the cache of evaluated assignments
+    weights: tuple, the weights of the neutral current and the NEV
+    rng: np.random.Generator, the random generator
+    n_steps: int, the number of steps
+    batch_size: int, the number of neighbors evaluated in each step
+    initial_temperature: float, the initial temperature relative to the initial objective
+    cooling: float, the factor applied to the temperature in each step
+    @:return
+    assignment: tuple, the best assignment found
+    """
+    objective = get_objective(evaluate_assignments([assignment], loads, pool, cache), weights)[0]
+    best_assignment, best_objective = assignment, objective
+    temperature = initial_temperature * max(objective, 1e-9)
+
+    for _ in range(n_steps):
+        neighbors = get_neighbors(assignment, loads)
+        if len(neighbors) == 0:
+            break
+        batch = [neighbors[i] for i in rng.choice(len(neighbors), size=min(batch_size, len(neighbors)),
+                                                   replace=False)]
+        batch_objective = get_objective(evaluate_assignments(batch, loads, pool, cache), weights)
+        candidate = int(np.argmin(batch_objective))
+
+        delta = batch_objective[candidate] - objective
+        if delta < 0 or rng.random() < np.exp(-delta / temperature):
+            assignment, objective = batch[candidate], batch_objective[candidate]
+            if objective < best_objective:
+                best_assignment, best_objective = assignment, objective
+        temperature *= cooling
+
+    return best_assignment
+
+
+def optimize_phase_balancing(
+        network,
+        methods: tuple = ('greedy', 'local', 'annealing'),
+        weights: tuple = (1.0, 0.0),
+        n_best: int = 5,
+        n_workers: int = None,
+        seed: int = None):
+    """
+    This function searches the phase assignments of the single-phase loads that minimize the peak neutral current
+    and the NEV. The methods are applied in order, each one starting from the best assignment of the previous one, and
+    every evaluation is shared through a cache.
+    @:params
+    network: IEEE13Nodes, the network with the power flow solved
+    methods: tuple, the heuristics to apply: 'greedy', 'local' and/or 'annealing'
+    weights: tuple, the weights of the peak neutral current (per A) and the maximum NEV (per V) in the objective
+    n_best: int, the number of best assignments returned
+    n_workers: int, the number of worker processes
+    seed: int, the seed of the random generator
+    @:return
+    balancing: dict, the single-phase loads, and the n_best assignments with their bus definitions, neutral current,
+    NEV and objective, sorted from the best
+    """
+    loads = get_single_phase_loads(network.load_names)
+    rng = np.random.default_rng(seed)
+    cache = {}
+    assignment = tuple(0 for _ in loads)
+
+    with get_pool(network.get_setup(), n_workers) as pool:
+        evaluate_assignments([assignment], loads, pool, cache)
+        for method in methods:
+            if method == 'greedy':
+                assignment = search_greedy(assignment, loads, pool, cache, weights)
+            elif method == 'local':
+                assignment = search_local(assignment, loads, pool, cache, weights)
+            elif method == 'annealing':
+                assignment = search_annealing(assignment, loads, pool, cache, weights, rng)
+            else:
+                raise ValueError(f"The method {method} is not supported.")
+
+    assignments = list(cache.keys())
+    metrics = np.array(list(cache.values()), dtype=float)
+    objective = get_objective(metrics, weights)
+    best = np.argsort(objective)[:n_best]
+
+    balancing = {
+        'loads': list(loads.keys()),
+        'assignments': [assignments[i] for i in best],
+        'buses': [{load: get_rotated_bus(load_data['bus1'], assignments[i][j])
+                   for j, (load, load_data) in enumerate(loads.items())} for i in best],
+        'neutral_current': metrics[best, 0],
+        'nev': metrics[best, 1],
+        'objective': objective[best],
+        'n_evaluations': len(cache)
+    }
+
+    return balancing
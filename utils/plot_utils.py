@@ -1,5 +1,8 @@
+import warnings
 import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.patches import Patch
 from Utils.utils import *
 from Utils.constants_ieee13nodes import *
 
@@ -599,3 +602,183 @@ def plot_line_dict_dict(
     plt.tight_layout()
 
     return fig
+
+
+def get_envelope_statistics(data: np.ndarray, percentiles: tuple = (5, 25, 50, 75, 95)):
+    """
+    This function gets the envelope of stacked scenarios in one vectorized pass.
+    :param data: array with shape (n_scenarios, n_buses, n_nodes), NaN where the node does not exist
+    :param percentiles: percentiles of the bands, in ascending order
+    :return: dictionary with the minimum, the maximum and the percentiles with shape (n_percentiles, n_buses, n_nodes)
+    """
+    data = np.asarray(data, dtype=float)
+    # The nodes that do not exist in a bus give NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        statistics = {
+            'n_scenarios': data.shape[0],
+            'min': np.nanmin(data, axis=0),
+            'max': np.nanmax(data, axis=0),
+            'percentile_levels': np.asarray(percentiles, dtype=float),
+            'percentiles': np.nanpercentile(data, percentiles, axis=0)
+        }
+    return statistics
+
+
+def downsample_scenarios(data: np.ndarray, max_scenarios: int, keep_extremes: bool = True, seed: int = None):
+    """
+    This function keeps a random subset of the scenarios to plot them faster.
+    :param data: array with shape (n_scenarios, n_buses, n_nodes)
+    :param max_scenarios: maximum number of scenarios kept
+    :param keep_extremes: boolean to keep the scenarios with the minimum and maximum of every bus and node, so the
+    envelope of the subset is the same of all the scenarios
+    :param seed: seed of the random generator
+    :return: array with shape (n_kept, n_buses, n_nodes)
+    """
+    data = np.asarray(data, dtype=float)
+    if data.shape[0] <= max_scenarios:
+        return data
+
+    rng = np.random.default_rng(seed)
+    kept = np.empty(0, dtype=int)
+    if keep_extremes:
+        filled = np.where(np.isnan(data), np.nanmean(data), data).reshape(data.shape[0], -1)
+        kept = np.unique(np.concatenate([np.argmin(filled, axis=0), np.argmax(filled, axis=0)]))
+    others = np.setdiff1d(np.arange(data.shape[0]), kept)
+    n_random = max(max_scenarios - len(kept), 0)
+    kept = np.sort(np.concatenate([kept, rng.choice(others, size=min(n_random, len(others)), replace=False)]))
+
+    return data[kept]
+
+
+def plot_envelope_array(
+        data: np.ndarray = None,
+        x_names: list = None,
+        statistics: dict = None,
+        percentiles: tuple = (5, 25, 50, 75, 95),
+        nodes: list = None,
+        n_traces: int = 0,
+        latex_style: bool = False,
+        font_size: int = 14,
+        font_family: str = 'Times New Roman',
+        title: str = None,
+        title_bold: bool = True,
+        title_x: str = None,
+        title_y: str = None,
+        show_legend: bool = True,
+        title_legend: str = None,
+        loc_legend: str = 'upper left',
+        colors: dict = None,
+        size: tuple = (10, 6),
+        limit_top: float = None,
+        color_limit_top: str = 'r',
+        limit_bottom: float = None,
+        color_limit_bottom: str = 'r',
+        span_plot: float = 0.1,
+        alpha: float = 0.15,
+        line_width: float = 1
+):
+    """
+    This function plots the envelope of thousands of scenarios per bus and phase: the min/max band, the percentile
+    bands and the median. Every band is one filled collection and the medians and traces are one line collection, so
+    the time to draw does not depend on the number of scenarios.
+    :param data: array with shape (n_scenarios, n_buses, n_nodes) following NODES_NAME, it can be downsampled
+    :param x_names: names of the buses
+    :param statistics: envelope already computed with get_envelope_statistics, used instead of data
+    :param percentiles: percentiles of the bands when the statistics are computed from data
+    :param nodes: names of the nodes to plot, by default NODES_NAME
+    :param n_traces: number of scenarios drawn as thin lines over the envelope, only with data
+    :param latex_style: boolean to set the latex style
+    :param font_size: font size for latex
+    :param font_family: font family for latex
+    :param title: title of the plot
+    :param title_bold: boolean to set the title in bold
+    :param title_x: title of the x-axis
+    :param title_y: title of the y-axis
+    :param show_legend: boolean to show the legend
+    :param title_legend: title of the legend
+    :param loc_legend: location of the legend
+    :param colors: dictionary with the colors for each phase
+    :param size: size of the plot
+    :param limit_top: Value for a horizontal line
+    :param color_limit_top: Color for the horizontal line
+    :param limit_bottom: Value for a horizontal line
+    :param color_limit_bottom: Color for the horizontal line
+    :param span_plot: span of the plot
+    :param alpha: transparency of the widest band, the inner bands are stacked over it
+    :param line_width: width of the median line
+    :return: plt
+    """
+    if statistics is None:
+        statistics = get_envelope_statistics(data, percentiles)
+    levels = list(statistics['percentile_levels'])
+    n_buses = statistics['min'].shape[0]
+    x_values = np.arange(n_buses)
+    x_names = list(range(n_buses)) if x_names is None else x_names
+    nodes = NODES_NAME if nodes is None else nodes
+
+    # if latex_style is True, set the style to latex
+    # Note: To use LaTeX, you need to have LaTeX installed in your computer
+    if latex_style:
+        latex_parameters_plot(font_size, font_family)
+        title = get_text_formatted(title, title_bold)
+        title_x = get_text_formatted(title_x)
+        title_y = get_text_formatted(title_y)
+    else:
+        normal_parameters_plot(font_size, font_family)
+
+    fig, ax = plt.subplots(figsize=size)
+
+    if limit_top is not None:
+        plt.axhline(y=limit_top, color=color_limit_top, linestyle='--')
+    if limit_bottom is not None:
+        plt.axhline(y=limit_bottom, color=color_limit_bottom, linestyle='--')
+
+    # If colors is None, set default colors
+    if colors is None:
+        colors = get_color_by_phase()
+
+    median_segments, median_colors, handles = [], [], []
+    for node in nodes:
+        column = NODES_NAME.index(node)
+        # Min/max band and the symmetric percentile bands, from the outside to the inside
+        bands = [(statistics['min'][:, column], statistics['max'][:, column])]
+        bands += [(statistics['percentiles'][i, :, column], statistics['percentiles'][-1 - i, :, column])
+                  for i in range(len(levels) // 2)]
+        for lower, upper in bands:
+            ax.fill_between(x_values, lower, upper, color=colors[node], alpha=alpha, linewidth=0)
+        handles.append(Patch(color=colors[node], alpha=min(len(bands) * alpha, 1), label=f"Phase {node}"))
+
+        if 50 in levels:
+            median_segments.append(np.column_stack([x_values, statistics['percentiles'][levels.index(50), :, column]]))
+            median_colors.append(colors[node])
+
+        if n_traces > 0 and data is not None:
+            traces = np.asarray(data, dtype=float)[:n_traces, :, column]
+            ax.add_collection(LineCollection(
+                [np.column_stack([x_values, trace]) for trace in traces],
+                colors=colors[node], linewidths=0.3 * line_width, alpha=0.5
+            ))
+
+    if len(median_segments) > 0:
+        ax.add_collection(LineCollection(median_segments, colors=median_colors, linewidths=line_width))
+
+    columns = [NODES_NAME.index(node) for node in nodes]
+    maximum = np.nanmax(statistics['max'][:, columns])
+    minimum = np.nanmin(statistics['min'][:, columns])
+    maximum = maximum if limit_top is None else max(maximum, limit_top)
+    minimum = minimum if limit_bottom is None else min(minimum, limit_bottom)
+    # Configuring the plot
+    ax.set_xticks(x_values)
+    ax.set_xticklabels(x_names)
+    ax.set_xlim(x_values[0] - 0.5, x_values[-1] + 0.5)
+    ax.set_ylim(minimum - span_plot, maximum + span_plot)
+    ax.set_xlabel(title_x)
+    ax.set_ylabel(title_y)
+    if show_legend:
+        ax.legend(handles=handles, title=title_legend, loc=loc_legend)
+    plt.title(title)
+    plt.grid(True)
+    plt.tight_layout()
+
+    return fig
@@ -0,0 +1,116 @@
+""" This script contains functions to handle the regulator controls of the IEEE 13 nodes network: bulk capture and
+restore of the tap positions, locking of the taps and tracing of the control iterations of a solution. """
+
+import numpy as np
+from Utils.opendss_engine import ControlQueue, DSSCircuit, DSSSolution, DSSText
+
+CONTROL_MODE_STATIC = 0
+CONTROL_MODE_OFF = -1
+
+# Control mode of the circuit before the controls were locked, None while they are not locked
+_unlocked_control_mode = None
+
+
+def get_reg_taps(reg_controls: list):
+    """
+    This function gets the tap position of every regulator control in one pass over the RegControls collection.
+    @:params
+    reg_controls: list, the names of the regulator controls
+    @:return
+    taps: np.array, the tap number of each regulator control with shape (n_reg_controls,)
+    """
+    taps_by_name = {}
+    index = DSSCircuit.RegControls.First
+    while index > 0:
+        taps_by_name[DSSCircuit.RegControls.Name] = DSSCircuit.RegControls.TapNumber
+        index = DSSCircuit.RegControls.Next
+
+    taps = np.array([taps_by_name[reg_control] for reg_control in reg_controls], dtype=int)
+
+    return taps
+
+
+def set_reg_taps(reg_controls: list, taps):
+    """
+    This function sets the tap position of every regulator control in one pass over the RegControls collection.
+    @:params
+    reg_controls: list, the names of the regulator controls
+    taps: array, the tap number of each regulator control
+    @:return -> None
+    """
+    taps_by_name = dict(zip(reg_controls, np.asarray(taps, dtype=int).tolist()))
+    index = DSSCircuit.RegControls.First
+    while index > 0:
+        name = DSSCircuit.RegControls.Name
+        if name in taps_by_name:
+            DSSCircuit.RegControls.TapNumber = taps_by_name[name]
+        index = DSSCircuit.RegControls.Next
+
+
+def set_controls_locked(locked: bool):
+    """
+    This function locks or unlocks every control of the circuit, so the taps keep their position in the solutions.
+    The control mode is saved when the controls are locked and restored when they are unlocked, and it is left as it is
+    when the controls were not locked.
+    @:params
+    locked: bool, if the controls are locked
+    @:return -> None
+    """
+    global _unlocked_control_mode
+
+    if locked:
+        if _unlocked_control_mode is None:
+            _unlocked_control_mode = DSSSolution.ControlMode
+        DSSSolution.ControlMode = CONTROL_MODE_OFF
+    elif _unlocked_control_mode is not None:
+        DSSSolution.ControlMode = _unlocked_control_mode
+        _unlocked_control_mode = None
+
+
+def solve_with_control_trace(reg_controls: list, max_control_iterations: int = None):
+    """
+    This function solves the circuit doing the control iterations one by one, recording the taps after each pass.
+    @:params
+    reg_controls: list, the names of the regulator controls
+    max_control_iterations: int, the maximum number of control passes, by default MaxControlIterations
+    @:return
+    trace: dict, the convergence (False if control actions are still pending after max_control_iterations passes),
+    the power flow iterations of each pass and the taps after each pass with shape
+    (n_passes + 1, n_reg_controls)
+    """
+    max_control_iterations = DSSSolution.MaxControlIterations if max_control_iterations is None \
+        else max_control_iterations
+
+    DSSSolution.SolveNoControl()
+    iterations = [DSSSolution.Iterations]
+    taps = [get_reg_taps(reg_controls)]
+    converged = DSSSolution.Converged
+
+    for _ in range(max_control_iterations):
+        if not converged:
+            break
+        DSSSolution.SampleControlDevices()
+        if ControlQueue.QueueSize == 0:
+            break
+        DSSSolution.DoControlActions()
+        DSSSolution.SolveNoControl()
+        iterations.append(DSSSolution.Iterations)
+        taps.append(get_reg_taps(reg_controls))
+        converged = DSSSolution.Converged
+    else:
+        # The control passes ran out, so the solution only converged if the controls have settled
+        if converged:
+            DSSSolution.SampleControlDevices()
+            converged = ControlQueue.QueueSize == 0
+            # Drop the pending actions and disarm the controls, so the next solution samples them again
+            ControlQueue.ClearQueue()
+            DSSText.Command = "reset controls"
+
+    trace = {
+        'converged': converged,
+        'control_passes': len(taps) - 1,
+        'iterations': np.array(iterations, dtype=int),
+        'taps': np.stack(taps)
+    }
+
+    return trace
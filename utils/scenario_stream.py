@@ -0,0 +1,166 @@
+""" This script contains functions to solve streams of scenarios of the IEEE 13 nodes network. The results are yielded
+as soon as they are solved, so the scenarios can be consumed one by one in constant memory. """
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from Utils.convergence import get_empty_failure_statistics, get_region_key, is_hopeless_region, \
+    update_failure_statistics
+from Utils.opendss_engine import DSSSolution
+from Utils.parallel_utils import get_pool, get_scenario_network
+
+# Load multiplier of the base setup, solved by every worker when its network is built. The scenarios that do not
+# converge are warm started from it, so the result of a scenario does not depend on the scenarios solved before
+BASE_LOAD_MULTIPLIER = 1.0
+
+
+def solve_scenario(task: tuple):
+    """
+    This function solves one scenario in the network of the worker, without reading its results. The scenario starts
+    from the base setup and the compiled taps, whatever the worker solved before.
+    @:params
+    task: tuple, the index of the scenario, the scenario and optionally the solver fallbacks (see run_scenario)
+    @:return
+    network: IEEE13Nodes, the network of the worker with the scenario solved
+    record: dict, the index, the scenario, the convergence, the control iterations and the diagnostics of the solution
+    """
+    index, scenario = task[:2]
+    fallbacks = task[2] if len(task) > 2 else None
+    network = get_scenario_network(scenario)
+
+    load_multiplier = scenario.get('load_multiplier', 1.0)
+    DSSSolution.LoadMult = load_multiplier
+    if 'reg_taps' in scenario:
+        network.set_reg_taps(scenario['reg_taps'], lock=scenario.get('lock_taps', False))
+    else:
+        network.lock_reg_taps(scenario.get('lock_taps', False))
+    network.run_power_flow(show_message=False, fallbacks=fallbacks, warm_start=BASE_LOAD_MULTIPLIER)
+    diagnostics = network.get_solve_diagnostics()
+
+    record = {
+        'index': index,
+        'scenario': scenario,
+        'converged': diagnostics['converged'],
+        'control_iterations': diagnostics['control_iterations'],
+        'diagnostics': diagnostics
+    }
+
+    return network, record
+
+
+def run_scenario(task: tuple):
+    """
+    This function solves one scenario in the network of the worker.
+    @:params
+    task: tuple, the index of the scenario, the scenario and optionally the solver fallbacks (see
+    IEEE13Nodes.run_power_flow). The scenario is a dict with the keys of the setup that change (e.g. {'z_g': 25,
+    'open_switch': True}) and optionally 'load_multiplier', 'reg_taps' (the taps to start from) and 'lock_taps' (to
+    keep them fixed)
+    @:return
+    result: dict, the index, the scenario, the convergence, the control iterations, the diagnostics of the solution
+    and the results of the getters of IEEE13Nodes
+    """
+    network, result = solve_scenario(task)
+    if result['converged']:
+        result['losses'] = network.get_losses()
+        result['voltages_pu'] = network.get_mag_voltages_pu()
+        result['voltages'] = network.get_mag_voltages()
+        result['vuf'] = network.get_vuf_3ph()
+        result['currents'] = network.get_mag_currents()
+
+    return result
+
+
+def get_skipped_result(index: int, scenario: dict):
+    """
+    This function gets the result of a scenario that is not solved because its region does not converge.
+    @:params
+    index: int, the index of the scenario
+    scenario: dict, the scenario
+    @:return
+    future: Future, a future with the result already set
+    """
+    future = Future()
+    future.set_result({'index': index, 'scenario': scenario, 'converged': False, 'skipped': True})
+
+    return future
+
+
+def iter_results(
+        scenarios,
+        setup: dict,
+        n_workers: int = None,
+        ordered: bool = True,
+        max_pending: int = None,
+        fallbacks: list = None,
+        failure_statistics: dict = None,
+        region_keys: list = None,
+        bin_sizes: dict = None,
+        min_scenarios: int = 5,
+        max_failure_rate: float = 1.0):
+    """
+    This function solves the scenarios in a pool of workers and yields each result as soon as it is available.
+    Only max_pending scenarios are submitted at the same time, so a slow consumer stops the production of results and
+    the scenarios can be an unbounded iterator.
+    The convergence of the scenarios is aggregated in failure_statistics. When region_keys are given, the scenarios
+    of a region that failed at least max_failure_rate of min_scenarios solutions are not solved and their results are
+    marked as skipped.
+    @:params
+    scenarios: iterable, the scenarios to solve (see run_scenario)
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup
+    n_workers: int, the number of worker processes
+    ordered: bool, if the results are yielded in the order of the scenarios, otherwise in order of completion
+    max_pending: int, the maximum number of scenarios submitted and not consumed, by default twice the workers
+    fallbacks: list, the solver settings tried when a scenario does not converge (see SOLVER_FALLBACKS)
+    failure_statistics: dict, the statistics of the sweep (see get_empty_failure_statistics), updated in place. An
+    empty dict is filled with the statistics of this sweep
+    region_keys: list, the keys of the scenarios that define the regions, None to solve every scenario
+    bin_sizes: dict, the size of the bins of numeric region keys, e.g. {'load_multiplier': 0.1}
+    min_scenarios: int, the scenarios of a region solved before deciding to skip it
+    max_failure_rate: float, the failure rate from which a region is skipped
+    @:return
+    results: generator, the result of each scenario (see run_scenario)
+    """
+    failure_statistics = {} if failure_statistics is None else failure_statistics
+    if len(failure_statistics) == 0:
+        failure_statistics.update(get_empty_failure_statistics())
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    max_pending = 2 * n_workers if max_pending is None else max_pending
+    pool = get_pool(setup, n_workers)
+    tasks = enumerate(scenarios)
+    pending = deque() if ordered else set()
+
+    try:
+        while True:
+            # Keep the pool busy without exceeding the backpressure limit
+            while len(pending) < max_pending:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                index, scenario = task
+                region = None if region_keys is None else get_region_key(scenario, region_keys, bin_sizes)
+                if region is not None and is_hopeless_region(failure_statistics, region, min_scenarios,
+                                                             max_failure_rate):
+                    future = get_skipped_result(index, scenario)
+                else:
+                    future = pool.submit(run_scenario, (index, scenario, fallbacks))
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+
+            if len(pending) == 0:
+                break
+
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+            for future in done:
+                result = future.result()
+                region = None if region_keys is None else get_region_key(result['scenario'], region_keys, bin_sizes)
+                update_failure_statistics(failure_statistics, result, region)
+                yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
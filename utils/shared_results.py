@@ -0,0 +1,230 @@
+""" This script contains functions to return the results of the scenarios of the IEEE 13 nodes network from the worker
+processes through shared memory. The voltages, currents, VUF and losses of every scenario are written by the workers
+in preallocated arrays with the fixed (bus, phase) and (line, phase) layouts, so the parent reads them without copies
+and only a small completion record of each scenario is pickled back. """
+
+import pickle
+import time
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from Utils.constants_ieee13nodes import NODES_NUMBER
+from Utils.parallel_utils import get_pool, map_in_pool
+from Utils.scenario_stream import run_scenario, solve_scenario
+
+# Shared memory blocks attached by the current worker process, by name
+_attached_buffers = {}
+
+
+def get_buffer_layout(n_scenarios: int, n_buses: int, n_lines: int):
+    """
+    This function gets the layout of the arrays of results in one shared memory block.
+    @:params
+    n_scenarios: int, the number of scenarios
+    n_buses: int, the number of buses
+    n_lines: int, the number of lines
+    @:return
+    layout: dict, the (offset, shape) of each float64 array in the block
+    size: int, the size of the block in bytes
+    """
+    n_nodes = len(NODES_NUMBER)
+    shapes = {
+        'voltages': (n_scenarios, n_buses, n_nodes),
+        'voltages_pu': (n_scenarios, n_buses, n_nodes),
+        'currents': (n_scenarios, n_lines, n_nodes),
+        'vuf': (n_scenarios, n_buses),
+        'losses': (n_scenarios,)
+    }
+    layout, size = {}, 0
+    for key, shape in shapes.items():
+        layout[key] = (size, shape)
+        size += int(np.prod(shape)) * np.dtype(np.float64).itemsize
+
+    return layout, size
+
+
+def get_buffer_arrays(shared_memory: SharedMemory, layout: dict):
+    """
+    This function gets the arrays of results as views of a shared memory block.
+    @:params
+    shared_memory: SharedMemory, the block
+    layout: dict, the layout of the arrays as returned by get_buffer_layout
+    @:return
+    arrays: dict, the arrays of results
+    """
+    return {key: np.ndarray(shape, dtype=np.float64, buffer=shared_memory.buf, offset=offset)
+            for key, (offset, shape) in layout.items()}
+
+
+def create_shared_results(n_scenarios: int, n_buses: int, n_lines: int):
+    """
+    This function creates the shared memory block of the results of a sweep, filled with NaN.
+    @:params
+    n_scenarios: int, the number of scenarios
+    n_buses: int, the number of buses
+    n_lines: int, the number of lines
+    @:return
+    shared_results: dict, the block ('shared_memory'), its description for the workers ('spec') and the arrays of
+    results as views of the block
+    """
+    layout, size = get_buffer_layout(n_scenarios, n_buses, n_lines)
+    shared_memory = SharedMemory(create=True, size=max(size, 1))
+    arrays = get_buffer_arrays(shared_memory, layout)
+    for array in arrays.values():
+        array.fill(np.nan)
+
+    shared_results = {'shared_memory': shared_memory, 'spec': (shared_memory.name, layout), **arrays}
+
+    return shared_results
+
+
+def release_shared_results(shared_results: dict):
+    """
+    This function releases the shared memory block of the results. The arrays of results can not be used after it.
+    @:params
+    shared_results: dict, the shared results as returned by create_shared_results or run_shared_sweep
+    @:return -> None
+    """
+    for key in shared_results['spec'][1]:
+        shared_results.pop(key, None)
+    shared_memory = shared_results.pop('shared_memory')
+    shared_memory.close()
+    shared_memory.unlink()
+
+
+def attach_shared_results(spec: tuple):
+    """
+    This function gets the arrays of results of a sweep in a worker process. The block is attached once per worker,
+    and the blocks of previous sweeps are closed.
+    @:params
+    spec: tuple, the name and the layout of the block
+    @:return
+    arrays: dict, the arrays of results as views of the block
+    """
+    name, layout = spec
+    if name not in _attached_buffers:
+        for shared_memory, _ in _attached_buffers.values():
+            shared_memory.close()
+        _attached_buffers.clear()
+        shared_memory = SharedMemory(name=name)
+        _attached_buffers[name] = (shared_memory, get_buffer_arrays(shared_memory, layout))
+
+    return _attached_buffers[name][1]
+
+
+def run_scenario_shared(task: tuple):
+    """
+    This function solves one scenario in the network of the worker and writes its results in the shared arrays.
+    @:params
+    task: tuple, the index of the scenario, the scenario, the solver fallbacks and the spec of the shared block
+    @:return
+    record: dict, the index, the convergence, the control iterations and the diagnostics of the solution
+    """
+    index, scenario, fallbacks, spec = task
+    network, record = solve_scenario((index, scenario, fallbacks))
+    del record['scenario']
+
+    if record['converged']:
+        arrays = attach_shared_results(spec)
+        arrays['voltages'][index] = network.get_mag_voltages_array()
+        arrays['voltages_pu'][index] = network.get_mag_voltages_array(mag_pu=True)
+        arrays['currents'][index] = network.get_mag_currents_array()
+        arrays['vuf'][index] = network.get_unbalance_metrics()['vuf']
+        arrays['losses'][index] = network.get_losses()
+
+    return record
+
+
+def run_shared_sweep(
+        scenarios: list,
+        setup: dict,
+        bus_names: list,
+        line_names: list,
+        n_workers: int = None,
+        fallbacks: list = None,
+        chunk_size: int = 1,
+        pool=None):
+    """
+    This function solves the scenarios in a pool of workers that write the results in shared memory. The results
+    of the scenarios that do not converge are NaN. The arrays are views of the shared block, which has to be released
+    with release_shared_results when they are not needed.
+    @:params
+    scenarios: list, the scenarios to solve (see run_scenario)
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup
+    bus_names: list, the names of the buses, the rows of the voltages
+    line_names: list, the names of the lines, the rows of the currents
+    n_workers: int, the number of worker processes
+    fallbacks: list, the solver settings tried when a scenario does not converge
+    chunk_size: int, the number of scenarios sent together to a worker
+    pool: ProcessPoolExecutor, a pool of workers to reuse, by default a new pool
+    @:return
+    shared_results: dict, the arrays voltages and voltages_pu with shape (n_scenarios, n_buses, n_nodes), currents
+    with shape (n_scenarios, n_lines, n_nodes), vuf with shape (n_scenarios, n_buses) and losses with shape
+    (n_scenarios,), the completion record of each scenario ('records') and the shared block
+    """
+    scenarios = list(scenarios)
+    shared_results = create_shared_results(len(scenarios), len(bus_names), len(line_names))
+    tasks = [(index, scenario, fallbacks, shared_results['spec']) for index, scenario in enumerate(scenarios)]
+
+    try:
+        if pool is None:
+            with get_pool(setup, n_workers) as pool:
+                records = map_in_pool(run_scenario_shared, tasks, pool, chunk_size=chunk_size)
+        else:
+            records = map_in_pool(run_scenario_shared, tasks, pool, chunk_size=chunk_size)
+    except BaseException:
+        release_shared_results(shared_results)
+        raise
+
+    shared_results.update({'bus_names': bus_names, 'line_names': line_names, 'records': records})
+
+    return shared_results
+
+
+def benchmark_result_transport(
+        scenarios: list,
+        setup: dict,
+        bus_names: list,
+        line_names: list,
+        worker_counts: tuple = (1, 8, 32),
+        chunk_size: int = 1):
+    """
+    This function compares the transport of the results as pickled dicts (run_scenario) and through shared memory
+    (run_scenario_shared) with the same scenarios and pool of workers. The workers are warmed up before the timing, so
+    the compilation of their networks is not measured.
+    @:params
+    scenarios: list, the scenarios to solve
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup
+    bus_names: list, the names of the buses
+    line_names: list, the names of the lines
+    worker_counts: tuple, the numbers of workers to compare
+    chunk_size: int, the number of scenarios sent together to a worker
+    @:return
+    benchmark: dict, for each number of workers the time in s and the scenarios per second of each transport, and
+    the mean size in bytes of the pickled result and of the pickled completion record of a scenario
+    """
+    scenarios = list(scenarios)
+    benchmark = {}
+    for n_workers in worker_counts:
+        with get_pool(setup, n_workers) as pool:
+            map_in_pool(run_scenario, [(index, scenarios[0]) for index in range(n_workers)], pool)
+
+            start = time.perf_counter()
+            results = map_in_pool(run_scenario, list(enumerate(scenarios)), pool, chunk_size=chunk_size)
+            pickle_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            shared_results = run_shared_sweep(scenarios, setup, bus_names, line_names, chunk_size=chunk_size,
+                                              pool=pool)
+            shared_time = time.perf_counter() - start
+
+        benchmark[n_workers] = {
+            'pickle_time': pickle_time,
+            'shared_time': shared_time,
+            'pickle_scenarios_per_second': len(scenarios) / pickle_time,
+            'shared_scenarios_per_second': len(scenarios) / shared_time,
+            'pickle_bytes': np.mean([len(pickle.dumps(result)) for result in results]),
+            'shared_bytes': np.mean([len(pickle.dumps(record)) for record in shared_results['records']])
+        }
+        release_shared_results(shared_results)
+
+    return benchmark
@@ -0,0 +1,247 @@
+""" This script contains functions to estimate the node voltages of the IEEE 13 nodes network, including the neutrals,
+from a few meters. The estimator is a linear weighted least squares on the complex node voltages built on the system
+admittance matrix of the solved circuit: the meters are voltage and line current phasors, the nodes without loads are
+zero injection measurements and the injections of the loads are pseudo-measurements from the solved circuit. The
+weighted measurement matrix is factorized once per set of meters, so each estimate of a batch of snapshots is one
+matrix product. """
+
+import time
+import numpy as np
+from Utils.constants_ieee13nodes import MEASUREMENT_STD, NODES_NUMBER
+from Utils.opendss_engine import DSSCircuit
+from Utils.utils_ieee13nodes import get_node_index, get_system_y
+
+
+def get_y_node_index():
+    """
+    This function gets the position of every node in the system admittance matrix.
+    @:params -> None
+    @:return
+    node_index: dict, the position of each node by name, e.g. {'632.1': 5}
+    """
+    return {node_name.lower(): position for position, node_name in enumerate(DSSCircuit.YNodeOrder)}
+
+
+def get_voltage_rows(voltage_meters: list, node_index: dict):
+    """
+    This function gets the rows of the measurement matrix of the voltage meters.
+    @:params
+    voltage_meters: list, the metered nodes as (bus, node), e.g. [('671', 1), ('671', 4)]
+    node_index: dict, the position of each node in the system admittance matrix
+    @:return
+    rows: np.array, the rows with shape (n_meters, n_nodes)
+    """
+    rows = np.zeros((len(voltage_meters), len(node_index)), dtype=complex)
+    for i, (bus, node) in enumerate(voltage_meters):
+        node_name = f"{bus}.{node}".lower()
+        if node_name not in node_index:
+            raise ValueError(f"The node {node_name} of the voltage meter is not in the circuit.")
+        rows[i, node_index[node_name]] = 1.0
+
+    return rows
+
+
+def get_current_rows(current_meters: list, node_index: dict, neutral_node: int = 4, ground_node: int = 0):
+    """
+    This function gets the rows of the measurement matrix of the current meters, i.e. the rows of the primitive
+    admittance matrix of each line that give the current of the metered conductor of the first terminal.
+    @:params
+    current_meters: list, the metered conductors as (line, node), e.g. [('650632', 1), ('650632', 4)]
+    node_index: dict, the position of each node in the system admittance matrix
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground, used by the neutral after a Kron reduction
+    @:return
+    rows: np.array, the rows with shape (n_meters, n_nodes)
+    """
+    rows = np.zeros((len(current_meters), len(node_index)), dtype=complex)
+    element = DSSCircuit.ActiveCktElement
+    for i, (line, node) in enumerate(current_meters):
+        DSSCircuit.SetActiveElement(f'line.{line}')
+        n_conductors = element.NumConductors
+        y_prim = np.asarray(element.Yprim)
+        y_prim = (y_prim[0::2] + 1j * y_prim[1::2]).reshape(2 * n_conductors, 2 * n_conductors)
+        nodes = np.asarray(element.NodeOrder)
+        buses = [bus_name.split('.')[0].lower() for bus_name in element.BusNames]
+
+        conductors = np.nonzero(np.where(nodes[:n_conductors] == ground_node, neutral_node,
+                                         nodes[:n_conductors]) == node)[0]
+        if len(conductors) == 0:
+            raise ValueError(f"The line {line} does not have a conductor in the node {node}.")
+
+        # The conductors connected to the ground have zero voltage and do not add to the current
+        for column, conductor_node in enumerate(nodes):
+            position = node_index.get(f"{buses[column // n_conductors]}.{conductor_node}")
+            if conductor_node != ground_node and position is not None:
+                rows[i, position] += y_prim[conductors[0], column]
+
+    return rows
+
+
+def get_source_nodes(node_index: dict):
+    """
+    This function gets the nodes of the buses of the voltage sources.
+    @:params
+    node_index: dict, the position of each node in the system admittance matrix
+    @:return
+    positions: np.array, the positions of the nodes of the sources in the system admittance matrix
+    """
+    source_buses = set()
+    index = DSSCircuit.Vsources.First
+    while index > 0:
+        source_buses.add(DSSCircuit.ActiveCktElement.BusNames[0].split('.')[0].lower())
+        index = DSSCircuit.Vsources.Next
+
+    return np.array([position for node_name, position in node_index.items()
+                     if node_name.split('.')[0] in source_buses], dtype=int)
+
+
+def get_injection_std(injections: np.ndarray, source_nodes: np.ndarray, std: dict):
+    """
+    This function gets the standard deviation of the injection of every node: virtual measurements for the nodes
+    without injection, pseudo-measurements for the loads and accurate measurements for the sources.
+    @:params
+    injections: np.array, the injection currents of the reference solution in A
+    source_nodes: np.array, the positions of the nodes of the sources
+    std: dict, the standard deviations (see MEASUREMENT_STD)
+    @:return
+    injection_std: np.array, the standard deviation of each injection in A
+    """
+    magnitudes = np.abs(injections)
+    injection_std = np.maximum(std['pseudo'] * magnitudes, std['min_injection'])
+    injection_std[source_nodes] = np.maximum(std['source'] * magnitudes[source_nodes], std['zero_injection'])
+    injection_std[magnitudes == 0] = std['zero_injection']
+
+    return injection_std
+
+
+def build_state_estimator(
+        bus_names: list,
+        voltage_meters: list,
+        current_meters: list = (),
+        std: dict = None,
+        neutral_node: int = 4,
+        ground_node: int = 0):
+    """
+    This function builds the state estimator of a set of meters in the solved circuit. The weighted measurement
+    matrix W^1/2 H, with its columns scaled to unit norm, is factorized once with a QR decomposition, which avoids the
+    gain matrix G = H^H W H whose condition number is the square of the one of W^1/2 H. The estimator keeps the
+    matrix that maps the meters to the node voltages, and the contribution of the pseudo-measurements, which does not
+    change between snapshots.
+    @:params
+    bus_names: list, the names of the buses of the estimated voltages
+    voltage_meters: list, the metered nodes as (bus, node)
+    current_meters: list, the metered conductors as (line, node), measured at the first terminal
+    std: dict, the standard deviations of the measurements, by default MEASUREMENT_STD
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground
+    @:return
+    estimator: dict, the meters, the reference measurements of the solved circuit, the triangular factor R and the
+    column scale D of the QR decomposition (G = D^-1 R^H R D^-1), the estimator matrix and the pseudo state
+    """
+    std = {**MEASUREMENT_STD, **({} if std is None else std)}
+    node_index = get_y_node_index()
+    y_matrix = get_system_y()
+    voltages = np.asarray(DSSCircuit.YNodeVarray)
+    voltages = voltages[0::2] + 1j * voltages[1::2]
+    injections = np.asarray(DSSCircuit.YCurrents)
+    injections = injections[0::2] + 1j * injections[1::2]
+
+    meter_rows = np.vstack([get_voltage_rows(voltage_meters, node_index),
+                            get_current_rows(current_meters, node_index, neutral_node, ground_node)])
+    meter_std = np.concatenate([np.full(len(voltage_meters), std['voltage']),
+                                np.full(len(current_meters), std['current'])])
+    injection_std = get_injection_std(injections, get_source_nodes(node_index), std)
+
+    measurement_matrix = np.vstack([meter_rows, y_matrix])
+    sqrt_weights = 1 / np.concatenate([meter_std, injection_std])
+    weighted = measurement_matrix * sqrt_weights[:, np.newaxis]
+    column_scale = 1 / np.linalg.norm(weighted, axis=0)
+    if not np.all(np.isfinite(column_scale)):
+        raise ValueError("The gain matrix is singular, the nodes are not observable with these measurements.")
+    q_factor, gain_factor = np.linalg.qr(weighted * column_scale)
+    diagonal = np.abs(np.diag(gain_factor))
+    if np.min(diagonal) <= len(diagonal) * np.finfo(float).eps * np.max(diagonal):
+        raise ValueError("The gain matrix is singular, the nodes are not observable with these measurements.")
+
+    # G^-1 H^H W = D R^-1 Q^H W^1/2 with W^1/2 H D = Q R
+    estimator_matrix = column_scale[:, np.newaxis] * np.linalg.solve(gain_factor, q_factor.conj().T) * sqrt_weights
+    n_meters = len(meter_rows)
+    positions, rows, columns = get_node_index(bus_names, list(node_index.keys()))
+    reference = meter_rows @ voltages
+
+    estimator = {
+        'bus_names': bus_names,
+        'voltage_meters': list(voltage_meters),
+        'current_meters': list(current_meters),
+        'reference': reference,
+        'reference_angles': np.angle(reference),
+        'gain_factor': gain_factor,
+        'column_scale': column_scale,
+        'estimator_matrix': estimator_matrix[:, :n_meters],
+        'pseudo_state': estimator_matrix[:, n_meters:] @ injections,
+        'positions': positions,
+        'rows': rows,
+        'columns': columns
+    }
+
+    return estimator
+
+
+def estimate_states(estimator: dict, snapshots: np.ndarray):
+    """
+    This function estimates the node voltages of a batch of measurement snapshots.
+    @:params
+    estimator: dict, the estimator as returned by build_state_estimator
+    snapshots: np.array, the measurements with shape (n_snapshots, n_meters) or (n_meters,), in the order of the
+    voltage meters and then the current meters. Complex values are phasors, real values are magnitudes and take the
+    angles of the reference solution
+    @:return
+    voltages: np.array, the complex node voltages in V with shape (n_snapshots, n_buses, n_nodes), NaN where the node
+    does not exist
+    """
+    snapshots = np.atleast_2d(snapshots)
+    if not np.iscomplexobj(snapshots):
+        snapshots = snapshots * np.exp(1j * estimator['reference_angles'])
+
+    states = estimator['pseudo_state'] + snapshots @ estimator['estimator_matrix'].T
+
+    voltages = np.full((len(snapshots), len(estimator['bus_names']), len(NODES_NUMBER)), np.nan, dtype=complex)
+    voltages[:, estimator['rows'], estimator['columns']] = states[:, estimator['positions']]
+
+    return voltages
+
+
+def benchmark_state_estimator(estimator: dict, n_snapshots: int = 1000, n_repeats: int = 10, noise: float = 0.01,
+                              seed: int = None):
+    """
+    This function measures the number of estimates per second of a state estimator with synthetic snapshots, the
+    magnitudes of the reference measurements with a relative gaussian noise.
+    @:params
+    estimator: dict, the estimator as returned by build_state_estimator
+    n_snapshots: int, the number of snapshots of each batch
+    n_repeats: int, the number of batches timed
+    noise: float, the relative standard deviation of the noise of the measurements
+    seed: int, the seed of the noise
+    @:return
+    benchmark: dict, the snapshots of each batch, the best time of a batch in s, the time of each estimate in ms and
+    the estimates per second
+    """
+    rng = np.random.default_rng(seed)
+    reference = np.abs(estimator['reference'])
+    snapshots = reference * (1 + noise * rng.standard_normal((n_snapshots, len(reference))))
+
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        estimate_states(estimator, snapshots)
+        times.append(time.perf_counter() - start)
+
+    batch_time = min(times)
+    benchmark = {
+        'n_snapshots': n_snapshots,
+        'batch_time': batch_time,
+        'estimate_time_ms': 1000 * batch_time / n_snapshots,
+        'estimates_per_second': n_snapshots / batch_time
+    }
+
+    return benchmark
@@ -0,0 +1,233 @@
+""" This script contains functions to run very large sweeps of scenarios of the IEEE 13 nodes network. The scenarios
+are split in chunks, every chunk solved is saved atomically in its own file, and a sweep that was stopped resumes from
+the chunks already saved. The workers are replaced when their memory grows over a ceiling. """
+
+import json
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice
+import psutil
+from Utils.parallel_utils import get_pool
+from Utils.scenario_stream import run_scenario
+
+MANIFEST_FILE = 'manifest.json'
+CHUNK_PREFIX = 'chunk_'
+CHUNK_SUFFIX = '.pkl'
+
+
+def get_chunk_path(output_dir: str, chunk_index: int):
+    """
+    This function gets the path of the file of a chunk.
+    @:params
+    output_dir: str, the folder of the sweep
+    chunk_index: int, the index of the chunk
+    @:return
+    path: str, the path of the chunk file
+    """
+    return os.path.join(output_dir, f"{CHUNK_PREFIX}{chunk_index:06d}{CHUNK_SUFFIX}")
+
+
+def save_atomic(path: str, data: bytes):
+    """
+    This function writes a file atomically: the data is written and flushed to a temporary file that then replaces the
+    destination, so a crash never leaves a partial file with the final name.
+    @:params
+    path: str, the path of the file
+    data: bytes, the content of the file
+    @:return -> None
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def save_chunk(output_dir: str, chunk_index: int, results: list):
+    """
+    This function saves the results of a chunk atomically.
+    @:params
+    output_dir: str, the folder of the sweep
+    chunk_index: int, the index of the chunk
+    results: list, the result of each scenario of the chunk (see run_scenario)
+    @:return -> None
+    """
+    save_atomic(get_chunk_path(output_dir, chunk_index), pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_chunk(output_dir: str, chunk_index: int):
+    """
+    This function loads the results of a chunk.
+    @:params
+    output_dir: str, the folder of the sweep
+    chunk_index: int, the index of the chunk
+    @:return
+    results: list, the result of each scenario of the chunk
+    """
+    with open(get_chunk_path(output_dir, chunk_index), 'rb') as file:
+        return pickle.load(file)
+
+
+def get_completed_chunks(output_dir: str):
+    """
+    This function gets the chunks already saved in the folder of a sweep. The temporary files of a write that did not
+    finish are removed.
+    @:params
+    output_dir: str, the folder of the sweep
+    @:return
+    completed: set, the indexes of the chunks saved
+    """
+    completed = set()
+    for file_name in os.listdir(output_dir):
+        if file_name.endswith('.tmp'):
+            os.remove(os.path.join(output_dir, file_name))
+        elif file_name.startswith(CHUNK_PREFIX) and file_name.endswith(CHUNK_SUFFIX):
+            completed.add(int(file_name[len(CHUNK_PREFIX):-len(CHUNK_SUFFIX)]))
+
+    return completed
+
+
+def check_manifest(output_dir: str, chunk_size: int):
+    """
+    This function creates the manifest of a sweep, or checks that the manifest of the sweep being resumed used the
+    same chunk size, since the chunk indexes depend on it.
+    @:params
+    output_dir: str, the folder of the sweep
+    chunk_size: int, the number of scenarios of each chunk
+    @:return -> None
+    """
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as file:
+            manifest = json.load(file)
+        if manifest['chunk_size'] != chunk_size:
+            raise ValueError(f"The sweep in {output_dir} was started with chunk_size={manifest['chunk_size']}, "
+                             f"it can not be resumed with chunk_size={chunk_size}.")
+    else:
+        save_atomic(path, json.dumps({'chunk_size': chunk_size}).encode())
+
+
+def iter_chunks(scenarios, chunk_size: int):
+    """
+    This function splits the scenarios in chunks without loading all of them in memory.
+    @:params
+    scenarios: iterable, the scenarios of the sweep
+    chunk_size: int, the number of scenarios of each chunk
+    @:return
+    chunks: generator, the index of the chunk, the index of its first scenario and its scenarios
+    """
+    scenarios = iter(scenarios)
+    chunk_index = 0
+    while True:
+        chunk = list(islice(scenarios, chunk_size))
+        if len(chunk) == 0:
+            break
+        yield chunk_index, chunk_index * chunk_size, chunk
+        chunk_index += 1
+
+
+def run_chunk(task: tuple):
+    """
+    This function solves the scenarios of one chunk in the network of the worker.
+    @:params
+    task: tuple, the index of the chunk, the index of its first scenario and its scenarios
+    @:return
+    chunk_index: int, the index of the chunk
+    results: list, the result of each scenario (see run_scenario)
+    memory_mb: float, the resident memory of the worker after the chunk in MB
+    """
+    chunk_index, first_index, scenarios = task
+    results = [run_scenario((first_index + i, scenario)) for i, scenario in enumerate(scenarios)]
+    memory_mb = psutil.Process().memory_info().rss / 2 ** 20
+
+    return chunk_index, results, memory_mb
+
+
+def run_sweep(
+        scenarios,
+        setup: dict,
+        output_dir: str,
+        chunk_size: int = 100,
+        n_workers: int = None,
+        max_memory_mb: float = None,
+        max_chunks_per_worker: int = None,
+        max_pending: int = None):
+    """
+    This function solves a sweep of scenarios in chunks and saves every chunk as soon as it is solved. The chunks
+    already saved in output_dir are skipped, so running the same sweep again resumes it after a crash or a kill. The
+    scenarios have to be generated in the same order every time.
+    When a worker reports a resident memory over max_memory_mb, the pool is replaced by a new one after the chunks
+    in progress finish, so the engine contexts of long-lived workers do not grow without bound.
+    @:params
+    scenarios: iterable, the scenarios to solve (see run_scenario)
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup
+    output_dir: str, the folder where the chunks are saved
+    chunk_size: int, the number of scenarios of each chunk
+    n_workers: int, the number of worker processes, by default the number of CPUs
+    max_memory_mb: float, the memory ceiling of each worker in MB, None to disable it
+    max_chunks_per_worker: int, the number of chunks after which each worker is replaced, None to keep them
+    max_pending: int, the maximum number of chunks submitted at the same time, by default twice the workers
+    @:return
+    summary: dict, the number of chunks of the sweep, solved now and skipped, the number of pool recycles and the
+    peak memory reported by the workers in MB
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    check_manifest(output_dir, chunk_size)
+    completed = get_completed_chunks(output_dir)
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    max_pending = 2 * n_workers if max_pending is None else max_pending
+    summary = {'n_chunks': 0, 'n_solved': 0, 'n_skipped': 0, 'n_recycles': 0, 'peak_memory_mb': 0.0}
+
+    def save_done(done_futures):
+        recycle = False
+        for future in done_futures:
+            chunk_index, results, memory_mb = future.result()
+            save_chunk(output_dir, chunk_index, results)
+            summary['n_solved'] += 1
+            summary['peak_memory_mb'] = max(summary['peak_memory_mb'], memory_mb)
+            recycle |= max_memory_mb is not None and memory_mb > max_memory_mb
+        return recycle
+
+    pool = get_pool(setup, n_workers, max_tasks_per_worker=max_chunks_per_worker)
+    pending = set()
+    try:
+        for chunk_index, first_index, chunk in iter_chunks(scenarios, chunk_size):
+            summary['n_chunks'] += 1
+            if chunk_index in completed:
+                summary['n_skipped'] += 1
+                continue
+
+            pending.add(pool.submit(run_chunk, (chunk_index, first_index, chunk)))
+            if len(pending) < max_pending:
+                continue
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if save_done(done):
+                # Finish the chunks in progress and start new workers
+                save_done(wait(pending)[0])
+                pending = set()
+                pool.shutdown(wait=True)
+                pool = get_pool(setup, n_workers, max_tasks_per_worker=max_chunks_per_worker)
+                summary['n_recycles'] += 1
+
+        save_done(wait(pending)[0])
+        pending = set()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return summary
+
+
+def iter_sweep_results(output_dir: str):
+    """
+    This function yields the results of a sweep saved by run_sweep, loading one chunk at a time.
+    @:params
+    output_dir: str, the folder of the sweep
+    @:return
+    results: generator, the result of each scenario in the order of the scenarios
+    """
+    for chunk_index in sorted(get_completed_chunks(output_dir)):
+        yield from load_chunk(output_dir, chunk_index)
@@ -0,0 +1,210 @@
+""" This script contains functions to check the thermal loading of the conductors of the IEEE 13 nodes network. The
+normal and emergency ampacity of every conductor of the lines, including the neutral, is read once into arrays with
+the (line, phase) layout of get_mag_currents_array, so the loading of many scenarios or time steps is obtained in
+one vectorized pass. """
+
+import numpy as np
+from Utils.constants_ieee13nodes import NEUTRAL_WIRE_CATALOG, NODES_INDEX, NODES_NAME, NODES_NUMBER
+from Utils.opendss_engine import DSSCircuit
+
+# Ratio of the emergency to the normal ampacity, the default of OpenDSS when EmergAmps is not given
+EMERGENCY_AMPS_FACTOR = 1.5
+
+
+def get_catalog_ratings():
+    """
+    This function gets the normal and emergency ampacity of the wires of NEUTRAL_WIRE_CATALOG.
+    @:params -> None
+    @:return
+    ratings: dict, the (normal, emergency) ampacity in A of each wire of the catalog by name
+    """
+    ratings = {}
+    for wire, definition in NEUTRAL_WIRE_CATALOG.items():
+        properties = {key.lower(): value for key, value in (item.split('=') for item in definition.split())}
+        if 'normamps' in properties:
+            normal_amps = float(properties['normamps'])
+            ratings[wire.lower()] = (normal_amps, float(properties.get('emergamps',
+                                                                       EMERGENCY_AMPS_FACTOR * normal_amps)))
+
+    return ratings
+
+
+def get_wire_ratings():
+    """
+    This function gets the normal and emergency ampacity of every wire and cable defined in the circuit. The wires
+    defined without ampacity take the one of NEUTRAL_WIRE_CATALOG when they are in it.
+    @:params -> None
+    @:return
+    ratings: dict, the (normal, emergency) ampacity in A of each WireData, CNData and TSData by name, not positive
+    when the wire has no rating
+    """
+    catalog_ratings = get_catalog_ratings()
+    ratings = {}
+    for collection in (DSSCircuit.WireData, DSSCircuit.CNData, DSSCircuit.TSData):
+        index = collection.First
+        while index > 0:
+            name = collection.Name.lower()
+            normal_amps, emergency_amps = collection.NormAmps, collection.EmergAmps
+            if normal_amps <= 0 and name in catalog_ratings:
+                normal_amps, emergency_amps = catalog_ratings[name]
+            elif emergency_amps <= 0 < normal_amps:
+                emergency_amps = EMERGENCY_AMPS_FACTOR * normal_amps
+            ratings[name] = (normal_amps, emergency_amps)
+            index = collection.Next
+
+    return ratings
+
+
+def get_conductor_ratings(line_names: list, neutral_node: int = 4, ground_node: int = 0):
+    """
+    This function gets the ampacity of every conductor of the lines. The lines defined by a LineGeometry take the
+    ampacity of the wire of each conductor (see get_wire_ratings), so the neutral has its own rating, the other lines
+    and the wires without rating take the NormAmps and EmergAmps of the line.
+    @:params
+    line_names: list, the names of the lines
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground, used by the neutral after a Kron reduction
+    @:return
+    ratings: dict, the normal and emergency ampacity in A with shape (n_lines, n_nodes), NaN where the conductor
+    does not exist or has no rating, and the mask 'unrated' of the conductors that exist without rating
+    """
+    wire_ratings = get_wire_ratings()
+    line_index = {line: i for i, line in enumerate(line_names)}
+    normal = np.full((len(line_names), len(NODES_NUMBER)), np.nan)
+    emergency = np.full((len(line_names), len(NODES_NUMBER)), np.nan)
+
+    lines = DSSCircuit.Lines
+    element = DSSCircuit.ActiveCktElement
+    index = lines.First
+    while index > 0:
+        if lines.Name in line_index:
+            n_conductors = element.NumConductors
+            line_ratings = (lines.NormAmps, lines.EmergAmps)
+            conductor_ratings = [line_ratings] * n_conductors
+
+            geometry = lines.Geometry
+            if geometry != '':
+                DSSCircuit.LineGeometries.Name = geometry
+                wires = [wire.lower() for wire in DSSCircuit.LineGeometries.Conductors]
+                if len(wires) == n_conductors and all(wire in wire_ratings for wire in wires):
+                    conductor_ratings = [wire_ratings[wire] if wire_ratings[wire][0] > 0 else line_ratings
+                                         for wire in wires]
+
+            nodes = np.asarray(element.NodeOrder)[:n_conductors]
+            nodes = np.where(nodes == ground_node, neutral_node, nodes)
+            row = line_index[lines.Name]
+            for node, (normal_amps, emergency_amps) in zip(nodes, conductor_ratings):
+                if node in NODES_INDEX:
+                    normal[row, NODES_INDEX[node]] = normal_amps
+                    emergency[row, NODES_INDEX[node]] = emergency_amps
+        index = lines.Next
+
+    unrated = np.isfinite(normal) & ~(normal > 0)
+    normal[unrated] = np.nan
+    emergency[unrated | ~(emergency > 0)] = np.nan
+
+    ratings = {'normal': normal, 'emergency': emergency, 'unrated': unrated}
+
+    return ratings
+
+
+def get_percent_loading(currents: np.ndarray, ratings: np.ndarray):
+    """
+    This function gets the loading of the conductors in percentage of their ampacity.
+    @:params
+    currents: np.array, the current magnitudes with shape (..., n_lines, n_nodes). The leading dimensions can stack
+    scenarios or time steps
+    ratings: np.array, the ampacity with shape (n_lines, n_nodes)
+    @:return
+    loading: np.array, the loading in percentage with the shape of currents, NaN where there is no rating
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        loading = np.asarray(currents, dtype=float) / np.where(ratings > 0, ratings, np.nan) * 100
+
+    return loading
+
+
+def get_overload_events(loading: np.ndarray, threshold: float = 100.0, time_step: float = 1.0):
+    """
+    This function finds the overload events of every conductor, i.e. the runs of consecutive steps with a loading over
+    the threshold, with run detection over the stacked steps.
+    @:params
+    loading: np.array, the loading in percentage with shape (n_steps, n_lines, n_nodes)
+    threshold: float, the loading in percentage over which a conductor is overloaded
+    time_step: float, the duration of each step, e.g. in hours
+    @:return
+    events: dict, the arrays with shape (n_events,), sorted by line and conductor:
+        line, node: the row of the line and the column of the conductor
+        start: the first step of the event
+        duration: the duration of the event in units of time_step
+        peak: the maximum loading during the event in percentage
+    """
+    n_steps = loading.shape[0]
+    columns = loading.reshape(n_steps, -1).T
+    overloaded = np.zeros((columns.shape[0], n_steps + 2), dtype=np.int8)
+    overloaded[:, 1:-1] = np.nan_to_num(columns, nan=-np.inf) > threshold
+
+    # The runs start where the flag goes up and end where it goes down, in the same order for each column
+    transitions = np.diff(overloaded, axis=1)
+    column, start = np.nonzero(transitions == 1)
+    _, end = np.nonzero(transitions == -1)
+
+    if len(start) > 0:
+        # Maximum of each run with one reduction over the flattened columns
+        flat = np.append(np.nan_to_num(columns, nan=-np.inf).ravel(), -np.inf)
+        bounds = np.column_stack([column * n_steps + start, column * n_steps + end]).ravel()
+        peak = np.maximum.reduceat(flat, bounds)[0::2]
+    else:
+        peak = np.empty(0)
+
+    n_nodes = loading.shape[-1]
+    events = {
+        'line': column // n_nodes,
+        'node': column % n_nodes,
+        'start': start,
+        'duration': (end - start) * time_step,
+        'peak': peak
+    }
+
+    return events
+
+
+def get_loading_scan(
+        currents: np.ndarray,
+        ratings: dict,
+        line_names: list,
+        threshold: float = 100.0,
+        time_step: float = 1.0):
+    """
+    This function gets the loading of every conductor against its normal and emergency ampacity, and the overload
+    events of each rating.
+    @:params
+    currents: np.array, the current magnitudes with shape (n_steps, n_lines, n_nodes), e.g. stacked scenarios or a
+    time series
+    ratings: dict, the normal and emergency ampacity as returned by get_conductor_ratings
+    line_names: list, the names of the lines
+    threshold: float, the loading in percentage over which a conductor is overloaded
+    time_step: float, the duration of each step
+    @:return
+    scan: dict, the loading arrays ('normal' and 'emergency') with the shape of currents, the maximum loading of each
+    conductor, the events of each rating with the names of the lines and conductors, and the (line, conductor) names
+    of the conductors without rating ('unrated'), whose loading is NaN
+    """
+    currents = np.asarray(currents, dtype=float).reshape(-1, *np.shape(ratings['normal']))
+    rows, columns = np.nonzero(ratings.get('unrated', np.zeros(np.shape(ratings['normal']), dtype=bool)))
+    scan = {
+        'line_names': line_names,
+        'nodes': NODES_NAME,
+        'unrated': [(line_names[row], NODES_NAME[column]) for row, column in zip(rows, columns)]
+    }
+
+    for rating in ('normal', 'emergency'):
+        loading = get_percent_loading(currents, ratings[rating])
+        events = get_overload_events(loading, threshold, time_step)
+        events['line_name'] = np.array(line_names, dtype=object)[events['line']]
+        events['node_name'] = np.array(NODES_NAME, dtype=object)[events['node']]
+        scan[rating] = loading
+        scan[f'max_{rating}'] = np.fmax.reduce(loading, axis=0)
+        scan[f'events_{rating}'] = events
+
+    return scan
@@ -1,8 +1,18 @@
 """ This script contains functions to handle the analysis of IEEE 13 nodes network."""
 
-from Utils.constants_ieee13nodes import NODES_ORDER, NODES_NUMBER, NODES_NUMBER_NAME
+import warnings
+import numpy as np
+from Utils.constants_ieee13nodes import NODES_ORDER, NODES_NUMBER, NODES_NUMBER_NAME, NODES_INDEX, NEUTRAL_INDEX
 from Utils.opendss_engine import DSSCircuit
 
+# Fortescue transform from the phases (a, b, c) to the sequences (0, 1, 2)
+A_OPERATOR = np.exp(2j * np.pi / 3)
+FORTESCUE = np.array([
+    [1, 1, 1],
+    [1, A_OPERATOR, A_OPERATOR ** 2],
+    [1, A_OPERATOR ** 2, A_OPERATOR]
+]) / 3
+
 
 def get_buses_ordered():
     """
@@ -49,28 +59,197 @@ def get_mag_voltages(bus_names: list, mag_pu: bool = False, show_message: bool =
     return voltages
 
 
-def get_vuf_3ph(bus_names: list, n_phases: int = 3):
+def get_node_index(bus_names: list, node_names: list = None):
+    """
+    This function maps the nodes of the circuit to a fixed (bus, phase) layout, where the rows follow bus_names and
+    the columns follow NODES_NUMBER.
+    @:params
+    bus_names: list, the names of the buses
+    node_names: list, the names of the nodes as given by the engine (e.g. '632.1'), by default AllNodeNames
+    @:return
+    positions: np.array, the position of each mapped node in node_names
+    rows: np.array, the row (bus) of each mapped node
+    columns: np.array, the column (phase) of each mapped node
+    """
+    if node_names is None:
+        node_names = DSSCircuit.AllNodeNames
+
+    bus_index = {bus: i for i, bus in enumerate(bus_names)}
+    positions, rows, columns = [], [], []
+    for position, node_name in enumerate(node_names):
+        bus, node = node_name.rsplit('.', maxsplit=1)
+        node = int(node)
+        if bus in bus_index and node in NODES_INDEX:
+            positions.append(position)
+            rows.append(bus_index[bus])
+            columns.append(NODES_INDEX[node])
+
+    return np.array(positions, dtype=int), np.array(rows, dtype=int), np.array(columns, dtype=int)
+
+
+def get_complex_voltages_array(bus_names: list):
+    """
+    This function gets the complex voltages of every node in one bulk call to the engine.
+    @:params
+    bus_names: list, the names of the buses
+    @:return
+    voltages: np.array, complex voltages in Volts with shape (n_buses, n_nodes), NaN where the node does not exist
+    """
+    positions, rows, columns = get_node_index(bus_names)
+    bus_volts = np.asarray(DSSCircuit.AllBusVolts)
+    bus_volts = bus_volts[0::2] + 1j * bus_volts[1::2]
+
+    voltages = np.full((len(bus_names), len(NODES_NUMBER)), np.nan, dtype=complex)
+    voltages[rows, columns] = bus_volts[positions]
+
+    return voltages
+
+
+def get_mag_voltages_array(bus_names: list, mag_pu: bool = False):
+    """
+    This function gets the magnitude of the voltages of every node in one bulk call to the engine.
+    @:params
+    bus_names: list, the names of the buses
+    mag_pu: bool, if we want the values in per unit
+    @:return
+    voltages: np.array, the magnitudes with shape (n_buses, n_nodes), NaN where the node does not exist
+    """
+    if not mag_pu:
+        return np.abs(get_complex_voltages_array(bus_names))
+
+    positions, rows, columns = get_node_index(bus_names)
+    bus_vmag_pu = np.asarray(DSSCircuit.AllBusVmagPu)
+
+    voltages = np.full((len(bus_names), len(NODES_NUMBER)), np.nan)
+    voltages[rows, columns] = bus_vmag_pu[positions]
+
+    return voltages
+
+
+def get_sequence_components(voltages: np.ndarray, reference_neutral: bool = False):
+    """
+    This function applies the Fortescue transform to the phases a, b and c of every bus at once.
+    @:params
+    voltages: np.array, complex voltages with shape (..., n_buses, n_nodes) as given by get_complex_voltages_array.
+    The leading dimensions can stack scenarios or time steps
+    reference_neutral: bool, if the phase voltages are referred to the neutral of the bus instead of the ground
+    @:return
+    sequence: np.array, the zero, positive and negative sequence with shape (..., n_buses, 3), NaN for buses
+    without three phases
+    """
+    phases = get_phase_voltages(voltages, reference_neutral)
+    sequence = phases @ FORTESCUE.T
+
+    return sequence
+
+
+def get_phase_voltages(voltages: np.ndarray, reference_neutral: bool = False):
+    """
+    This function gets the voltages of the phases a, b and c of every bus.
+    @:params
+    voltages: np.array, complex voltages with shape (..., n_buses, n_nodes)
+    reference_neutral: bool, if the phase voltages are referred to the neutral of the bus (when it exists)
+    @:return
+    phases: np.array, the complex voltages of the phases with shape (..., n_buses, 3)
+    """
+    phases = voltages[..., :NEUTRAL_INDEX]
+    if reference_neutral:
+        neutral = np.nan_to_num(voltages[..., NEUTRAL_INDEX:NEUTRAL_INDEX + 1])
+        phases = phases - neutral
+
+    return phases
+
+
+def get_max_deviation_ratio(magnitudes: np.ndarray):
+    """
+    This function gets the maximum deviation from the average over the last axis, in percentage of the average.
+    Missing values (NaN) are ignored.
+    @:params
+    magnitudes: np.array, the magnitudes with shape (..., n)
+    @:return
+    ratio: np.array, the maximum deviation in percentage with shape (...)
+    """
+    # Buses without any of the values give NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average = np.nanmean(magnitudes, axis=-1, keepdims=True)
+        ratio = np.nanmax(np.abs(magnitudes - average), axis=-1) / average[..., 0] * 100
+
+    return ratio
+
+
+def get_unbalance_metrics(voltages: np.ndarray, reference_neutral: bool = False):
+    """
+    This function gets the voltage unbalance of every bus with three definitions:
+        vuf: Voltage Unbalance Factor, |V2| / |V1| (IEC), only for buses with three phases
+        pvur: Phase Voltage Unbalance Rate (IEEE), maximum deviation of the phase voltages from their average,
+        for buses with at least two phases
+        lvur: Line Voltage Unbalance Rate (NEMA), maximum deviation of the line voltages from their average,
+        only for buses with three phases
+    @:params
+    voltages: np.array, complex voltages with shape (..., n_buses, n_nodes) as given by get_complex_voltages_array.
+    The leading dimensions can stack scenarios or time steps
+    reference_neutral: bool, if the phase voltages are referred to the neutral of the bus instead of the ground
+    @:return
+    metrics: dict, the vuf, pvur and lvur in percentage with shape (..., n_buses), NaN where they are not defined
+    """
+    phases = get_phase_voltages(voltages, reference_neutral)
+    sequence = get_sequence_components(voltages, reference_neutral)
+    n_phases = np.sum(np.isfinite(phases), axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vuf = np.abs(sequence[..., 2]) / np.abs(sequence[..., 1]) * 100
+
+    pvur = get_max_deviation_ratio(np.abs(phases))
+    pvur[n_phases < 2] = np.nan
+
+    line_voltages = np.abs(phases - np.roll(phases, -1, axis=-1))
+    lvur = get_max_deviation_ratio(line_voltages)
+    lvur[n_phases < 3] = np.nan
+
+    metrics = {
+        'vuf': vuf,
+        'pvur': pvur,
+        'lvur': lvur
+    }
+
+    return metrics
+
+
+def get_vuf_3ph(bus_names: list, n_phases: int = 3, *, reference_neutral: bool = False):
     """
     This function gets the Voltage Unbalance Factor (VUF) of the IEEE 13 nodes network.
     @:params
     bus_names: list, the names of the buses
-    n_phases: int, the number of phases
+    n_phases: int, the number of phases, only the buses with more nodes than n_phases are included
+    reference_neutral: bool, if the phase voltages are referred to the neutral of the bus instead of the ground
     @:return
-    vuf: dict, the Voltage Unbalance Factor (VUF) of the IEEE 13 nodes network.
+    vuf: dict, the Voltage Unbalance Factor (VUF) of the buses with three phases.
     """
-    # Create the dictionary to store the Voltage Unbalance Factor (VUF)
-    vuf = {}
+    voltages = get_complex_voltages_array(bus_names)
+    vuf = get_vuf_dict(bus_names, voltages, get_unbalance_metrics(voltages, reference_neutral)['vuf'], n_phases)
+
+    return vuf
 
-    for bus_name in bus_names:
-        # Get the active bus
-        active_bus = DSSCircuit.ActiveBus(bus_name)
 
-        if len(active_bus.Nodes) > n_phases:
-            # Get the voltages
-            seq_voltages = active_bus.SeqVoltages
-            # Calculate the VUF
-            if seq_voltages[1] > 0:
-                vuf[bus_name] = (seq_voltages[2] / seq_voltages[1]) * 100
+def get_vuf_dict(bus_names: list, voltages: np.ndarray, vuf_values: np.ndarray, n_phases: int = None):
+    """
+    This function gets the VUF of the buses with more nodes than n_phases as a dict.
+    @:params
+    bus_names: list, the names of the buses
+    voltages: np.array, the complex voltages with shape (n_buses, 4) as returned by get_complex_voltages_array
+    vuf_values: np.array, the VUF of each bus with shape (n_buses,)
+    n_phases: int, the number of phases, by default 3 when the neutral is modeled and 2 otherwise, so only the
+    three-phase buses with their neutral (or without it in a 3-wire network) are included
+    @:return
+    vuf: dict, the VUF of the buses with three phases
+    """
+    if n_phases is None:
+        n_phases = 3 if np.any(np.isfinite(voltages[:, NEUTRAL_INDEX])) else 2
+    n_nodes = np.sum(np.isfinite(voltages), axis=-1)
+
+    vuf = {bus_name: float(value) for bus_name, value, bus_nodes in zip(bus_names, vuf_values, n_nodes)
+           if np.isfinite(value) and bus_nodes > n_phases}
 
     return vuf
 
@@ -137,3 +316,83 @@ def get_dict_magnitude_by_element(
             print(f"Warning: Node {node} not found in the dictionary for the {element}")
 
     return values
+
+
+def get_dict_from_array(element_names: list, values: np.ndarray):
+    """
+    This function converts an array with the (element, phase) layout of get_node_index to the dictionaries of
+    get_mag_voltages, skipping the nodes that do not exist.
+    @:params
+    element_names: list, the names of the rows of the array, e.g. the buses
+    values: np.array, the values with shape (n_elements, n_nodes), NaN where the node does not exist
+    @:return
+    values_dict: dict, the values of each element by phase name, e.g. {'632': {'a': 2401.2, ...}}
+    """
+    values_dict = {}
+    for element, row in zip(element_names, values):
+        values_dict[element] = {NODES_NUMBER_NAME[node]: float(row[column])
+                                for node, column in NODES_INDEX.items() if np.isfinite(row[column])}
+
+    return values_dict
+
+
+def get_mag_currents_array(line_names: list, neutral_node: int = 4, ground_node: int = 0):
+    """
+    This function gets the magnitude of the current of every conductor of the lines in one pass over the Lines
+    collection. The conductors are mapped to the phases with the node order of the first terminal.
+    @:params
+    line_names: list, the names of the lines
+    neutral_node: int, the node of the neutral
+    ground_node: int, the node of the ground, used by the neutral after a Kron reduction
+    @:return
+    currents: np.array, the magnitudes in A with shape (n_lines, n_nodes), NaN where the conductor does not exist
+    """
+    line_index = {line: i for i, line in enumerate(line_names)}
+    currents = np.full((len(line_names), len(NODES_NUMBER)), np.nan)
+
+    lines = DSSCircuit.Lines
+    element = DSSCircuit.ActiveCktElement
+    index = lines.First
+    while index > 0:
+        if lines.Name in line_index:
+            n_conductors = element.NumConductors
+            values = np.asarray(element.Currents)[:2 * n_conductors]
+            nodes = np.asarray(element.NodeOrder)[:n_conductors]
+            nodes = np.where(nodes == ground_node, neutral_node, nodes)
+            for node, value in zip(nodes, np.hypot(values[0::2], values[1::2])):
+                if node in NODES_INDEX:
+                    currents[line_index[lines.Name], NODES_INDEX[node]] = value
+        index = lines.Next
+
+    return currents
+
+
+def get_system_y():
+    """
+    This function gets the system admittance matrix of the circuit, with the nodes in the order of YNodeOrder.
+    @:params -> None
+    @:return
+    y_matrix: np.array, the complex admittance matrix in Siemens with shape (n_nodes, n_nodes)
+    """
+    y_values = np.asarray(DSSCircuit.SystemY)
+    n_nodes = int(round(np.sqrt(len(y_values) // 2)))
+
+    return (y_values[0::2] + 1j * y_values[1::2]).reshape(n_nodes, n_nodes)
+
+
+def get_enabled_names(collection):
+    """
+    This function gets the names of the enabled elements of a collection, e.g. DSSCircuit.Reactors. The elements
+    disabled by the rollback of a transaction are skipped.
+    @:params
+    collection: the collection of elements of the engine
+    @:return
+    names: list, the names of the enabled elements
+    """
+    names = []
+    index = collection.First
+    while index > 0:
+        names.append(collection.Name)
+        index = collection.Next
+
+    return names
@@ -0,0 +1,429 @@
+""" This script contains a lightweight work queue to distribute sweeps of scenarios of the IEEE 13 nodes network
+across several hosts. A coordinator serves the chunks of the sweep over HTTP and saves the results in the chunk files
+of sweep_executor. Every worker host keeps a warm network, leases chunks, sends heartbeats while it solves them and
+pushes the results back. A chunk whose lease is not renewed is queued again for another worker. """
+
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from Utils.parallel_utils import init_worker
+from Utils.sweep_executor import check_manifest, get_completed_chunks, iter_chunks, run_chunk, save_chunk
+
+
+def encode_value(value):
+    """
+    This function converts the values that are not JSON serializable (complex numbers and NumPy values).
+    @:params
+    value: the value to convert
+    @:return
+    value: the JSON serializable value
+    """
+    if isinstance(value, (complex, np.complexfloating)):
+        return {'__complex__': [float(value.real), float(value.imag)]}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError(f"The value {value!r} of type {type(value).__name__} can not be sent to the work queue.")
+
+
+def decode_value(value: dict):
+    """
+    This function restores the complex numbers converted by encode_value.
+    @:params
+    value: dict, a JSON object
+    @:return
+    value: the restored value
+    """
+    if set(value) == {'__complex__'}:
+        return complex(*value['__complex__'])
+
+    return value
+
+
+def encode_message(data):
+    """
+    This function encodes the data of a message of the work queue.
+    @:params
+    data: the data of the message
+    @:return
+    body: bytes, the body of the message
+    """
+    return json.dumps(data, default=encode_value).encode()
+
+
+def decode_message(body: bytes):
+    """
+    This function decodes the body of a message of the work queue.
+    @:params
+    body: bytes, the body of the message
+    @:return
+    data: the data of the message
+    """
+    return json.loads(body, object_hook=decode_value)
+
+
+class WorkQueue:
+    """ This class keeps the state of a distributed sweep: the chunks not served yet, the chunks leased to each
+    worker with the deadline of their lease, and the chunks that have to be served again. """
+
+    def __init__(self, scenarios, setup: dict, output_dir: str, chunk_size: int = 100, lease_timeout: float = 60.0):
+        os.makedirs(output_dir, exist_ok=True)
+        check_manifest(output_dir, chunk_size)
+
+        self.setup = setup
+        self.output_dir = output_dir
+        self.lease_timeout = lease_timeout
+        self.chunks = iter_chunks(scenarios, chunk_size)
+        self.completed = get_completed_chunks(output_dir)
+        self.leases = {}
+        self.requeued = deque()
+        self.exhausted = False
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.summary = {'n_chunks': 0, 'n_solved': 0, 'n_skipped': 0, 'n_requeued': 0, 'workers': set()}
+
+    def requeue_expired(self):
+        """ This function queues again the chunks whose lease has expired.
+        @:params -> None
+        @:return -> None """
+
+        now = time.monotonic()
+        for chunk_index in [index for index, lease in self.leases.items() if lease['deadline'] < now]:
+            self.requeued.append(self.leases.pop(chunk_index)['task'])
+            self.summary['n_requeued'] += 1
+
+    def get_next_task(self):
+        """ This function gets the next chunk to serve, first the ones queued again.
+        @:params -> None
+        @:return
+        task: tuple, the index of the chunk, the index of its first scenario and its scenarios, None if there is no
+        chunk to serve now """
+
+        while len(self.requeued) > 0:
+            task = self.requeued.popleft()
+            if task[0] not in self.completed:
+                return task
+
+        while not self.exhausted:
+            task = next(self.chunks, None)
+            if task is None:
+                self.exhausted = True
+                break
+            self.summary['n_chunks'] += 1
+            if task[0] in self.completed:
+                self.summary['n_skipped'] += 1
+                continue
+            return task
+
+        return None
+
+    def check_finished(self):
+        """ This function marks the sweep as finished when every chunk has been served and solved.
+        @:params -> None
+        @:return -> None """
+
+        if self.exhausted and len(self.leases) == 0 and len(self.requeued) == 0:
+            self.finished.set()
+
+    def lease(self, worker: str):
+        """ This function leases a chunk to a worker.
+        @:params
+        worker: str, the identifier of the worker
+        @:return
+        response: dict, the chunk, {'wait': True} if every chunk is leased, or {'done': True} if the sweep finished """
+
+        with self.lock:
+            self.summary['workers'].add(worker)
+            self.requeue_expired()
+            task = self.get_next_task()
+            if task is None:
+                self.check_finished()
+                return {'done': True} if self.finished.is_set() else {'wait': True}
+
+            self.leases[task[0]] = {'task': task, 'worker': worker,
+                                    'deadline': time.monotonic() + self.lease_timeout}
+
+        return {'chunk_index': task[0], 'first_index': task[1], 'scenarios': task[2]}
+
+    def heartbeat(self, worker: str, chunk_index: int):
+        """ This function extends the lease of a chunk.
+        @:params
+        worker: str, the identifier of the worker
+        chunk_index: int, the index of the chunk
+        @:return
+        response: dict, if the worker still holds the lease """
+
+        with self.lock:
+            lease = self.leases.get(chunk_index)
+            if lease is None or lease['worker'] != worker:
+                return {'ok': False}
+            lease['deadline'] = time.monotonic() + self.lease_timeout
+
+        return {'ok': True}
+
+    def complete(self, worker: str, chunk_index: int, results: list):
+        """ This function saves the results of a chunk. The results of a chunk already saved by another worker are
+        discarded.
+        @:params
+        worker: str, the identifier of the worker
+        chunk_index: int, the index of the chunk
+        results: list, the result of each scenario of the chunk
+        @:return
+        response: dict, if the results were saved """
+
+        with self.lock:
+            saved = chunk_index not in self.completed
+            if saved:
+                save_chunk(self.output_dir, chunk_index, results)
+                self.completed.add(chunk_index)
+                self.summary['n_solved'] += 1
+            self.leases.pop(chunk_index, None)
+            self.check_finished()
+
+        return {'ok': saved}
+
+
+class WorkQueueHandler(BaseHTTPRequestHandler):
+    """ This class serves the endpoints of the work queue: GET /setup, and POST /lease, /heartbeat and /result. """
+
+    def send_data(self, data, status: int = 200):
+        body = encode_message(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/setup':
+            self.send_data(self.server.work_queue.setup)
+        else:
+            self.send_data({'error': f"Unknown endpoint {self.path}"}, status=404)
+
+    def do_POST(self):
+        work_queue = self.server.work_queue
+        request = decode_message(self.rfile.read(int(self.headers['Content-Length'])))
+
+        if self.path == '/lease':
+            self.send_data(work_queue.lease(request['worker']))
+        elif self.path == '/heartbeat':
+            self.send_data(work_queue.heartbeat(request['worker'], request['chunk_index']))
+        elif self.path == '/result':
+            self.send_data(work_queue.complete(request['worker'], request['chunk_index'], request['results']))
+        else:
+            self.send_data({'error': f"Unknown endpoint {self.path}"}, status=404)
+
+    def log_message(self, format, *args):
+        # The requests of the workers are not logged
+        pass
+
+
+def start_coordinator(work_queue: WorkQueue, host: str = '0.0.0.0', port: int = 0):
+    """
+    This function starts the HTTP server of a work queue in a background thread.
+    @:params
+    work_queue: WorkQueue, the state of the sweep
+    host: str, the interface where the coordinator listens
+    port: int, the port of the coordinator, 0 to use a free port
+    @:return
+    server: ThreadingHTTPServer, the server, its address is server.server_address
+    """
+    server = ThreadingHTTPServer((host, port), WorkQueueHandler)
+    server.daemon_threads = True
+    server.work_queue = work_queue
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def run_coordinator(
+        scenarios,
+        setup: dict,
+        output_dir: str,
+        host: str = '0.0.0.0',
+        port: int = 8013,
+        chunk_size: int = 100,
+        lease_timeout: float = 60.0,
+        linger: float = 5.0):
+    """
+    This function serves a sweep to the workers until every chunk is solved. The chunks already saved in output_dir
+    are skipped, so a coordinator that was stopped resumes the sweep.
+    @:params
+    scenarios: iterable, the scenarios to solve (see run_scenario), always generated in the same order
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup. The circuit_path has to be
+    valid in every worker host
+    output_dir: str, the folder where the chunks are saved
+    host: str, the interface where the coordinator listens
+    port: int, the port of the coordinator
+    chunk_size: int, the number of scenarios of each chunk
+    lease_timeout: float, the seconds without heartbeats after which a chunk is queued again
+    linger: float, the seconds the coordinator keeps answering after the sweep, so the workers see it finished
+    @:return
+    summary: dict, the chunks solved, skipped and queued again, and the workers that took part
+    """
+    work_queue = WorkQueue(scenarios, setup, output_dir, chunk_size=chunk_size, lease_timeout=lease_timeout)
+    server = start_coordinator(work_queue, host, port)
+    try:
+        while not work_queue.finished.wait(timeout=lease_timeout):
+            # Expired leases are also checked when no worker asks for work
+            with work_queue.lock:
+                work_queue.requeue_expired()
+        time.sleep(linger)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return work_queue.summary
+
+
+def send_request(address: str, endpoint: str, data=None, timeout: float = 30.0):
+    """
+    This function sends a request to the coordinator.
+    @:params
+    address: str, the address of the coordinator, e.g. 'http://10.0.0.2:8013'
+    endpoint: str, the endpoint, e.g. '/lease'
+    data: the data of a POST request, None for a GET request
+    timeout: float, the timeout of the request in seconds
+    @:return
+    response: the data of the response
+    """
+    body = None if data is None else encode_message(data)
+    request = urllib.request.Request(address + endpoint, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return decode_message(response.read())
+
+
+def send_heartbeats(address: str, worker: str, chunk_index: int, interval: float, stop: threading.Event):
+    """
+    This function sends heartbeats for a chunk until stop is set.
+    @:params
+    address: str, the address of the coordinator
+    worker: str, the identifier of the worker
+    chunk_index: int, the index of the chunk
+    interval: float, the seconds between heartbeats
+    stop: threading.Event, the event that stops the heartbeats
+    @:return -> None
+    """
+    while not stop.wait(interval):
+        try:
+            send_request(address, '/heartbeat', {'worker': worker, 'chunk_index': chunk_index})
+        except (urllib.error.URLError, OSError):
+            # A missed heartbeat is recovered with the next one or by the lease timeout
+            pass
+
+
+def run_worker(
+        address: str,
+        worker: str = None,
+        heartbeat_interval: float = 10.0,
+        poll_interval: float = 1.0,
+        max_retries: int = 5):
+    """
+    This function runs a worker of a distributed sweep. The network is built once from the setup of the coordinator
+    and kept warm between chunks. The worker stops when the sweep is finished or the coordinator is unreachable.
+    @:params
+    address: str, the address of the coordinator, e.g. 'http://10.0.0.2:8013'
+    worker: str, the identifier of the worker, by default the host name and the process id
+    heartbeat_interval: float, the seconds between heartbeats, lower than the lease timeout of the coordinator
+    poll_interval: float, the seconds to wait when every chunk is leased to other workers
+    max_retries: int, the failed requests in a row after which the coordinator is considered gone
+    @:return
+    n_chunks: int, the number of chunks solved by the worker
+    """
+    worker = f"{socket.gethostname()}-{os.getpid()}" if worker is None else worker
+    init_worker(send_request(address, '/setup'))
+
+    n_chunks, failures = 0, 0
+    while failures < max_retries:
+        try:
+            response = send_request(address, '/lease', {'worker': worker})
+        except (urllib.error.URLError, OSError):
+            failures += 1
+            time.sleep(poll_interval)
+            continue
+        failures = 0
+
+        if response.get('done'):
+            break
+        if response.get('wait'):
+            time.sleep(poll_interval)
+            continue
+
+        chunk_index = response['chunk_index']
+        stop = threading.Event()
+        heartbeats = threading.Thread(target=send_heartbeats,
+                                      args=(address, worker, chunk_index, heartbeat_interval, stop), daemon=True)
+        heartbeats.start()
+        try:
+            _, results, _ = run_chunk((chunk_index, response['first_index'], response['scenarios']))
+        finally:
+            stop.set()
+            heartbeats.join()
+
+        try:
+            send_request(address, '/result', {'worker': worker, 'chunk_index': chunk_index, 'results': results})
+            n_chunks += 1
+        except (urllib.error.URLError, OSError):
+            # The chunk will be queued again when its lease expires
+            failures += 1
+
+    return n_chunks
+
+
+def run_local_cluster(
+        scenarios,
+        setup: dict,
+        output_dir: str,
+        n_workers: int = None,
+        chunk_size: int = 100,
+        lease_timeout: float = 60.0,
+        heartbeat_interval: float = 10.0):
+    """
+    This function runs a distributed sweep in one machine, with several local worker processes standing in for the
+    worker hosts. It uses the same coordinator and workers as a multi-host sweep.
+    @:params
+    scenarios: iterable, the scenarios to solve (see run_scenario)
+    setup: dict, the base setup of the network as returned by IEEE13Nodes.get_setup
+    output_dir: str, the folder where the chunks are saved
+    n_workers: int, the number of worker processes, by default the number of CPUs
+    chunk_size: int, the number of scenarios of each chunk
+    lease_timeout: float, the seconds without heartbeats after which a chunk is queued again
+    heartbeat_interval: float, the seconds between heartbeats
+    @:return
+    summary: dict, the chunks solved, skipped and queued again, and the workers that took part
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    work_queue = WorkQueue(scenarios, setup, output_dir, chunk_size=chunk_size, lease_timeout=lease_timeout)
+    server = start_coordinator(work_queue, host='127.0.0.1', port=0)
+    address = f"http://127.0.0.1:{server.server_address[1]}"
+
+    workers = [multiprocessing.Process(target=run_worker, args=(address, f"local-{i}", heartbeat_interval))
+               for i in range(n_workers)]
+    try:
+        for process in workers:
+            process.start()
+        while not work_queue.finished.wait(timeout=lease_timeout):
+            with work_queue.lock:
+                work_queue.requeue_expired()
+            if not any(process.is_alive() for process in workers):
+                raise RuntimeError("Every worker stopped before the sweep was finished.")
+        for process in workers:
+            process.join()
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        server.shutdown()
+        server.server_close()
+
+    return work_queue.summary